@@ -1,20 +1,24 @@
 import streamlit as st
-import cv2
-import tempfile
-import os
-import numpy as np
-from ultralytics import YOLO
-import sqlite3
-from PIL import Image
+import pandas as pd
 from datetime import datetime
-from fpdf import FPDF
-
-# Load YOLO Models
-@st.cache_resource
+from utils.db import (
+    add_inspections, add_inventory, asset_extent, assets_in_bbox, get_inventory, init_db, nearest_assets, query_inventory
+)
+from utils.detection_cache import content_hash
+from utils.ensemble import unify_classes
+from utils.imaging import INSPECTION_MAX_SIDE, decode_image, encode_jpeg, gps_coordinates
+from utils.inspection import detect_defects, inspection_image_path, inspection_row
+from utils.models import get_model
+from utils.reports import batch_report, inspection_report
+from utils.tiling import TILE_OVERLAP, TILE_SIZE
+
+# Load YOLO Models (shared across reruns and pages by the model registry,
+# and usually already warmed by utils.startup)
 def load_yolo_models():
     try:
-        model_1 = YOLO("https://raw.githubusercontent.com/Mush-Man/Streamlit_WebApp_demo/main/best.pt")
-        model_2 = YOLO("https://raw.githubusercontent.com/Mush-Man/Streamlit_WebApp_demo/main/best%20(1).pt")
+        with st.spinner("Loading detection models..."):
+            model_1 = get_model("road")
+            model_2 = get_model("bridge")
         return model_1, model_2
     except Exception as e:
         st.error(f"Error loading YOLO models: {e}")
@@ -27,109 +31,68 @@ if not (model_1 and model_2):
     st.stop()
 
 # Database Setup
-def init_db():
-    db_path = "bridge_road_management.db"
-    with sqlite3.connect(db_path) as conn:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS inventory (
-                        id INTEGER PRIMARY KEY,
-                        name TEXT,
-                        location TEXT,
-                        type TEXT,
-                        built_year INTEGER,
-                        last_inspection TEXT
-                     )''')
-        c.execute('''CREATE TABLE IF NOT EXISTS inspections (
-                        id INTEGER PRIMARY KEY,
-                        inventory_id INTEGER,
-                        date TEXT,
-                        defects TEXT,
-                        severity TEXT,
-                        length REAL,
-                        width REAL,
-                        image_path TEXT,
-                        FOREIGN KEY (inventory_id) REFERENCES inventory (id)
-                     )''')
-        conn.commit()
-
 init_db()
 
-# Add Inventory Record
-def add_inventory(name, location, type_, built_year):
-    db_path = "bridge_road_management.db"
-    with sqlite3.connect(db_path) as conn:
-        c = conn.cursor()
-        c.execute("INSERT INTO inventory (name, location, type, built_year, last_inspection) VALUES (?, ?, ?, ?, ?)",
-                  (name, location, type_, built_year, None))
-        conn.commit()
-
-# Fetch Inventory Records
-def fetch_inventory():
-    db_path = "bridge_road_management.db"
-    with sqlite3.connect(db_path) as conn:
-        c = conn.cursor()
-        c.execute("SELECT * FROM inventory")
-        return c.fetchall()
+MAP_MAX_ASSETS = 50000
+NEAREST_ASSET_MAX_KM = 2.0
 
 # YOLO Detection Function
-def detect_defects(image, models, selected_classes):
-    defects = []
-    annotated_image = image.copy()
-
-    for model in models:
-        results = model(image)
-        detections = results[0].boxes.data.cpu().numpy()
-        class_names = model.names
-
-        for detection in detections:
-            x1, y1, x2, y2, conf, cls = detection
-            cls_name = class_names.get(int(cls), "Unknown")
-            if cls_name in selected_classes:
-                label = f"{cls_name} ({conf:.2f})"
-                defects.append(cls_name)
-                cv2.rectangle(annotated_image, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                cv2.putText(annotated_image, label, (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-    # Save the annotated image temporarily
-    temp_image_path = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg").name
-    cv2.imwrite(temp_image_path, cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR))
-    return temp_image_path, defects
+def inspect_image(uploaded_file, models, selected_classes, fusion=None, tiling=None):
+    """Decode an upload once, annotate it in place and return ``(jpeg_bytes, defects)``.
+
+    The JPEG bytes are shared by the page display, the saved inspection image
+    and the PDF report. Without tiling, the photo is decoded at reduced size.
+    """
+    image = decode_image(uploaded_file, max_side=None if tiling else INSPECTION_MAX_SIDE)
+    _, defects = detect_defects(
+        image, models, selected_classes, fusion, tiling, image_key=content_hash(uploaded_file), in_place=True
+    )
+    return encode_jpeg(image), defects
+
+# Save Inspection Record
+def record_inspection(inventory_id, defects, severity, length, width, annotated_jpeg):
+    """Keep the annotated image and write the inspection, updating the asset's last inspection date."""
+    inspected_at = datetime.now()
+    image_path = inspection_image_path(inventory_id, inspected_at)
+    with open(image_path, "wb") as f:
+        f.write(annotated_jpeg)
+    add_inspections([inspection_row(inventory_id, defects, severity, length, width, image_path, inspected_at)])
+
+# Suggest Assets From Photo GPS
+def _use_asset(inventory_id):
+    st.session_state["inspection_inventory_id"] = inventory_id
+
+def suggest_assets(uploaded_file):
+    """Offer the assets nearest to the photo's EXIF GPS position as the inspection target."""
+    position = gps_coordinates(uploaded_file)
+    if position is None:
+        return
+    nearby = nearest_assets(*position, limit=3, max_km=NEAREST_ASSET_MAX_KM)
+    if not nearby:
+        st.caption(f"Photo taken at {position[0]:.5f}, {position[1]:.5f}; no asset within {NEAREST_ASSET_MAX_KM:g} km.")
+        return
+    st.caption(f"Photo taken at {position[0]:.5f}, {position[1]:.5f}. Nearest assets:")
+    for asset in nearby:
+        asset_id, name, location, type_, distance = asset[0], asset[1], asset[2], asset[3], asset[-1]
+        st.button(
+            f"#{asset_id} {name} ({type_}, {location}) · {distance * 1000:.0f} m",
+            key=f"nearest_asset_{asset_id}",
+            on_click=_use_asset,
+            args=(asset_id,),
+        )
 
 # Generate PDF Report
-def generate_pdf_report(inventory_id, defects, length, width, annotated_image_path):
-    inventory = next((record for record in fetch_inventory() if record[0] == inventory_id), None)
+def generate_pdf_report(inventory_id, defects, length, width, annotated_image):
+    """Return the inspection report as PDF bytes, or ``None`` if the asset does not exist."""
+    inventory = get_inventory(inventory_id)
     if not inventory:
         st.error("Inventory record not found.")
         return None
-
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-
-    # Add inspection details
-    pdf.cell(200, 10, txt="Inspection Report", ln=True, align='C')
-    pdf.cell(200, 10, txt=f"Name: {inventory[1]}", ln=True)
-    pdf.cell(200, 10, txt=f"Location: {inventory[2]}", ln=True)
-    pdf.cell(200, 10, txt=f"Type: {inventory[3]}", ln=True)
-    pdf.cell(200, 10, txt=f"Built Year: {inventory[4]}", ln=True)
-    pdf.cell(200, 10, txt=f"Defects Detected: {', '.join(defects)}", ln=True)
-    pdf.cell(200, 10, txt=f"Length: {length} meters", ln=True)
-    pdf.cell(200, 10, txt=f"Width: {width} meters", ln=True)
-
-    # Add annotated image
-    if os.path.exists(annotated_image_path):
-        pdf.cell(200, 10, txt="Annotated Image:", ln=True)
-        pdf.image(annotated_image_path, x=10, y=None, w=190)
-
-    # Save PDF
-    pdf_path = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf").name
-    pdf.output(pdf_path)
-    return pdf_path
+    return inspection_report(inventory, defects, length, width, annotated_image)
 
 # Streamlit App
 st.title("Bridge and Road Management System")
-menu = ["Add Inventory", "View Inventory", "Condition Inspection"]
+menu = ["Add Inventory", "View Inventory", "Asset Map", "Condition Inspection", "Inspection Summary Report"]
 choice = st.sidebar.selectbox("Menu", menu)
 
 if choice == "Add Inventory":
@@ -138,32 +101,65 @@ if choice == "Add Inventory":
     location = st.text_input("Location")
     type_ = st.selectbox("Type", ["Bridge", "Road"])
     built_year = st.number_input("Year Built", min_value=1800, max_value=datetime.now().year, step=1)
+    lat_col, lon_col = st.columns(2)
+    latitude = lat_col.number_input("Latitude (optional)", min_value=-90.0, max_value=90.0, value=None, format="%.6f")
+    longitude = lon_col.number_input("Longitude (optional)", min_value=-180.0, max_value=180.0, value=None, format="%.6f")
     if st.button("Add to Inventory"):
-        add_inventory(name, location, type_, built_year)
+        add_inventory(name, location, type_, built_year, latitude, longitude)
         st.success("Record added to inventory.")
 
 elif choice == "View Inventory":
     st.subheader("View Inventory Records")
-    records = fetch_inventory()
+    search = st.text_input("Search name or location")
+    col1, col2, col3 = st.columns(3)
+    type_filter = col1.selectbox("Type", ["All", "Bridge", "Road"])
+    built_from, built_to = col2.slider("Year Built", 1800, datetime.now().year, (1800, datetime.now().year))
+    overdue_years = col3.number_input("Overdue after (years, 0 = any)", min_value=0, max_value=50, value=0)
+    page_size = st.selectbox("Records per page", [25, 50, 100], index=1)
+
+    filters = {
+        "search": search,
+        "type_": None if type_filter == "All" else type_filter,
+        "built_from": built_from,
+        "built_to": built_to,
+        "inspected_before": (
+            f"{datetime.now().year - overdue_years}{datetime.now():-%m-%d}" if overdue_years else None
+        ),
+    }
+    # Keyset pagination: remember the last id of every page we have shown
+    if st.session_state.get("inventory_filters") != (filters, page_size):
+        st.session_state["inventory_filters"] = (filters, page_size)
+        st.session_state["inventory_cursors"] = [0]
+    cursors = st.session_state["inventory_cursors"]
+
+    records = query_inventory(**filters, after_id=cursors[-1], limit=page_size + 1)
+    has_next = len(records) > page_size
+    records = records[:page_size]
     if records:
-        for record in records:
-            st.write(f"**ID:** {record[0]}")
-            st.write(f"**Name:** {record[1]}")
-            st.write(f"**Location:** {record[2]}")
-            st.write(f"**Type:** {record[3]}")
-            st.write(f"**Year Built:** {record[4]}")
-            st.write(f"**Last Inspection:** {record[5]}")
-            st.markdown("---")
+        st.dataframe(
+            pd.DataFrame(records, columns=["ID", "Name", "Location", "Type", "Year Built", "Last Inspection"]),
+            hide_index=True,
+            use_container_width=True,
+        )
+        prev_col, page_col, next_col = st.columns([1, 2, 1])
+        if prev_col.button("Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        page_col.write(f"Page {len(cursors)}")
+        if next_col.button("Next", disabled=not has_next):
+            cursors.append(records[-1][0])
+            st.rerun()
     else:
         st.warning("No inventory records found.")
 
 elif choice == "Condition Inspection":
     st.subheader("Condition Inspection")
-    inventory_id = st.number_input("Enter Inventory ID for Inspection", min_value=1, step=1)
+    inventory_id = st.number_input("Enter Inventory ID for Inspection", min_value=1, step=1, key="inspection_inventory_id")
     inspection_type = st.selectbox("Inspection Type", ["Image Upload"])
     model_choice = st.multiselect("Select Models", ["Model 1", "Model 2"])
     length = st.number_input("Enter Length (meters):", min_value=0.0, step=0.1)
     width = st.number_input("Enter Width (meters):", min_value=0.0, step=0.1)
+    severity = st.selectbox("Severity", ["Low", "Medium", "High"])
 
     models = []
     if "Model 1" in model_choice:
@@ -171,25 +167,87 @@ elif choice == "Condition Inspection":
     if "Model 2" in model_choice:
         models.append(model_2)
 
+    fusion = None
+    if len(models) > 1:
+        fusion_choice = st.selectbox(
+            "Merge overlapping detections from both models",
+            ["Weighted box fusion", "Non-maximum suppression", "Off"],
+        )
+        fusion = {"Weighted box fusion": "wbf", "Non-maximum suppression": "nms"}.get(fusion_choice)
+
     # Combine classes from both models and let the user select
-    all_classes = list(set(model_1.names.values()).union(set(model_2.names.values())))
+    if fusion:
+        all_classes = list(unify_classes([model_1, model_2])[0].values())
+    else:
+        all_classes = list(set(model_1.names.values()).union(set(model_2.names.values())))
     selected_classes = st.multiselect("Select Defects to Detect", all_classes)
 
+    tiling = None
+    if st.checkbox("Tiled inference for high-resolution photos", help="Finds small defects such as hairline cracks."):
+        tile_size = st.number_input("Tile size (pixels)", min_value=320, max_value=2048, value=TILE_SIZE, step=32)
+        overlap = st.slider("Tile overlap", min_value=0.0, max_value=0.5, value=TILE_OVERLAP, step=0.05)
+        tiling = {"tile_size": int(tile_size), "overlap": overlap}
+
     if inspection_type == "Image Upload":
         uploaded_file = st.file_uploader("Upload Inspection Image", type=["jpg", "jpeg", "png"])
+        if uploaded_file:
+            suggest_assets(uploaded_file)
         if uploaded_file and selected_classes and st.button("Inspect Image"):
-            image = Image.open(uploaded_file)
-            image_np = np.array(image)
-
-            temp_image_path, defects = detect_defects(image_np, models, selected_classes)
-            if temp_image_path:
-                st.image(temp_image_path, caption="Annotated Image", use_column_width=True)
-                pdf_path = generate_pdf_report(inventory_id, defects, length, width, temp_image_path)
-                if pdf_path:
-                    with open(pdf_path, "rb") as pdf_file:
-                        st.download_button(
-                            label="Download Inspection Report as PDF",
-                            data=pdf_file,
-                            file_name="inspection_report.pdf",
-                            mime="application/pdf",
-                        )
+            annotated_jpeg, defects = inspect_image(uploaded_file, models, selected_classes, fusion, tiling)
+            st.image(annotated_jpeg, caption="Annotated Image", use_column_width=True)
+            if get_inventory(inventory_id):
+                record_inspection(inventory_id, defects, severity, length, width, annotated_jpeg)
+                st.success("Inspection saved.")
+            pdf_bytes = generate_pdf_report(inventory_id, defects, length, width, annotated_jpeg)
+            if pdf_bytes:
+                st.download_button(
+                    label="Download Inspection Report as PDF",
+                    data=pdf_bytes,
+                    file_name="inspection_report.pdf",
+                    mime="application/pdf",
+                )
+
+elif choice == "Asset Map":
+    st.subheader("Asset Map")
+    extent = asset_extent()
+    if extent is None:
+        st.warning("No assets have coordinates yet. Add them under Add Inventory.")
+        st.stop()
+    type_filter = st.selectbox("Type", ["All", "Bridge", "Road"])
+    col1, col2 = st.columns(2)
+    min_lat, max_lat = col1.slider("Latitude", extent[0], extent[2] + 1e-6, (extent[0], extent[2] + 1e-6), format="%.4f")
+    min_lon, max_lon = col2.slider("Longitude", extent[1], extent[3] + 1e-6, (extent[1], extent[3] + 1e-6), format="%.4f")
+    assets = assets_in_bbox(
+        min_lat, min_lon, max_lat, max_lon,
+        type_=None if type_filter == "All" else type_filter, limit=MAP_MAX_ASSETS + 1,
+    )
+    if len(assets) > MAP_MAX_ASSETS:
+        st.info(f"Showing the first {MAP_MAX_ASSETS} assets; narrow the area to see the rest.")
+        assets = assets[:MAP_MAX_ASSETS]
+    frame = pd.DataFrame(
+        assets, columns=["ID", "Name", "Location", "Type", "Last Inspection", "latitude", "longitude"]
+    )
+    # Bridges red, roads blue
+    frame["color"] = frame["Type"].map({"Bridge": "#d33682", "Road": "#268bd2"}).fillna("#859900")
+    st.map(frame, latitude="latitude", longitude="longitude", color="color", size=20)
+    st.caption(f"{len(frame)} assets in view")
+    st.dataframe(frame.drop(columns="color"), hide_index=True, use_container_width=True)
+
+elif choice == "Inspection Summary Report":
+    st.subheader("Inspection Summary Report")
+    location = st.text_input("District or location (blank = all)")
+    type_filter = st.selectbox("Type", ["All", "Bridge", "Road"])
+    since = st.date_input("Inspections since", value=None)
+    if st.button("Generate Report"):
+        with st.spinner("Building report..."):
+            pdf_bytes = batch_report(
+                location=location or None,
+                type_=None if type_filter == "All" else type_filter,
+                since=since.isoformat() if since else None,
+            )
+        st.download_button(
+            label="Download Summary Report as PDF",
+            data=pdf_bytes,
+            file_name=f"inspection_summary_{location or 'all'}.pdf",
+            mime="application/pdf",
+        )
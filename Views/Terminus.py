@@ -1,175 +1,130 @@
 import streamlit as st
-import numpy as np
 import cv2
-from PIL import Image
-from ultralytics import YOLO
-import tempfile
-import os
-
-# Path to your YOLO model
-MODEL_PATH = "https://raw.githubusercontent.com/Mush-Man/Streamlit_WebApp_demo/main/best.pt"  # Update this to the path of your .pt model
-model = YOLO(MODEL_PATH)  # Load the YOLO model
+from utils.camera import CAMERA_SOURCE, StreamStats, latest_frames, open_camera
+from forms.jobs import job_download, job_list
+from forms.uploads import save_upload, session_owner, session_workspace
+from utils import metrics
+from utils.detection_cache import cached_detections, content_hash
+from utils.imaging import INSPECTION_MAX_SIDE, decode_image, encode_jpeg
+from utils.jobs import enqueue_video_job
+from utils.models import get_model, model_digest
+from utils.postprocess import class_ids, detect, draw_detections, filter_classes, model_predictor
+from utils.tiling import TILE_OVERLAP, TILE_SIZE, tiled_detect
+from utils.video import VIDEO_KEYFRAME_INTERVAL
 
 # Streamlit UI
 st.title("Terminus Object Detection")
 st.write("Upload an image or video, or use the real-time camera for object detection.")
 
+# Load the YOLO model after the header has rendered (shared across reruns and
+# pages by the model registry, and usually already warmed by utils.startup)
+with st.spinner("Loading detection model..."):
+    model = get_model("road")
+
 # Class selection
 class_names = list(model.names.values())
 selected_classes = st.multiselect("Select classes to detect", class_names, default=class_names)
-
-def filter_results(results, selected_classes):
-    """Filter detection results based on selected classes."""
-    filtered_boxes = []
-    for result in results[0].boxes:
-        label = model.names[int(result.cls)]
-        if label in selected_classes:
-            filtered_boxes.append(result)
-    return filtered_boxes
-
-def process_image(image):
-    """Process and annotate an image."""
-    img_array = np.array(image)
-    results = model.predict(img_array)
-    filtered_boxes = filter_results(results, selected_classes)
-
-    annotated_image = img_array.copy()
-    for result in filtered_boxes:
-        box = result.xyxy[0].numpy()
-        label = model.names[int(result.cls)]
-        confidence = result.conf.numpy()
-
-        x_min, y_min, x_max, y_max = map(int, box)
-        cv2.rectangle(annotated_image, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
-        cv2.putText(
-            annotated_image,
-            f"{label}: {confidence[0]:.2f}",
-            (x_min, y_min - 10),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.5,
-            (0, 255, 0),
-            2,
-        )
-    return cv2.cvtColor(annotated_image, cv2.COLOR_BGR2RGB)
-
-def process_video(video_path, output_path):
-    """Process and annotate a video."""
-    cap = cv2.VideoCapture(video_path)
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    out = None
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        results = model.predict(frame)
-        filtered_boxes = filter_results(results, selected_classes)
-
-        for result in filtered_boxes:
-            box = result.xyxy[0].numpy()
-            label = model.names[int(result.cls)]
-            confidence = result.conf.numpy()
-
-            x_min, y_min, x_max, y_max = map(int, box)
-            cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
-            cv2.putText(
-                frame,
-                f"{label}: {confidence[0]:.2f}",
-                (x_min, y_min - 10),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.5,
-                (0, 255, 0),
-                2,
-            )
-
-        if out is None:
-            height, width, _ = frame.shape
-            out = cv2.VideoWriter(output_path, fourcc, 20.0, (width, height))
-        out.write(frame)
-
-    cap.release()
-    out.release()
+selected_ids = class_ids(model.names, selected_classes)
+
+def process_image(uploaded_file, tiling=None):
+    """Decode an upload, annotate it in place (optionally tile by tile, see ``utils.tiling``) and return the RGB array.
+
+    Raw detections for all classes are cached by the upload's content hash,
+    so changing the class selection does not rerun the model.
+    """
+    img_array = decode_image(uploaded_file, max_side=None if tiling else INSPECTION_MAX_SIDE)
+    bgr = img_array[..., ::-1]  # The model expects BGR
+
+    def compute():
+        with metrics.timer("photo.inference"):
+            if tiling:
+                return tiled_detect(bgr, model, **tiling)
+            return detect(model, bgr)[0]
+
+    detections = cached_detections(
+        content_hash(uploaded_file), model_digest(model), {"tiling": tiling, "shape": list(img_array.shape[:2])},
+        compute,
+    )
+    detections = filter_classes(detections, selected_ids)
+    with metrics.timer("photo.annotate"):
+        return draw_detections(img_array, detections, model.names)
+
+def _set_camera_running(running):
+    st.session_state["camera_running"] = running
 
 def run_camera_streamlit(selected_classes):
-    """Run real-time detection using the built-in camera and display in Streamlit."""
-    cap = cv2.VideoCapture(0)  # Open the default camera
+    """Run real-time detection on the newest camera frame and display in Streamlit."""
+    st.button("Stop Camera", on_click=_set_camera_running, args=(False,))
     st_frame = st.empty()  # Placeholder for displaying frames in Streamlit
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        # Run YOLO model on the frame
-        results = model.predict(frame)
-        filtered_boxes = filter_results(results, selected_classes)
-
-        # Annotate the frame
-        for result in filtered_boxes:
-            box = result.xyxy[0].numpy()
-            label = model.names[int(result.cls)]
-            confidence = result.conf.numpy()
-
-            x_min, y_min, x_max, y_max = map(int, box)
-            cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
-            cv2.putText(
-                frame,
-                f"{label}: {confidence[0]:.2f}",
-                (x_min, y_min - 10),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.5,
-                (0, 255, 0),
-                2,
-            )
-
-        # Convert the frame to RGB format (required for Streamlit)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # Display the frame in Streamlit
-        st_frame.image(frame_rgb, channels="RGB")
-
-    cap.release()
+    st_stats = st.empty()
+    predict = model_predictor(model, classes=class_ids(model.names, selected_classes))
+    stats = StreamStats()
+
+    try:
+        with open_camera(CAMERA_SOURCE) as capture:
+            for frame, captured_at in latest_frames(capture):
+                # Run YOLO model on the frame and annotate it
+                with metrics.timer("camera.inference"):
+                    detections = predict([frame])[0]
+                with metrics.timer("camera.annotate"):
+                    draw_detections(frame, detections, model.names)
+
+                # Convert the frame to RGB format (required for Streamlit)
+                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+                # Display the frame in Streamlit
+                with metrics.timer("camera.display"):
+                    st_frame.image(frame_rgb, channels="RGB")
+                stats.record(captured_at)
+                st_stats.caption(stats.summary(capture.frames_captured))
+    except IOError:
+        st.error("Camera not accessible. Check your hardware or permissions.")
+    _set_camera_running(False)
 
 # Option for input type
 option = st.selectbox("Choose an option", ["Image", "Video", "Real-Time Camera"])
 
 if option == "Image":
     uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "png"])
+    tiling = None
+    if st.checkbox("Tiled inference for high-resolution photos"):
+        tile_size = st.number_input("Tile size (pixels)", min_value=320, max_value=2048, value=TILE_SIZE, step=32)
+        overlap = st.slider("Tile overlap", min_value=0.0, max_value=0.5, value=TILE_OVERLAP, step=0.05)
+        tiling = {"tile_size": int(tile_size), "overlap": overlap}
     if uploaded_file is not None:
-        img = Image.open(uploaded_file)
-        st.image(img, caption="Uploaded Image", use_column_width=True)
-        annotated_image = process_image(img)
+        st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
+        annotated_jpeg = encode_jpeg(process_image(uploaded_file, tiling))
 
-        st.image(annotated_image, caption="Processed Image with Detections")
-
-        # Save and download the annotated image
-        annotated_image_pil = Image.fromarray(annotated_image)
-        annotated_image_pil.save("annotated_image.jpg")
-        with open("annotated_image.jpg", "rb") as file:
-            st.download_button(label="Download Annotated Image", data=file, file_name="annotated_image.jpg")
+        # One encoded buffer for both the preview and the download, nothing written to disk
+        st.image(annotated_jpeg, caption="Processed Image with Detections")
+        st.download_button(
+            label="Download Annotated Image", data=annotated_jpeg, file_name="annotated_image.jpg", mime="image/jpeg"
+        )
 
 elif option == "Video":
     uploaded_file = st.file_uploader("Choose a video...", type=["mp4", "avi", "mov"])
-    if uploaded_file is not None:
-        tfile = tempfile.NamedTemporaryFile(delete=False)
-        tfile.write(uploaded_file.read())
-        video_path = tfile.name
-
-        output_video_path = "annotated_video.mp4"
-        st.write("Processing video...")
-        process_video(video_path, output_video_path)
-        st.write("Video processing completed!")
-
-        # Show the processed video
-        with open(output_video_path, "rb") as video_file:
-            st.video(video_file.read())
+    keyframe_interval = st.number_input(
+        "Run detection every k-th frame (1 = every frame)", min_value=1, max_value=60, value=VIDEO_KEYFRAME_INTERVAL
+    )
+    if uploaded_file is not None and st.button("Process Video"):
+        video_path = save_upload(uploaded_file)
+        if video_path:
+            # Processing runs in the background job pool; the result can be downloaded below
+            job_id = enqueue_video_job(
+                video_path,
+                "road",
+                {"classes": selected_ids, "keyframe_interval": int(keyframe_interval)},
+                owner=session_owner(),
+            )
+            session_workspace().discard(video_path)  # The job moved the file into its own directory
+            st.write(f"Processing video as job {job_id}...")
 
-        # Save and download the annotated video
-        with open(output_video_path, "rb") as video_file:
-            st.download_button(label="Download Annotated Video", data=video_file, file_name="annotated_video.mp4")
+    job_list()
+    job_download()
 
 elif option == "Real-Time Camera":
     st.write("Click the button below to start the camera.")
-    if st.button("Start Camera"):
+    st.button("Start Camera", on_click=_set_camera_running, args=(True,))
+    if st.session_state.get("camera_running"):
         run_camera_streamlit(selected_classes)
 
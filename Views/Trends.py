@@ -0,0 +1,67 @@
+import streamlit as st
+import pandas as pd
+from utils.db import asset_defect_trend, defect_totals, deteriorating_assets, init_db, trend_periods, worst_assets
+
+# Every table and chart below reads the trend summaries that are updated
+# whenever an inspection is saved, so the page stays fast however long the
+# inspection history grows.
+init_db()
+
+st.title("Defect Trends")
+st.write("Which bridges and roads are getting worse, from the defects found at each inspection.")
+
+periods = trend_periods()
+if not periods:
+    st.warning("No inspections recorded yet.")
+    st.stop()
+
+col1, col2 = st.columns(2)
+type_filter = col1.selectbox("Type", ["All", "Bridge", "Road"])
+top_n = col2.number_input("Assets to list", min_value=5, max_value=100, value=10, step=5)
+
+# Deterioration: defects per inspection in the latest inspected month versus the one before
+st.subheader("Getting Worse")
+rows = deteriorating_assets(int(top_n), None if type_filter == "All" else type_filter)
+if rows:
+    st.dataframe(
+        pd.DataFrame(rows, columns=[
+            "ID", "Name", "Location", "Type", "Month", "Defects per Inspection", "Previous Month",
+            "Previous Defects per Inspection", "Change", "Severity", "Previous Severity",
+        ]).round(2),
+        hide_index=True,
+        use_container_width=True,
+    )
+else:
+    st.caption("No asset has more defects per inspection than at its previous inspected month.")
+
+# Worst assets in one month
+st.subheader("Most Defects by Month")
+period = st.selectbox("Month", periods)
+rows = worst_assets(period, int(top_n), None if type_filter == "All" else type_filter)
+frame = pd.DataFrame(rows, columns=["ID", "Name", "Location", "Type", "Inspections", "Defects", "Mean Severity"])
+st.dataframe(frame.round(2), hide_index=True, use_container_width=True)
+
+# Network-wide defects per month and class
+st.subheader("Defects Found per Month")
+months = 1
+if len(periods) > 1:
+    months = st.slider("Months to show", min_value=1, max_value=len(periods), value=min(len(periods), 12))
+since = periods[months - 1]
+totals = pd.DataFrame(defect_totals(since), columns=["Month", "Defect", "Inspections", "Detections"])
+# Months whose inspections found nothing have no totals rows; show them as zero
+shown = sorted(periods[:months])
+st.bar_chart(totals.pivot(index="Month", columns="Defect", values="Detections").reindex(shown).fillna(0))
+
+# One asset's history by defect class
+st.subheader("Asset History")
+inventory_id = st.number_input("Inventory ID", min_value=1, step=1)
+history = pd.DataFrame(asset_defect_trend(inventory_id), columns=["Defect", "Month", "Inspections", "Detections"])
+if history.empty:
+    st.caption("No inspections recorded for this asset.")
+elif history["Defect"].isna().all():
+    st.caption("No defects found at any inspection of this asset.")
+else:
+    # Inspections is the asset's monthly total, so defect-free inspections (and months) count as zero
+    history["Defects per Inspection"] = history["Detections"] / history["Inspections"]
+    rates = history.dropna(subset=["Defect"]).pivot(index="Month", columns="Defect", values="Defects per Inspection")
+    st.line_chart(rates.reindex(history["Month"].unique()).fillna(0))
@@ -1,90 +1,84 @@
 import streamlit as st
 import cv2
-import tempfile
-import os
-import numpy as np
-from ultralytics import YOLO
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-
-# Load YOLO models
-model_road = YOLO("https://raw.githubusercontent.com/Mush-Man/Streamlit_WebApp_demo/main/best.pt")
-model_bridge = YOLO("https://raw.githubusercontent.com/Mush-Man/Streamlit_WebApp_demo/main/best%20(1).pt")
+from forms.jobs import job_download, job_list
+from forms.uploads import save_upload, session_owner, session_workspace
+from utils import metrics
+from utils.camera import CAMERA_SOURCE, StreamStats, latest_frames, open_camera
+from utils.jobs import enqueue_video_job, list_jobs
+from utils.models import get_model
+from utils.multistream import CAMERA_SOURCES, MultiStream
+from utils.postprocess import draw_detections, model_predictor
+from utils.reports import video_report
+from utils.video import VIDEO_BATCH_SIZE, VIDEO_KEYFRAME_INTERVAL, VIDEO_QUEUE_DEPTH
+
+# Models are loaded lazily through the shared registry, only when selected
+MODEL_NAMES = {"Road Defect Model": "road", "Bridge Defect Model": "bridge"}
 
 # Helper Functions
-def analyze_video(video_path, model):
-    """Analyze a video file using the YOLO model."""
-    cap = cv2.VideoCapture(video_path)
-    output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4').name
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    fps = cap.get(cv2.CAP_PROP_FPS) or 20  # Default to 20 if FPS is unavailable
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        results = model.predict(frame, verbose=False)  # Disable verbose logging
-        annotated_frame = results[0].plot() if results else frame  # Annotate if detections exist
-        out.write(annotated_frame)
-
-    cap.release()
-    out.release()
-    return output_path
-
-def analyze_camera_feed(model):
-    """Analyze real-time camera feed."""
-    st.info("Using real-time camera feed...")
-    cap = cv2.VideoCapture(0)  # Default camera
+def _set_camera_running(running):
+    st.session_state["camera_running"] = running
 
-    if not cap.isOpened():
+def analyze_camera_feed(model, source=CAMERA_SOURCE):
+    """Analyze real-time camera feed until the Stop button is pressed."""
+    st.info("Using real-time camera feed...")
+    st.button("Stop Analysis", on_click=_set_camera_running, args=(False,))
+    st_frame = st.empty()
+    st_stats = st.empty()
+    predict = model_predictor(model)
+    stats = StreamStats()
+
+    try:
+        with open_camera(source) as capture:
+            # Always work on the newest frame; frames captured meanwhile are dropped
+            for frame, captured_at in latest_frames(capture):
+                with metrics.timer("camera.inference"):
+                    detections = predict([frame])[0]
+                with metrics.timer("camera.annotate"):
+                    annotated_frame = draw_detections(frame, detections, model.names)
+
+                # Display the annotated frame
+                frame_rgb = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB)
+                with metrics.timer("camera.display"):
+                    st_frame.image(frame_rgb, channels="RGB")
+                stats.record(captured_at)
+                st_stats.caption(stats.summary(capture.frames_captured))
+    except IOError:
+        _set_camera_running(False)
         st.error("Camera not accessible. Check your hardware or permissions.")
         return
 
-    stop_button = st.button("Stop Analysis")
-    st_frame = st.empty()
-
-    while cap.isOpened() and not stop_button:
-        ret, frame = cap.read()
-        if not ret:
-            st.warning("No frames received from camera. Stopping analysis.")
-            break
-
-        results = model.predict(frame, verbose=False)
-        annotated_frame = results[0].plot() if results else frame
-
-        # Display the annotated frame
-        frame_rgb = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB)
-        st_frame.image(frame_rgb, channels="RGB")
-
-    cap.release()
+    # Pressing Stop reruns the script and interrupts the loop above; getting
+    # here means the source itself ran dry.
+    _set_camera_running(False)
+    st.warning("No frames received from camera. Stopping analysis.")
     st.success("Camera feed stopped.")
 
-def generate_pdf_report(defects_summary, pdf_path):
-    """Generate a PDF report of detected defects."""
-    c = canvas.Canvas(pdf_path, pagesize=letter)
-    c.setFont("Helvetica", 12)
-    c.drawString(100, 750, "Infrastructure Management System - Defect Report")
-    c.drawString(100, 735, "-----------------------------------------------")
-    y_position = 700
-    for defect in defects_summary:
-        c.drawString(100, y_position, defect)
-        y_position -= 20
-    c.save()
-
-def download_file(file_path, label):
-    """Provide a download link for the given file."""
-    with open(file_path, "rb") as file:
-        btn = st.download_button(
-            label=label,
-            data=file,
-            file_name=os.path.basename(file_path),
-            mime="application/octet-stream",
-        )
-    return btn
+def analyze_camera_feeds(model, sources):
+    """Analyze several camera feeds with one shared model until the Stop button is pressed."""
+    st.info(f"Using {len(sources)} real-time camera feeds...")
+    st.button("Stop Analysis", on_click=_set_camera_running, args=(False,))
+    columns = st.columns(min(len(sources), 3))
+    st_frames = [columns[i % len(columns)].empty() for i in range(len(sources))]
+    st_stats = st.empty()
+    predict = model_predictor(model)
+
+    try:
+        with MultiStream(sources) as streams:
+            # Each batch holds the newest frame of every stream that has one
+            for results in streams.detections(predict):
+                for stream, frame, detections, _ in results:
+                    with metrics.timer("camera.annotate"):
+                        draw_detections(frame, detections, model.names)
+                    with metrics.timer("camera.display"):
+                        st_frames[stream].image(frame, channels="BGR", caption=sources[stream])
+                st_stats.dataframe(streams.summary(), hide_index=True, use_container_width=True)
+    except IOError as e:
+        _set_camera_running(False)
+        st.error(f"{e}. Check your hardware or permissions.")
+        return
+
+    _set_camera_running(False)
+    st.warning("No frames received from any camera. Stopping analysis.")
 
 # Streamlit UI
 st.title("Infrastructure Management System")
@@ -96,35 +90,66 @@ data_mode = st.radio("Select data source:", ("Upload a video", "Use real-time ca
 if data_mode == "Upload a video":
     uploaded_file = st.file_uploader("Upload a video file:", type=["mp4", "avi", "mov"])
     if uploaded_file:
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file.write(uploaded_file.read())
-            uploaded_video_path = temp_file.name
-
         model_choice = st.selectbox("Choose the model to use:", ("Road Defect Model", "Bridge Defect Model"))
-        model = model_road if model_choice == "Road Defect Model" else model_bridge
+        with st.expander("Processing settings"):
+            batch_size = st.number_input("Inference batch size (frames)", min_value=1, max_value=64, value=VIDEO_BATCH_SIZE)
+            queue_depth = st.number_input("Frame queue depth", min_value=1, max_value=256, value=VIDEO_QUEUE_DEPTH)
+            keyframe_interval = st.number_input(
+                "Run detection every k-th frame (1 = every frame)",
+                min_value=1,
+                max_value=60,
+                value=VIDEO_KEYFRAME_INTERVAL,
+                help="Frames in between reuse tracked boxes, and each defect is counted once.",
+            )
 
         if st.button("Analyze Video"):
-            st.info("Analyzing video. Please wait...")
-            with st.spinner('Analyzing...'):
-                annotated_video_path = analyze_video(uploaded_video_path, model)
-            st.success("Analysis complete! The annotated video is ready.")
-            download_file(annotated_video_path, "Download Annotated Video")
+            video_path = save_upload(uploaded_file)
+            if video_path:
+                job_id = enqueue_video_job(
+                    video_path,
+                    MODEL_NAMES[model_choice],
+                    {
+                        "batch_size": int(batch_size),
+                        "queue_depth": int(queue_depth),
+                        "keyframe_interval": int(keyframe_interval),
+                    },
+                    owner=session_owner(),
+                )
+                session_workspace().discard(video_path)  # The job moved the file into its own directory
+                st.success(f"Video queued as job {job_id}. You can leave this page and download the result later.")
+
+    st.subheader("Analysis Jobs")
+    job_list()
+    job_download()
 
 elif data_mode == "Use real-time camera":
     model_choice = st.selectbox("Choose the model to use:", ("Road Defect Model", "Bridge Defect Model"))
-    model = model_road if model_choice == "Road Defect Model" else model_bridge
-
-    if st.button("Start Camera Analysis"):
+    sources = st.text_input(
+        "Camera sources",
+        value=", ".join(CAMERA_SOURCES),
+        help="Comma-separated device indices, RTSP URLs or video files. Several sources share one model.",
+    )
+    sources = [s.strip() for s in sources.split(",") if s.strip()]
+
+    st.button("Start Camera Analysis", on_click=_set_camera_running, args=(True,))
+    if st.session_state.get("camera_running"):
+        model = get_model(MODEL_NAMES[model_choice])
         st.info("Initializing camera...")
-        analyze_camera_feed(model)
+        if len(sources) > 1:
+            analyze_camera_feeds(model, sources)
+        else:
+            analyze_camera_feed(model, sources[0] if sources else CAMERA_SOURCE)
 
 # Generate PDF report
 if st.button("Generate Report"):
-    st.info("Generating defect report...")
-    pdf_path = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf").name
-
-    # Placeholder for defect extraction logic
-    defects_summary = ["Defect 1: Crack on road", "Defect 2: Spalling on bridge"]  # Replace with actual data
-
-    generate_pdf_report(defects_summary, pdf_path)
-    download_file(pdf_path, "Download PDF Report")
+    finished = [job for job in list_jobs(limit=50, owner=session_owner()) if job["status"] == "done"]
+    if not finished:
+        st.warning("No finished analysis jobs to report on yet.")
+    else:
+        st.info("Generating defect report...")
+        st.download_button(
+            label="Download PDF Report",
+            data=video_report(finished),
+            file_name="defect_report.pdf",
+            mime="application/pdf",
+        )
@@ -0,0 +1,253 @@
+"""Inspect a folder (or manifest) of photos without the web app.
+
+Examples, from the repository root:
+
+    python batch_inspect.py site_photos/ --inventory-id 12 --models road,bridge --fusion wbf
+    python batch_inspect.py site_photos/ --workers 4 --pdf          # site_photos/<inventory id>/*.jpg
+    python batch_inspect.py --manifest visit.csv --run visit-2024-11  # path,inventory_id[,severity,length,width]
+    python batch_inspect.py site_photos/ --match-gps 0.2             # nearest asset within 200 m of the EXIF GPS
+
+Photos are spread over a process pool; every worker loads its own copy of
+the models once. Annotated images are written next to the other inspection
+images and the ``inspections`` rows are inserted in bulk transactions,
+together with a record of which inputs the run has finished, so an
+interrupted run started again with the same ``--run`` name skips them.
+Images (and PDFs) written for photos whose rows never reached the database
+are deleted before those photos are inspected again. Photos are decoded and
+cached exactly as the Photo Upload page does, so both give the same
+detections.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import numpy as np
+
+from utils import db, metrics
+from utils.backends import BACKENDS, MODEL_BACKEND
+from utils.detection_cache import content_hash
+from utils.imaging import INSPECTION_MAX_SIDE, decode_image, encode_jpeg, gps_coordinates
+from utils.inspection import INSPECTION_IMAGE_DIR, detect_defects, inspection_image_path, inspection_row
+from utils.startup import pin_threads
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Per-worker state, set up once by _init_worker
+_worker = {}
+
+
+def find_tasks(args):
+    """Return ``[(source, inventory_id, severity, length, width)]`` from a manifest or directory."""
+    if args.manifest:
+        base = os.path.dirname(os.path.abspath(args.manifest))
+        with open(args.manifest, newline="") as f:
+            return [
+                (os.path.normpath(os.path.join(base, row["path"])), int(row["inventory_id"]),
+                 row.get("severity") or args.severity, float(row.get("length") or 0), float(row.get("width") or 0))
+                for row in csv.DictReader(f)
+            ]
+
+    tasks = []
+    for root, dirs, files in os.walk(args.directory):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            inventory_id = args.inventory_id
+            if inventory_id is None:
+                # Without --inventory-id, photos are filed under <directory>/<inventory id>/
+                folder = os.path.relpath(path, args.directory).split(os.sep)[0]
+                if folder.isdigit():
+                    inventory_id = int(folder)
+                elif args.match_gps:
+                    inventory_id = _nearest_asset(path, args.match_gps)
+                if inventory_id is None:
+                    continue
+            tasks.append((os.path.normpath(path), inventory_id, args.severity, args.length, args.width))
+    return tasks
+
+
+def _nearest_asset(path, max_km):
+    position = gps_coordinates(path)
+    if position is None:
+        return None
+    nearest = db.nearest_assets(*position, limit=1, max_km=max_km)
+    return nearest[0][0] if nearest else None
+
+
+def _init_worker(db_path, model_names, backend, torch_threads, options):
+    db.DB_PATH = db_path
+    metrics.start_exporter()
+    pin_threads(torch_threads)
+    from utils.models import get_model
+
+    _worker["models"] = [get_model(name, backend) for name in model_names]
+    _worker.update(options)
+
+
+def _inspect(task):
+    """Worker: detect, write the annotated image (and PDF); return the result for the parent."""
+    source, inventory_id, severity, length, width = task
+    start = time.perf_counter()
+    try:
+        # Like Views/System.py: reduced size unless tiling, keyed by the file's content hash
+        with open(source, "rb") as f:
+            image_key = content_hash(f)
+            image = decode_image(f, max_side=None if _worker["tiling"] else INSPECTION_MAX_SIDE)
+        _, defects = detect_defects(
+            image, _worker["models"], _worker["classes"], _worker["fusion"], _worker["tiling"],
+            image_key=image_key, in_place=True,
+        )
+        annotated = encode_jpeg(image)
+        inspected_at = datetime.now()
+        stem = os.path.splitext(os.path.basename(source))[0]
+        image_path = inspection_image_path(inventory_id, inspected_at, _worker["output_dir"], suffix=f"_{stem}")
+        with open(image_path, "wb") as f:
+            f.write(annotated)
+        row = inspection_row(inventory_id, defects, severity, length, width, image_path, inspected_at)
+
+        if _worker["pdf"]:
+            from utils.reports import inspection_report
+
+            inventory = db.get_inventory(inventory_id)
+            if inventory:
+                with open(os.path.splitext(image_path)[0] + ".pdf", "wb") as f:
+                    f.write(inspection_report(inventory, defects, length, width, annotated))
+        return {"source": source, "row": row, "error": None, "seconds": time.perf_counter() - start}
+    except Exception as e:
+        return {"source": source, "row": None, "error": f"{type(e).__name__}: {e}",
+                "seconds": time.perf_counter() - start}
+
+
+def remove_orphans(pending, output_dir):
+    """Delete images and PDFs written for ``pending`` photos whose inspection rows were never committed.
+
+    They are left behind when a run is interrupted between writing the
+    files and flushing the rows; the photos are inspected again anyway.
+    """
+    if not os.path.isdir(output_dir):
+        return 0
+    wanted = {(str(inventory_id), os.path.splitext(os.path.basename(source))[0])
+              for source, inventory_id, *_ in pending}
+    candidates = {}
+    for name in os.listdir(output_dir):
+        stem, ext = os.path.splitext(name)
+        parts = stem.split("_", 3)  # inspection_<inventory id>_<timestamp>_<photo stem>
+        if ext in (".jpg", ".pdf") and len(parts) == 4 and parts[0] == "inspection" and \
+                (parts[1], parts[3]) in wanted:
+            candidates.setdefault(int(parts[1]), []).append(name)
+    removed = 0
+    for inventory_id, names in candidates.items():
+        kept = {os.path.splitext(os.path.abspath(row[7]))[0] for row in db.fetch_inspections(inventory_id) if row[7]}
+        for name in names:
+            path = os.path.join(output_dir, name)
+            if os.path.splitext(os.path.abspath(path))[0] not in kept:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def _flush(run, results):
+    # Failed photos are not marked done, so a resumed run tries them again
+    done = [r for r in results if r["row"]]
+    db.add_batch_inspections(run, [r["source"] for r in done], [r["row"] for r in done],
+                             datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", nargs="?", help="Folder of photos (searched recursively)")
+    parser.add_argument("--manifest", help="CSV with path,inventory_id and optional severity,length,width")
+    parser.add_argument("--inventory-id", type=int, help="Asset for every photo in the folder")
+    parser.add_argument("--run", help="Run name used to resume (default: the folder or manifest name)")
+    parser.add_argument("--match-gps", type=float, metavar="KM",
+                        help="Link photos outside <inventory id>/ folders to the nearest asset within KM of their GPS tag")
+    parser.add_argument("--models", default="road", help="Comma-separated model registry names")
+    parser.add_argument("--backend", choices=BACKENDS, help=f"Inference backend (default: {MODEL_BACKEND})")
+    parser.add_argument("--classes", help="Comma-separated defect names to keep (default: all)")
+    parser.add_argument("--fusion", choices=["wbf", "nms"], help="Merge detections of several models")
+    parser.add_argument("--tile-size", type=int, help="Run tiled inference with this tile size")
+    parser.add_argument("--severity", default="Medium")
+    parser.add_argument("--length", type=float, default=0.0)
+    parser.add_argument("--width", type=float, default=0.0)
+    parser.add_argument("--output-dir", default=INSPECTION_IMAGE_DIR)
+    parser.add_argument("--pdf", action="store_true", help="Also write a PDF report per photo")
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) // 2, 1))
+    parser.add_argument("--commit-every", type=int, default=50, help="Inspections per database transaction")
+    args = parser.parse_args()
+    if bool(args.directory) == bool(args.manifest):
+        parser.error("give either a directory or --manifest")
+
+    db.init_db()
+    run = args.run or os.path.basename(os.path.normpath(args.directory or args.manifest))
+    tasks = find_tasks(args)
+    done = db.batch_done_sources(run)
+    pending = [task for task in tasks if task[0] not in done]
+    print(f"Run '{run}': {len(tasks)} photos, {len(tasks) - len(pending)} already done, {len(pending)} to inspect")
+    if not pending:
+        return 0
+    removed = remove_orphans(pending, args.output_dir)
+    if removed:
+        print(f"Removed {removed} files left by an interrupted run")
+
+    options = {
+        "classes": args.classes.split(",") if args.classes else None,
+        "fusion": args.fusion,
+        "tiling": {"tile_size": args.tile_size} if args.tile_size else None,
+        "output_dir": args.output_dir,
+        "pdf": args.pdf,
+    }
+    torch_threads = max((os.cpu_count() or 1) // args.workers, 1)
+    buffer, latencies, errors = [], [], 0
+    start = last_report = time.perf_counter()
+    completed = 0
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(db.DB_PATH, args.models.split(","), args.backend, torch_threads, options),
+    ) as pool:
+        queue = iter(pending)
+        # Keep a bounded number of photos in flight so results stream back in order of completion
+        in_flight = {pool.submit(_inspect, task) for task in _take(queue, args.workers * 4)}
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            in_flight |= {pool.submit(_inspect, task) for task in _take(queue, len(finished))}
+            for future in finished:
+                result = future.result()
+                completed += 1
+                latencies.append(result["seconds"])
+                if result["error"]:
+                    errors += 1
+                    print(f"  {result['source']}: {result['error']}", file=sys.stderr)
+                buffer.append(result)
+            if len(buffer) >= args.commit_every or not in_flight:
+                _flush(run, buffer)
+                buffer = []
+            now = time.perf_counter()
+            if now - last_report >= 2 or not in_flight:
+                last_report = now
+                rate = completed / (now - start)
+                eta = (len(pending) - completed) / rate if rate else 0
+                print(f"  {completed}/{len(pending)} photos, {rate:.2f} photos/s, ETA {eta:.0f}s")
+
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    print(f"Inspected {completed - errors} photos ({errors} failed) in {elapsed:.1f}s: "
+          f"{completed / elapsed:.2f} photos/s with {args.workers} workers; per photo "
+          f"p50 {np.percentile(latencies, 50):.0f} ms, p95 {np.percentile(latencies, 95):.0f} ms")
+    return 1 if errors else 0
+
+
+def _take(iterator, n):
+    return [task for _, task in zip(range(n), iterator)]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
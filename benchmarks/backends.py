@@ -0,0 +1,155 @@
+"""Compare inference backends for accuracy against PyTorch and for latency.
+
+Run from the repository root:
+
+    python -m benchmarks.backends --images inspection_images --models road,bridge
+    python -m benchmarks.backends --backends torch,onnx-int8 --output backend_report.md
+
+For every model and backend the report lists the export/load time, the
+artifact size, per-image latency (p50/p95) and agreement with the PyTorch
+FP32 detections on the same photos: precision, recall and F1 of
+class-aware matches at IoU 0.5, and the mean confidence drift of matched
+boxes. Without labelled data, PyTorch is the reference, so the numbers
+measure what a faster backend loses, not absolute accuracy. Only the
+held-out photos are evaluated, never those the INT8 models were
+calibrated on.
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from utils.backends import BACKENDS, artifact_bytes, exported_model_path, holdout_images
+from utils.boxes import iou_matrix
+from utils.models import get_model, weights_digest, weights_path
+from utils.postprocess import detect
+
+
+def match(reference, candidate, iou_threshold=0.5):
+    """Greedily match class-aware boxes; return (true positives, confidence differences)."""
+    if not len(reference) or not len(candidate):
+        return 0, []
+    iou = iou_matrix(reference[:, :4], candidate[:, :4])
+    iou[reference[:, None, 5] != candidate[None, :, 5]] = 0.0
+    matched_ref, matched_cand, diffs = set(), set(), []
+    for flat in np.argsort(iou, axis=None)[::-1]:
+        r, c = np.unravel_index(flat, iou.shape)
+        if iou[r, c] < iou_threshold:
+            break
+        if r in matched_ref or c in matched_cand:
+            continue
+        matched_ref.add(r)
+        matched_cand.add(c)
+        diffs.append(abs(float(reference[r, 4]) - float(candidate[c, 4])))
+    return len(matched_ref), diffs
+
+
+def evaluate(name, backend, images, reference, repeat):
+    start = time.perf_counter()
+    model = get_model(name, backend)
+    load_seconds = time.perf_counter() - start
+    path = exported_model_path(weights_path(name), backend, weights_digest(name))
+    detect(model, images[0])  # Warm-up
+    latencies, outputs = [], []
+    for image in images:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            detections = detect(model, image)[0]
+            latencies.append(time.perf_counter() - start)
+        outputs.append(detections)
+
+    latencies = np.array(latencies) * 1000
+    row = {
+        "model": name,
+        "backend": backend,
+        "load_s": load_seconds,
+        "size_mb": artifact_bytes(path) / (1024 * 1024),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+    if reference is None:
+        # This is the reference run (or PyTorch was not evaluated)
+        return row, outputs
+
+    tp = n_ref = n_cand = 0
+    diffs = []
+    for ref, cand in zip(reference, outputs):
+        matched, d = match(ref, cand)
+        tp += matched
+        diffs += d
+        n_ref += len(ref)
+        n_cand += len(cand)
+    precision = tp / n_cand if n_cand else 1.0
+    recall = tp / n_ref if n_ref else 1.0
+    row.update({
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "conf_drift": float(np.mean(diffs)) if diffs else 0.0,
+    })
+    return row, outputs
+
+
+def markdown(rows):
+    lines = [
+        "| model | backend | load s | size MB | p50 ms | p95 ms | speed-up | precision | recall | F1 | conf drift |",
+        "|---|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    torch_p50 = {r["model"]: r["p50_ms"] for r in rows if r["backend"] == "torch" and "error" not in r}
+    for r in rows:
+        if "error" in r:
+            lines.append(f"| {r['model']} | {r['backend']} | unavailable: {r['error']} |" + " |" * 8)
+            continue
+        speedup = torch_p50.get(r["model"], r["p50_ms"]) / r["p50_ms"]
+        agreement = " | ".join(
+            f"{r[k]:.3f}" if k in r else "reference" for k in ("precision", "recall", "f1", "conf_drift")
+        )
+        lines.append(
+            f"| {r['model']} | {r['backend']} | {r['load_s']:.1f} | {r['size_mb']:.1f} | {r['p50_ms']:.1f} | "
+            f"{r['p95_ms']:.1f} | {speedup:.2f}x | {agreement} |"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", default="inspection_images", help="Folder of photos; its held-out split is used")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum number of photos")
+    parser.add_argument("--models", default="road,bridge")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per photo")
+    parser.add_argument("--output", help="Write the report as Markdown (.md) or JSON (.json)")
+    args = parser.parse_args()
+
+    images = [cv2.imread(path) for path in holdout_images(args.images, args.limit)]
+    backends = [b for b in args.backends.split(",") if b]
+    if "torch" in backends:
+        backends = ["torch"] + [b for b in backends if b != "torch"]
+    rows = []
+    for name in args.models.split(","):
+        reference = None
+        for backend in backends:
+            print(f"{name} / {backend} ...", flush=True)
+            try:
+                row, outputs = evaluate(name, backend, images, reference, args.repeat)
+            except Exception as e:
+                rows.append({"model": name, "backend": backend, "error": f"{type(e).__name__}: {e}"})
+                continue
+            if backend == "torch":
+                reference = outputs
+            rows.append(row)
+
+    table = markdown(rows)
+    print(table)
+    if args.output:
+        with open(args.output, "w") as f:
+            if args.output.endswith(".json"):
+                json.dump(rows, f, indent=2)
+            else:
+                f.write(f"# Backend comparison ({len(images)} held-out photos from {args.images})\n\n{table}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark request latency against the number of concurrent users.
+
+Each user is a thread that repeatedly sends one frame, as a camera session
+does. Direct calls into an in-process model are compared with calls through
+the shared inference server (:mod:`utils.inference_server`), which runs in
+a child process with the same model. Run from the repository root:
+
+    python -m benchmarks.inference_server --users 1,2,4,8,16
+    python -m benchmarks.inference_server --model road  # The real model instead of the stub
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.stub import StubModel, synthetic_image
+from utils import inference_server
+from utils.postprocess import detect
+
+
+def _stub_loader():
+    models = {}
+
+    def load(name, backend):
+        return models.setdefault((name, backend), StubModel())
+    return load
+
+
+def run_users(model, users, requests, width, height):
+    """Return per-request latencies in milliseconds for ``users`` threads sending ``requests`` frames each."""
+    latencies = []
+    lock = threading.Lock()
+
+    def user(seed):
+        frame = synthetic_image(width, height, seed=seed)
+        mine = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            detect(model, frame)
+            mine.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", default="1,2,4,8,16", help="Comma-separated numbers of concurrent users")
+    parser.add_argument("--model", default="stub", help="Model registry name, or 'stub'")
+    parser.add_argument("--requests", type=int, default=50, help="Frames sent by each user")
+    parser.add_argument("--workers", type=int, default=inference_server.INFERENCE_SERVER_WORKERS)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    args = parser.parse_args()
+
+    if args.model == "stub":
+        loader, direct = _stub_loader, StubModel()
+    else:
+        from utils.models import ModelRegistry
+
+        loader, direct = inference_server.registry_loader, ModelRegistry().get(args.model)
+    address = os.path.join(tempfile.mkdtemp(prefix="inference-"), "server.sock")
+    server = multiprocessing.Process(target=inference_server.serve, args=(address, args.workers, loader), daemon=True)
+    server.start()
+    remote = inference_server.RemoteModel(args.model, None, address)
+    remote.names  # Waits for the server to start and load the model
+
+    print(f"{args.model}, {args.width}x{args.height}, {args.requests} requests per user, "
+          f"{args.workers} server worker(s), {os.cpu_count()} CPUs")
+    print(f"{'users':>6} {'direct p50':>11} {'p95':>7} {'p99':>7} {'server p50':>11} {'p95':>7} {'p99':>7}")
+    try:
+        for users in (int(n) for n in args.users.split(",")):
+            row = f"{users:>6}"
+            for model in (direct, remote):
+                latencies = run_users(model, users, args.requests, args.width, args.height)
+                row += "".join(f" {np.percentile(latencies, q):>{11 if q == 50 else 7}.1f}" for q in (50, 95, 99))
+            print(row)
+        stats = inference_server.server_stats(address)["metrics"]["counters"]
+        print(f"Server ran {stats['inference_server.frames']} frames in {stats['inference_server.batches']} batches")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
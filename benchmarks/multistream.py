@@ -0,0 +1,95 @@
+"""Benchmark multi-stream ingestion against the number of streams.
+
+Each stream is a synthetic video read as fast as it decodes. The shared
+batched detector (:class:`utils.multistream.MultiStream`) is compared with
+one model copy per stream, each on its own thread, processing frame by
+frame. Run from the repository root:
+
+    python -m benchmarks.multistream --streams 1,2,4,8
+    python -m benchmarks.multistream --model road  # The real model instead of the stub
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.stub import StubModel, synthetic_video
+from utils.camera import latest_frames, open_camera
+from utils.multistream import MultiStream
+from utils.postprocess import model_predictor
+
+
+def _load_model(args):
+    if args.model == "stub":
+        return StubModel(latency_ms=args.stub_latency_ms)
+    # A fresh instance rather than the registry's shared one, so copies really are copies
+    from ultralytics import YOLO
+    from utils.models import weights_path
+    return YOLO(weights_path(args.model), task="detect")
+
+
+def run_shared(sources, model, batch_size):
+    """Return ``(frames processed, seconds, per-stream summary)`` with one shared batched model."""
+    predict = model_predictor(model)
+    start = time.perf_counter()
+    with MultiStream(sources, batch_size=batch_size, realtime=False) as streams:
+        frames = sum(len(results) for results in streams.detections(predict))
+    return frames, time.perf_counter() - start, streams.summary()
+
+
+def run_copies(sources, load):
+    """Return ``(frames processed, seconds)`` with one model copy and thread per stream."""
+    counts = [0] * len(sources)
+    predictors = [model_predictor(load()) for _ in sources]
+
+    def consume(i):
+        with open_camera(sources[i], realtime=False) as capture:
+            for frame, _ in latest_frames(capture):
+                predictors[i]([frame])
+                counts[i] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=consume, args=(i,)) for i in range(len(sources))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", default="1,2,4,8", help="Comma-separated stream counts")
+    parser.add_argument("--model", default="stub", help="Model registry name, or 'stub'")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Extra per-frame latency of the stub")
+    parser.add_argument("--batch-size", type=int, default=0, help="Frames per inference call (0: one per stream)")
+    parser.add_argument("--frames", type=int, default=300, help="Frames per synthetic stream")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--copies", action="store_true", help="Also run one model copy per stream")
+    parser.add_argument("--verbose", action="store_true", help="Print per-stream stats")
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.streams.split(",")]
+    model = _load_model(args)
+    with tempfile.TemporaryDirectory(prefix="multistream-") as workdir:
+        videos = [synthetic_video(os.path.join(workdir, f"stream{i}.mp4"), args.width, args.height, args.frames,
+                                  seed=i) for i in range(max(counts))]
+        print(f"{args.model}, {args.width}x{args.height}, {args.frames} frames per stream, {os.cpu_count()} CPUs")
+        header = f"{'streams':>8} {'shared fps':>11} {'per stream':>11}"
+        print(header + (f" {'copies fps':>11}" if args.copies else ""))
+        for n in counts:
+            frames, seconds, summary = run_shared(videos[:n], model, args.batch_size)
+            line = f"{n:>8} {frames / seconds:>11.1f} {frames / seconds / n:>11.1f}"
+            if args.copies:
+                copy_frames, copy_seconds = run_copies(videos[:n], lambda: _load_model(args))
+                line += f" {copy_frames / copy_seconds:>11.1f}"
+            print(line)
+            if args.verbose:
+                for row in summary:
+                    print("         ", row)
+
+
+if __name__ == "__main__":
+    main()
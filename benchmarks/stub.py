@@ -0,0 +1,79 @@
+"""Offline stand-ins for the YOLO models and inspection media.
+
+``StubModel`` follows the slice of the ultralytics API the app uses
+(``names``, ``predict`` returning results with ``boxes.data``) and does a
+small, deterministic amount of image work per frame, so benchmarks exercise
+the real pre/post-processing without weights, torch or a network.
+"""
+import time
+import types
+
+import cv2
+import numpy as np
+
+
+class StubModel:
+    """Deterministic fake detector: bright blobs on a coarse grid become boxes."""
+
+    names = {0: "crack", 1: "pothole", 2: "spalling"}
+
+    def __init__(self, imgsz=640, grid=16, latency_ms=0.0):
+        self.imgsz = imgsz
+        self.grid = grid
+        self.latency_ms = latency_ms
+
+    def _detect_one(self, image):
+        height, width = image.shape[:2]
+        scale = self.imgsz / max(height, width)
+        small = cv2.resize(image, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                           interpolation=cv2.INTER_LINEAR)
+        grey = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        cell = max(min(grey.shape) // self.grid, 1)
+        rows, cols = grey.shape[0] // cell, grey.shape[1] // cell
+        means = grey[:rows * cell, :cols * cell].reshape(rows, cell, cols, cell).mean(axis=(1, 3))
+        ys, xs = np.nonzero(means > 170)
+        conf = np.clip(means[ys, xs] / 255.0, 0, 1)
+        boxes = np.stack([xs * cell, ys * cell, (xs + 1) * cell, (ys + 1) * cell], axis=1) / scale
+        cls = (ys + xs) % len(self.names)
+        return np.column_stack([boxes, conf, cls]).astype(np.float32)
+
+    def predict(self, images, verbose=False, classes=None, **kwargs):
+        if not isinstance(images, list):
+            images = [images]
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(images) / 1000)
+        results = []
+        for image in images:
+            detections = self._detect_one(image)
+            if classes is not None:
+                detections = detections[np.isin(detections[:, 5], classes)]
+            results.append(types.SimpleNamespace(boxes=types.SimpleNamespace(data=detections)))
+        return results
+
+    __call__ = predict
+
+
+def synthetic_image(width=1920, height=1080, seed=0, defects=12):
+    """Return a BGR road-surface-like image with bright crack strokes and patches."""
+    rng = np.random.default_rng(seed)
+    image = rng.normal(90, 20, (height, width, 1)).clip(0, 255).astype(np.uint8).repeat(3, axis=2)
+    for _ in range(defects):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        if rng.random() < 0.5:
+            points = np.cumsum(rng.integers(-40, 40, (8, 2)), axis=0) + (x, y)
+            cv2.polylines(image, [points.astype(np.int32)], False, (230, 230, 230), max(width // 400, 2))
+        else:
+            size = int(rng.integers(width // 40, width // 10))
+            cv2.rectangle(image, (x, y), (x + size, y + size // 2), (240, 240, 240), -1)
+    return image
+
+
+def synthetic_video(path, width=640, height=360, frames=120, fps=25, seed=0):
+    """Write a video of a slowly panning synthetic surface to ``path``."""
+    surface = synthetic_image(width * 2, height, seed)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(frames):
+        x = int(i * width / max(frames, 1))
+        out.write(np.ascontiguousarray(surface[:, x:x + width]))
+    out.release()
+    return path
@@ -0,0 +1,281 @@
+"""Offline benchmark suite for the detection, video, report and database paths.
+
+Run from the repository root:
+
+    python -m benchmarks.suite --save-baseline          # record benchmarks/baseline.json
+    python -m benchmarks.suite                          # compare against it, exit 1 on regression
+    python -m benchmarks.suite --stages detect,video --width 3840 --height 2160 --frames 300
+
+Every stage runs on synthetic media and the stub model from
+``benchmarks.stub``, so no weights, GPU or network are needed. For each
+stage the suite reports throughput, latency percentiles over ``--repeat``
+runs and the peak Python-heap allocation of one extra traced run. A stage
+whose median latency exceeds the baseline by more than ``--threshold``
+counts as a regression.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from benchmarks.stub import StubModel, synthetic_image, synthetic_video
+from utils import db
+from utils.detection_log import DetectionLogWriter
+from utils.postprocess import detect, draw_detections, filter_classes, model_predictor
+from utils.reports import batch_report, inspection_report
+from utils.tiling import tiled_detect
+from utils.video import run_video_pipeline
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Options that do not change what a stage measures, so baselines stay comparable
+_RUN_OPTIONS = ("stages", "repeat", "threshold", "output", "baseline", "save_baseline")
+
+
+# Each stage takes the parsed args and a scratch directory and returns
+# (run, items, unit): run() does one timed iteration covering ``items`` units.
+
+def stage_detect(args, workdir):
+    """Photo inspection: inference, class filter, drawing and JPEG encoding."""
+    model = StubModel()
+    image = synthetic_image(args.width, args.height)
+    selected = [0, 1]
+
+    def run():
+        detections = filter_classes(detect(model, image)[0], selected)
+        annotated = draw_detections(image.copy(), detections, model.names)
+        cv2.imencode(".jpg", annotated)
+    return run, 1, "image"
+
+
+def stage_tiled(args, workdir):
+    """Tiled photo inspection at the default tile size."""
+    model = StubModel()
+    image = synthetic_image(args.width, args.height)
+    return (lambda: tiled_detect(image, model)), 1, "image"
+
+
+def _video_stage(args, workdir, keyframe_interval):
+    model = StubModel()
+    video = synthetic_video(os.path.join(workdir, "input.mp4"), args.video_width, args.video_height, args.frames)
+    output = os.path.join(workdir, f"output_k{keyframe_interval}.mp4")
+    predict = model_predictor(model)
+
+    def run():
+        log = DetectionLogWriter(25, model.names)
+        run_video_pipeline(video, output, predict, lambda frame, dets: draw_detections(frame, dets, model.names),
+                           keyframe_interval=keyframe_interval, log=log)
+        log.save(os.path.join(workdir, "output.detections.npz"))
+    return run, args.frames, "frame"
+
+
+def stage_video(args, workdir):
+    """Video job path: decode, batched inference, drawing, encoding and detection log."""
+    return _video_stage(args, workdir, 1)
+
+
+def stage_video_keyframe(args, workdir):
+    """Video with detection on every 4th frame and IoU tracking in between."""
+    return _video_stage(args, workdir, 4)
+
+
+def _seed_database(args, workdir):
+    db.DB_PATH = os.path.join(workdir, "bench.db")
+    db.init_db()
+    image_path = os.path.join(workdir, "inspection.jpg")
+    cv2.imwrite(image_path, synthetic_image(args.width, args.height))
+    if not db.fetch_inventory():
+        # Spread the assets over roughly 100 x 100 km
+        coords = np.random.default_rng(1).uniform((-15.9, 27.9), (-15.0, 28.8), (args.assets, 2))
+        for i, (lat, lon) in enumerate(coords.tolist()):
+            db.add_inventory(f"Asset {i}", f"District {i % 10}", "Bridge" if i % 2 else "Road", 1950 + i % 70,
+                             lat, lon)
+    return image_path
+
+
+def _inspection_rows(args, image_path, n):
+    rng = np.random.default_rng(0)
+    return [{
+        "inventory_id": int(rng.integers(1, args.assets + 1)),
+        "date": f"2024-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d} 12:00:00",
+        "defects": "crack, pothole",
+        "severity": "Medium",
+        "length": 1.5,
+        "width": 0.2,
+        "image_path": image_path,
+    } for _ in range(n)]
+
+
+def stage_db_insert(args, workdir):
+    """Bulk inspection insert with last_inspection updates."""
+    rows = _inspection_rows(args, _seed_database(args, workdir), args.rows)
+    return (lambda: db.add_inspections(rows)), args.rows, "row"
+
+
+def stage_db_query(args, workdir):
+    """Walk every page of a filtered inventory search, then read each asset's history."""
+    _seed_database(args, workdir)
+    db.add_inspections(_inspection_rows(args, None, args.rows))
+
+    def run():
+        after_id = 0
+        while True:
+            page = db.query_inventory(search="District", type_="Bridge", after_id=after_id, limit=50)
+            if not page:
+                break
+            for row in page:
+                db.fetch_inspections(row[0])
+            after_id = page[-1][0]
+    return run, args.assets // 2, "asset"
+
+
+def stage_db_spatial(args, workdir):
+    """Nearest-asset lookups for photo GPS positions, plus one map-view bounding box."""
+    _seed_database(args, workdir)
+    points = np.random.default_rng(2).uniform((-15.9, 27.9), (-15.0, 28.8), (100, 2)).tolist()
+
+    def run():
+        for lat, lon in points:
+            db.nearest_assets(lat, lon, limit=3)
+        db.assets_in_bbox(-15.6, 28.1, -15.4, 28.4)
+    return run, len(points), "lookup"
+
+
+def stage_report(args, workdir):
+    """Single inspection PDF with the annotated photo embedded."""
+    image = cv2.cvtColor(synthetic_image(args.width, args.height), cv2.COLOR_BGR2RGB)
+    inventory = (1, "Asset 1", "District 1", "Bridge", 1971, None)
+    return (lambda: inspection_report(inventory, ["crack"] * 5, 2.0, 0.3, image)), 1, "report"
+
+
+def stage_report_batch(args, workdir):
+    """District summary PDF streamed from the database."""
+    image_path = _seed_database(args, workdir)
+    db.add_inspections(_inspection_rows(args, image_path, args.report_rows))
+    return (lambda: batch_report(location="District 1")), 1, "report"
+
+
+STAGES = {
+    "detect": stage_detect,
+    "tiled": stage_tiled,
+    "video": stage_video,
+    "video_keyframe": stage_video_keyframe,
+    "db_insert": stage_db_insert,
+    "db_query": stage_db_query,
+    "db_spatial": stage_db_spatial,
+    "report": stage_report,
+    "report_batch": stage_report_batch,
+}
+
+
+def measure(run, items, repeat, warmup=1):
+    """Time ``repeat`` calls of ``run`` and trace the peak allocation of one more."""
+    for _ in range(warmup):
+        run()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latencies = np.array(latencies) * 1000
+    return {
+        "items": items,
+        "throughput": items / (latencies.mean() / 1000),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p90_ms": float(np.percentile(latencies, 90)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "peak_mb": peak / (1024 * 1024),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return ``[(stage, baseline_p50, p50, ratio)]`` for stages slower than ``1 + threshold`` times baseline."""
+    regressions = []
+    for stage, result in results.items():
+        reference = baseline.get("stages", {}).get(stage)
+        if not reference:
+            continue
+        ratio = result["p50_ms"] / max(reference["p50_ms"], 1e-9)
+        if ratio > 1 + threshold:
+            regressions.append((stage, reference["p50_ms"], result["p50_ms"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    parser.add_argument("--width", type=int, default=1920, help="Synthetic photo width")
+    parser.add_argument("--height", type=int, default=1080, help="Synthetic photo height")
+    parser.add_argument("--video-width", type=int, default=640)
+    parser.add_argument("--video-height", type=int, default=360)
+    parser.add_argument("--frames", type=int, default=120, help="Synthetic video length")
+    parser.add_argument("--assets", type=int, default=2000, help="Inventory rows for database stages")
+    parser.add_argument("--rows", type=int, default=5000, help="Inspection rows for database stages")
+    parser.add_argument("--report-rows", type=int, default=200, help="Inspections in the batch report")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Record these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed median slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    results = {}
+    print(f"{'stage':<16} {'throughput':>16} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'peak MB':>8}")
+    for stage in stages:
+        with tempfile.TemporaryDirectory(prefix=f"bench_{stage}_") as workdir:
+            run, items, unit = STAGES[stage](args, workdir)
+            result = measure(run, items, args.repeat)
+        result["unit"] = unit
+        results[stage] = result
+        rate = f"{result['throughput']:.1f} {unit}/s"
+        print(f"{stage:<16} {rate:>16} {result['p50_ms']:>9.1f} {result['p90_ms']:>9.1f} "
+              f"{result['p99_ms']:>9.1f} {result['peak_mb']:>8.1f}")
+
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {k: v for k, v in vars(args).items() if k not in _RUN_OPTIONS},
+        "stages": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != report["config"]:
+        print("Warning: baseline was recorded with different settings; comparisons may be meaningless.")
+    regressions = compare(results, baseline, args.threshold)
+    for stage, before, after, ratio in regressions:
+        print(f"REGRESSION {stage}: p50 {before:.1f} ms -> {after:.1f} ms ({(ratio - 1) * 100:+.0f}%)")
+    if regressions:
+        return 1
+    print(f"No stage slower than baseline by more than {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Benchmark tiled inference throughput against tile count.
+
+Run from the repository root:
+
+    python -m benchmarks.tiling --image inspection_images/20240522_142053.jpg --tile-sizes 320,640,1280
+"""
+import argparse
+import time
+
+import cv2
+
+from utils.models import get_model
+from utils.tiling import TILE_BATCH_SIZE, TILE_OVERLAP, TILE_WORKERS, tile_grid, tiled_detect
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", default="inspection_images/20240522_142053.jpg")
+    parser.add_argument("--model", default="road", help="Model registry name")
+    parser.add_argument("--tile-sizes", default="320,480,640,960,1280")
+    parser.add_argument("--overlap", type=float, default=TILE_OVERLAP)
+    parser.add_argument("--batch-size", type=int, default=TILE_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=TILE_WORKERS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        parser.error(f"Could not read image: {args.image}")
+    model = get_model(args.model)
+    height, width = image.shape[:2]
+    # Warm up so the first row does not pay for model initialisation
+    tiled_detect(image, model, tile_size=max(width, height), include_full_image=False)
+
+    print(f"{args.image}: {width}x{height}, overlap {args.overlap}, batch {args.batch_size}, workers {args.workers}")
+    print(f"{'tile':>6} {'tiles':>6} {'sec/img':>9} {'tiles/s':>9} {'boxes':>6}")
+    for tile_size in (int(t) for t in args.tile_sizes.split(",")):
+        n_tiles = len(tile_grid(width, height, tile_size, args.overlap))
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            detections = tiled_detect(image, model, tile_size=tile_size, overlap=args.overlap,
+                                      batch_size=args.batch_size, workers=args.workers)
+        seconds = (time.perf_counter() - start) / args.repeat
+        print(f"{tile_size:>6} {n_tiles:>6} {seconds:>9.3f} {n_tiles / seconds:>9.1f} {len(detections):>6}")
+
+
+if __name__ == "__main__":
+    main()
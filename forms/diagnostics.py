@@ -0,0 +1,54 @@
+import streamlit as st
+
+from utils import metrics, startup
+
+
+def diagnostics_panel():
+    """Optional sidebar panel with this server process's stage timings and counters."""
+    if not st.sidebar.toggle("Show diagnostics", key="show_diagnostics"):
+        return
+    import pandas as pd  # Only needed once the panel is open; keeps the light pages quick to load
+
+    from utils import inference_server
+
+    snapshot = metrics.snapshot()
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        warmup = startup.status()
+        if warmup["state"] == "failed":
+            st.caption(f"Model warm-up failed: {warmup['error']}")
+        elif warmup["time_to_ready"] is not None:
+            st.caption(
+                f"Models warm {warmup['time_to_ready']:.1f}s after start "
+                f"(first detection after {warmup['time_to_first_detection']:.1f}s)."
+            )
+        else:
+            st.caption(f"Model warm-up: {warmup['state']}.")
+        if not snapshot["timers"] and not snapshot["counters"]:
+            st.caption("No measurements yet.")
+        if snapshot["timers"]:
+            timers = pd.DataFrame.from_dict(snapshot["timers"], orient="index")
+            timers = timers[["count", "mean_ms", "p50_ms", "p95_ms", "max_ms"]].sort_index()
+            st.dataframe(timers.round(1), use_container_width=True)
+        if snapshot["counters"]:
+            st.dataframe(
+                pd.Series(snapshot["counters"], name="count").sort_index(),
+                use_container_width=True,
+            )
+        if inference_server.INFERENCE_SERVER:
+            server = inference_server.server_stats()
+            if server is None:
+                st.caption("Inference server not reachable.")
+            else:
+                counters = server["metrics"]["counters"]
+                batches = counters.get("inference_server.batches", 0)
+                st.caption(
+                    f"Inference server: {server['queue_depth']} queued, "
+                    f"{counters.get('inference_server.frames', 0) / max(batches, 1):.1f} frames per batch, "
+                    f"{counters.get('inference_server.rejected', 0)} rejected."
+                )
+                server_timers = {k: v for k, v in server["metrics"]["timers"].items() if k.startswith("inference_server.")}
+                if server_timers:
+                    timers = pd.DataFrame.from_dict(server_timers, orient="index")
+                    st.dataframe(timers[["count", "mean_ms", "p50_ms", "p95_ms", "max_ms"]].round(1), use_container_width=True)
+        st.caption("Background video jobs run in worker processes and export their own metrics.")
+        st.download_button("Download Prometheus metrics", metrics.prometheus_text(), file_name="metrics.prom")
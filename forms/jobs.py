@@ -0,0 +1,106 @@
+import json
+import os
+
+import streamlit as st
+
+from forms.uploads import session_owner
+from utils.detection_log import load_log
+from utils.jobs import job_progress, list_jobs
+from utils.media import MEDIA_INLINE_MAX_MB, media_url
+
+
+def _segment_path(job, index):
+    return os.path.join(os.path.dirname(job["output_path"]), f"segment_{index:05d}.mp4")
+
+
+def _origin():
+    """Return the app's ``scheme://host`` as this session's browser reached it, or ``None``."""
+    if hasattr(st, "context"):  # Streamlit 1.37+
+        headers = st.context.headers
+    else:
+        from streamlit.web.server.websocket_headers import _get_websocket_headers
+
+        try:
+            headers = _get_websocket_headers() or {}
+        except RuntimeError:  # Not served over a browser websocket (e.g. AppTest)
+            headers = {}
+    if headers.get("Origin"):
+        return headers["Origin"]
+    return f"http://{headers['Host']}" if headers.get("Host") else None
+
+
+def _inline_ok(path):
+    return os.path.getsize(path) <= MEDIA_INLINE_MAX_MB * 1024 * 1024
+
+
+def show_video(path):
+    """Play a job video, streamed from disk by the media server.
+
+    Without the media server, only videos up to ``MEDIA_INLINE_MAX_MB`` are
+    handed to Streamlit, which holds them in memory.
+    """
+    url = media_url(path, origin=_origin())
+    if url:
+        st.video(url)
+    elif _inline_ok(path):
+        st.video(path)
+    else:
+        st.caption("This video is too large to play or download here without the media server.")
+
+
+@st.experimental_fragment(run_every=2)
+def job_list(limit=10):
+    """Show this browser's recent analysis jobs with live progress, refreshed every two seconds."""
+    jobs = list_jobs(limit, owner=session_owner())
+    if not jobs:
+        st.caption("No analysis jobs yet.")
+        return
+
+    for job in jobs:
+        label = f"Job {job['id']} · {job['model']} model · {job['status']}"
+        if job["status"] == "running" and job["frames_total"]:
+            label += f" · frame {job['frames_done']}/{job['frames_total']}"
+        st.progress(job_progress(job), text=label)
+
+        if job["status"] == "running" and job["segments_done"]:
+            # Finished segments are complete H.264 files: watch them while the rest is processed
+            segment = st.selectbox(
+                "Watch processed part",
+                range(job["segments_done"]),
+                format_func=lambda i: f"Part {i + 1}",
+                key=f"job_{job['id']}_segment",
+            )
+            show_video(_segment_path(job, segment))
+        elif job["status"] == "failed":
+            st.error(f"Job {job['id']} failed: {job['error']}")
+        elif job["status"] == "done" and job["summary"]:
+            defect_counts = json.loads(job["summary"])
+            if defect_counts:
+                st.caption("Distinct defects: " + ", ".join(f"{name}: {n}" for name, n in defect_counts.items()))
+
+
+def job_download(limit=10):
+    """Offer the annotated video of one of this browser's finished jobs for download."""
+    finished = [job for job in list_jobs(limit, owner=session_owner()) if job["status"] == "done" and os.path.exists(job["output_path"])]
+    if not finished:
+        return
+    job = st.selectbox("Finished job", finished, format_func=lambda j: f"Job {j['id']} ({j['updated_at']})")
+    show_video(job["output_path"])
+    url = media_url(job["output_path"], download=True, origin=_origin())
+    if url:
+        st.link_button("Download Annotated Video", url)
+    elif _inline_ok(job["output_path"]):
+        # Read into memory only once asked for, not on every rerun
+        if st.button("Prepare Download", key=f"job_{job['id']}_prepare"):
+            with open(job["output_path"], "rb") as file:
+                st.download_button(
+                    label="Download Annotated Video",
+                    data=file.read(),
+                    file_name=f"annotated_job_{job['id']}.mp4",
+                    mime="video/mp4",
+                )
+    # Answered from the job's detection log, without decoding the video
+    log = load_log(job["output_path"])
+    if log is not None and len(log):
+        busiest = log.worst_frames(3)
+        st.caption("Busiest moments: " + ", ".join(f"{t:.1f}s ({int(n)} detections)" for _, t, n in busiest))
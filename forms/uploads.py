@@ -0,0 +1,37 @@
+import secrets
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from utils.workspace import get_workspace
+
+
+def session_workspace():
+    """Return the scratch workspace of the current browser session."""
+    ctx = get_script_run_ctx()
+    return get_workspace(ctx.session_id if ctx else "default")
+
+
+def session_owner():
+    """Return the token that marks this browser's analysis jobs as its own.
+
+    It is kept in the ``owner`` query parameter, so the jobs are still
+    listed after a refresh (a new Streamlit session) or from a bookmark.
+    """
+    owner = st.session_state.get("job_owner") or st.query_params.get("owner") or secrets.token_urlsafe(16)
+    st.session_state["job_owner"] = owner
+    if st.query_params.get("owner") != owner:
+        st.query_params["owner"] = owner
+    return owner
+
+
+def save_upload(uploaded_file):
+    """Stream an uploaded file into the session workspace and return its path.
+
+    Shows an error and returns ``None`` if the workspace quota is exhausted.
+    """
+    try:
+        return session_workspace().ingest_upload(uploaded_file)
+    except OSError as e:
+        st.error(f"Could not store the upload: {e}")
+        return None
@@ -1,5 +1,12 @@
 import streamlit as st
 
+from forms.diagnostics import diagnostics_panel
+from utils import metrics, startup
+
+# Start the inference server, media server and video job pool (resuming unfinished jobs), then load and
+# warm the detection models, all on a background thread while the light pages render
+startup.start_background()
+
 # --- PAGE SETUP ---
 Home = st.Page(
     "Views/Home.py",
@@ -22,6 +29,11 @@ project_3_page = st.Page(
     title="Video and Real Time",
     icon=":material/smart_toy:",
 )
+project_4_page = st.Page(
+    "Views/Trends.py",
+    title="Defect Trends",
+    icon=":material/trending_up:",
+)
 # --- NAVIGATION SETUP [WITHOUT SECTIONS] ---
 # pg = st.navigation(pages=[about_page, project_1_page, project_2_page])
 
@@ -29,7 +41,7 @@ project_3_page = st.Page(
 pg = st.navigation(
     {
         "Main": [Home, project_1_page],
-        "Projects": [project_2_page, project_3_page],
+        "Projects": [project_2_page, project_3_page, project_4_page],
     }
 )
 
@@ -37,6 +49,8 @@ pg = st.navigation(
 # --- SHARED ON ALL PAGES ---
 st.logo("assets/Terminus logo.png")
 st.sidebar.markdown("Made with ❤️ by [Mushili](https://mubangamushili.p@gmail.com)")
+metrics.start_exporter()
+diagnostics_panel()
 
 
 # --- RUN NAVIGATION ---
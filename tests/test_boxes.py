@@ -0,0 +1,48 @@
+import numpy as np
+
+from utils.boxes import iou_matrix, nms, weighted_box_fusion
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float32)
+    np.testing.assert_allclose(iou_matrix(a, b), [[1.0, 50 / 150, 0.0]], rtol=1e-6)
+
+
+def test_nms_keeps_highest_score_per_cluster():
+    dets = np.array([
+        [0, 0, 10, 10, 0.6, 0],
+        [1, 1, 11, 11, 0.9, 0],
+        [50, 50, 60, 60, 0.5, 0],
+    ], dtype=np.float32)
+    assert list(nms(dets, 0.5)) == [1, 2]
+
+
+def test_nms_is_class_aware():
+    dets = np.array([
+        [0, 0, 10, 10, 0.9, 0],
+        [0, 0, 10, 10, 0.8, 1],
+    ], dtype=np.float32)
+    assert sorted(nms(dets, 0.5)) == [0, 1]
+    assert list(nms(dets, 0.5, class_aware=False)) == [0]
+
+
+def test_nms_empty():
+    assert len(nms(np.zeros((0, 6), dtype=np.float32))) == 0
+
+
+def test_weighted_box_fusion():
+    dets = np.array([
+        [0, 0, 10, 10, 0.75, 0],
+        [2, 2, 12, 12, 0.25, 0],
+        [0, 0, 10, 10, 0.5, 1],
+    ], dtype=np.float32)
+    fused = weighted_box_fusion(dets, iou_threshold=0.3)
+    assert fused.shape == (2, 6)
+    by_class = {int(row[5]): row for row in fused}
+    np.testing.assert_allclose(by_class[0][:5], [0.5, 0.5, 10.5, 10.5, 0.5], rtol=1e-6)
+    np.testing.assert_allclose(by_class[1][:5], [0, 0, 10, 10, 0.5], rtol=1e-6)
+
+
+def test_weighted_box_fusion_empty():
+    assert weighted_box_fusion(np.zeros((0, 6), dtype=np.float32)).shape == (0, 6)
@@ -0,0 +1,86 @@
+import pytest
+
+
+def add_assets(db, count):
+    return [db.add_inventory(f"Asset {n}", f"District {n % 3}", "Bridge" if n % 2 else "Road", 1990 + n)
+            for n in range(count)]
+
+
+def test_query_inventory_pages_by_id(temp_db):
+    ids = add_assets(temp_db, 7)
+    pages, after_id = [], 0
+    while page := temp_db.query_inventory(after_id=after_id, limit=3):
+        pages.append([row[0] for row in page])
+        after_id = page[-1][0]
+    assert pages == [ids[0:3], ids[3:6], ids[6:7]]
+
+
+def test_query_inventory_filters(temp_db):
+    ids = add_assets(temp_db, 6)
+    assert [row[0] for row in temp_db.query_inventory(type_="Bridge")] == ids[1::2]
+    assert [row[0] for row in temp_db.query_inventory(built_from=1992, built_to=1993)] == ids[2:4]
+    assert [row[0] for row in temp_db.query_inventory(search="District 1")] == [ids[1], ids[4]]
+    assert [row[0] for row in temp_db.query_inventory(search="asse")] == ids
+
+
+def test_assets_in_bbox_and_nearest(temp_db):
+    near = temp_db.add_inventory("Near", "A", "Bridge", 2000, latitude=51.5, longitude=-0.1)
+    nearer = temp_db.add_inventory("Nearer", "A", "Road", 2000, latitude=51.501, longitude=-0.1)
+    far = temp_db.add_inventory("Far", "B", "Bridge", 2000, latitude=48.85, longitude=2.35)
+    temp_db.add_inventory("Unlocated", "C", "Road", 2000)
+
+    inside = {row[0] for row in temp_db.assets_in_bbox(51, -1, 52, 1)}
+    assert inside == {near, nearer}
+    assert [row[0] for row in temp_db.assets_in_bbox(51, -1, 52, 1, type_="Bridge")] == [near]
+
+    nearest = temp_db.nearest_assets(51.5011, -0.1, limit=2)
+    assert [row[0] for row in nearest] == [nearer, near]
+    assert nearest[0][-1] < nearest[1][-1]
+    assert [row[0] for row in temp_db.nearest_assets(48.85, 2.35, limit=5, max_km=10)] == [far]
+
+
+def test_assets_in_bbox_across_antimeridian(temp_db):
+    east = temp_db.add_inventory("East", "A", "Road", 2000, latitude=-17.0, longitude=179.5)
+    west = temp_db.add_inventory("West", "B", "Road", 2000, latitude=-17.0, longitude=-179.5)
+    temp_db.add_inventory("Elsewhere", "C", "Road", 2000, latitude=-17.0, longitude=0.0)
+    assert {row[0] for row in temp_db.assets_in_bbox(-18, 179, -16, -179)} == {east, west}
+
+
+def inspection(inventory_id, date, defects, severity="Low"):
+    return {"inventory_id": inventory_id, "date": date, "defects": defects, "severity": severity,
+            "length": None, "width": None, "image_path": None}
+
+
+def test_trend_summaries(temp_db):
+    improving, worsening = add_assets(temp_db, 2)
+    temp_db.add_inspections([
+        inspection(improving, "2024-01-10", "Crack, Crack, Pothole", "High"),
+        inspection(worsening, "2024-01-12", ""),
+        inspection(worsening, "2024-02-03", "Crack, Spalling", "Medium"),
+        inspection(improving, "2024-02-20", "Crack"),
+        inspection(worsening, "2024-03-01", ""),
+    ])
+
+    assert temp_db.trend_periods() == ["2024-03", "2024-02", "2024-01"]
+    assert temp_db.defect_totals(since="2024-02") == [
+        ("2024-02", "Crack", 2, 2), ("2024-02", "Spalling", 1, 1),
+    ]
+    assert [row[:6] for row in temp_db.worst_assets("2024-01")] == [
+        (improving, "Asset 0", "District 0", "Road", 1, 3), (worsening, "Asset 1", "District 1", "Bridge", 1, 0),
+    ]
+
+    # The worsening asset's latest month (March, no defects) fell from February
+    assert temp_db.deteriorating_assets() == []
+    temp_db.add_inspections([inspection(worsening, "2024-03-15", "Crack, Crack, Crack, Crack, Crack, Crack", "High")])
+    (row,) = temp_db.deteriorating_assets()
+    assert row[0] == worsening
+    assert row[4:9] == ("2024-03", 3.0, "2024-02", 2.0, 1.0)
+    assert temp_db.get_inventory(worsening)[5] == "2024-03-15"
+
+
+@pytest.mark.parametrize("batch_size", [1, 500])
+def test_iter_inspections_streams_everything(temp_db, batch_size):
+    asset, = add_assets(temp_db, 1)
+    temp_db.add_inspections([inspection(asset, f"2024-01-{day:02d}", "Crack") for day in range(1, 6)])
+    dates = [row[5] for row in temp_db.iter_inspections(batch_size=batch_size)]
+    assert dates == [f"2024-01-{day:02d}" for day in range(1, 6)]
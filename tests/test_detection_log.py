@@ -0,0 +1,43 @@
+import numpy as np
+
+from utils.detection_log import DetectionLog, DetectionLogWriter, concat_logs
+
+NAMES = {0: "crack", 1: "pothole"}
+
+
+def write_segment(path, start_frame, frames):
+    writer = DetectionLogWriter(fps=10, names=NAMES, start_frame=start_frame)
+    for index, detections in enumerate(frames):
+        writer.add(index, np.array(detections, dtype=np.float32).reshape(-1, 7))
+    return writer.save(str(path))
+
+
+def test_concat_logs(tmp_path):
+    first = write_segment(tmp_path / "a.npz", 0, [
+        [[0, 0, 10, 10, 0.9, 0, 1]],
+        [[1, 1, 11, 11, 0.8, 0, 1], [50, 50, 60, 60, 0.7, 1, 2]],
+    ])
+    second = write_segment(tmp_path / "b.npz", 2, [
+        [],
+        [[2, 2, 12, 12, 0.6, 0, 3]],
+        [],
+    ])
+    merged = DetectionLog.load(concat_logs([first, second], str(tmp_path / "all.npz")))
+
+    assert merged.start_frame == 0
+    assert merged.frame_count == 5
+    assert merged.frame.tolist() == [0, 1, 1, 3]
+    np.testing.assert_allclose(merged.time, [0.0, 0.1, 0.1, 0.3], rtol=1e-6)
+    assert merged.track.tolist() == [1, 1, 2, 3]
+    assert merged.counts() == {"crack": 2, "pothole": 1}
+    assert merged.counts(distinct=False) == {"crack": 3, "pothole": 1}
+    assert merged.per_frame_counts().tolist() == [1, 2, 0, 1, 0]
+    assert merged.worst_frames(1) == [(1, 0.1, 2.0)]
+
+
+def test_concat_logs_needs_input(tmp_path):
+    try:
+        concat_logs([], str(tmp_path / "none.npz"))
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
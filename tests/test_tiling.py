@@ -0,0 +1,54 @@
+import types
+
+import numpy as np
+import pytest
+
+from utils.tiling import tile_grid, tiled_detect
+
+
+class BrightBoxModel:
+    """Returns the bounding box of the non-zero pixels of every image, as class 0."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, images, verbose=False, classes=None, **kwargs):
+        if not isinstance(images, list):
+            images = [images]
+        self.calls += 1
+        results = []
+        for image in images:
+            ys, xs = np.nonzero(image[..., 0])
+            if len(xs):
+                data = np.array([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1, 0.9, 0]], dtype=np.float32)
+            else:
+                data = np.zeros((0, 6), dtype=np.float32)
+            results.append(types.SimpleNamespace(boxes=types.SimpleNamespace(data=data)))
+        return results
+
+
+def test_tile_grid_covers_image():
+    grid = tile_grid(1000, 500, tile_size=400, overlap=0.25)
+    assert sorted(set(grid[:, 0])) == [0, 300, 600]
+    assert sorted(set(grid[:, 1])) == [0, 100]
+    assert len(grid) == 6
+
+
+def test_tile_grid_small_image():
+    assert tile_grid(100, 80, tile_size=640).tolist() == [[0, 0]]
+
+
+def test_tile_grid_rejects_bad_overlap():
+    with pytest.raises(ValueError):
+        tile_grid(1000, 1000, overlap=1.0)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_tiled_detect_maps_boxes_to_image(workers):
+    image = np.zeros((600, 900, 3), dtype=np.uint8)
+    image[420:450, 700:760] = 255
+    model = BrightBoxModel()
+    detections = tiled_detect(image, model, tile_size=320, overlap=0.25, batch_size=2, workers=workers,
+                              include_full_image=False)
+    assert len(detections) == 1
+    np.testing.assert_allclose(detections[0, :4], [700, 420, 760, 450])
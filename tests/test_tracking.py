@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+
+from utils.tracking import IoUTracker
+
+
+def det(x, y, cls=0, conf=0.9):
+    return [x, y, x + 20, y + 20, conf, cls]
+
+
+def test_ids_are_stable_across_frames():
+    tracker = IoUTracker()
+    first = tracker.update([det(0, 0), det(100, 100)])
+    second = tracker.update([det(2, 2), det(102, 101)])
+    assert first[:, 6].tolist() == [1, 2]
+    assert second[:, 6].tolist() == [1, 2]
+
+
+def test_classes_never_match():
+    tracker = IoUTracker()
+    tracker.update([det(0, 0, cls=0)])
+    tracked = tracker.update([det(0, 0, cls=1)])
+    assert tracked[:, 6].tolist() == [2]
+    assert tracker.defect_counts() == {0: 1, 1: 1}
+
+
+def test_predict_extrapolates_velocity():
+    tracker = IoUTracker()
+    tracker.update([det(0, 0)])
+    tracker.update([det(10, 0)])
+    predicted = tracker.predict()
+    np.testing.assert_allclose(predicted[0, :4], [20, 0, 40, 20])
+
+
+def test_lost_tracks_are_dropped_but_counted():
+    tracker = IoUTracker(max_missed=1)
+    tracker.update([det(0, 0)])
+    tracker.update([])
+    tracker.update([])
+    assert len(tracker.update([])) == 0
+    assert tracker.defect_counts() == {0: 1}
+    assert tracker.update([det(0, 0)])[:, 6].tolist() == [2]
+
+
+def test_state_round_trip():
+    tracker = IoUTracker(max_missed=1)
+    tracker.update([det(0, 0), det(100, 100, cls=1)])
+    tracker.update([det(5, 0)])
+    restored = IoUTracker.from_state(json.loads(json.dumps(tracker.state())))
+    assert restored.defect_counts() == tracker.defect_counts()
+    np.testing.assert_allclose(restored.update([det(10, 0)]), tracker.update([det(10, 0)]))
+
+
+def test_first_id():
+    tracker = IoUTracker(first_id=7)
+    assert tracker.update([det(0, 0), det(100, 100)])[:, 6].tolist() == [7, 8]
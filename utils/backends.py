@@ -0,0 +1,226 @@
+"""Exported CPU inference backends for the registry models.
+
+The PyTorch weights can be exported once per weights version to ONNX
+(run by ONNX Runtime) or OpenVINO, either in FP32 or INT8. INT8 variants
+are calibrated on our own inspection photos from ``CALIBRATION_DIR``,
+except a held-out share (``HOLDOUT_FRACTION``) kept for evaluation.
+Exports are cached under ``MODEL_CACHE_DIR/<name>/<weights digest>/``, so
+new weights are re-exported automatically and restarts reuse the
+artifacts. ``ultralytics.YOLO`` loads every format behind the same
+``predict`` interface, so the pages do not change.
+
+Exports have dynamic batch and input-size axes: the video pipeline, tiling,
+the ensemble and the inference server send batches of frames at sizes
+other than ``EXPORT_IMGSZ``, which then only sets the calibration size.
+
+Several processes (app, job workers, batch workers) may ask for the same
+export at once. A lock file in the export directory lets one of them
+export while the others wait and then reuse the result. Each export is
+built from a private copy of the weights under a temporary name and
+renamed into place.
+
+ONNX backends need ``onnx`` and ``onnxruntime``; OpenVINO backends need
+``openvino`` (and ``nncf`` for INT8).
+"""
+import glob
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino", "openvino-int8")
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "torch")
+EXPORT_IMGSZ = int(os.environ.get("EXPORT_IMGSZ", "640"))
+CALIBRATION_DIR = os.environ.get("CALIBRATION_DIR", "inspection_images")
+CALIBRATION_IMAGES = int(os.environ.get("CALIBRATION_IMAGES", "64"))
+# Share of the photos kept out of INT8 calibration for evaluating the backends
+HOLDOUT_FRACTION = float(os.environ.get("HOLDOUT_FRACTION", "0.2"))
+
+try:
+    import fcntl
+except ImportError:  # Windows: exports are only serialized within one process
+    fcntl = None
+
+_export_lock = threading.Lock()
+
+
+def _image_paths(directory):
+    paths = sorted(
+        p for ext in ("jpg", "jpeg", "png")
+        for p in glob.glob(os.path.join(directory, "**", f"*.{ext}"), recursive=True)
+    )
+    if not paths:
+        raise FileNotFoundError(f"No images found in {directory}")
+    return paths
+
+
+def _held_out(path, directory):
+    # Hash the relative path so the split does not depend on the sample sizes asked for
+    key = os.path.relpath(path, directory).replace(os.sep, "/").encode()
+    return zlib.crc32(key) / 2 ** 32 < HOLDOUT_FRACTION
+
+
+def _spread(paths, limit):
+    # Spread the sample over the whole collection rather than taking the first folder
+    step = max(len(paths) // limit, 1)
+    return paths[::step][:limit]
+
+
+def calibration_images(directory=CALIBRATION_DIR, limit=CALIBRATION_IMAGES):
+    """Return up to ``limit`` image paths from ``directory`` (recursively) for INT8 calibration.
+
+    Photos in the held-out split (see :func:`holdout_images`) are never used.
+    """
+    paths = [p for p in _image_paths(directory) if not _held_out(p, directory)]
+    if not paths:
+        raise FileNotFoundError(f"No calibration images found in {directory}")
+    return _spread(paths, limit)
+
+
+def holdout_images(directory=CALIBRATION_DIR, limit=None):
+    """Return up to ``limit`` image paths from the held-out split, for evaluating exported backends."""
+    paths = [p for p in _image_paths(directory) if _held_out(p, directory)]
+    if not paths:
+        raise FileNotFoundError(f"No held-out images in {directory} (HOLDOUT_FRACTION={HOLDOUT_FRACTION})")
+    return _spread(paths, limit) if limit else paths
+
+
+def _preprocess(path, imgsz=EXPORT_IMGSZ):
+    """Letterbox a photo the way ultralytics does and return a (1, 3, imgsz, imgsz) float32 RGB array."""
+    image = cv2.imread(path)
+    height, width = image.shape[:2]
+    scale = imgsz / max(height, width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    padded = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top = (imgsz - resized.shape[0]) // 2
+    left = (imgsz - resized.shape[1]) // 2
+    padded[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return (padded[..., ::-1].transpose(2, 0, 1)[None] / 255.0).astype(np.float32)
+
+
+class _CalibrationReader:
+    """ONNX Runtime calibration data reader over our inspection photos."""
+
+    def __init__(self, input_name, paths):
+        self._inputs = iter({input_name: _preprocess(p)} for p in paths)
+
+    def get_next(self):
+        return next(self._inputs, None)
+
+
+@contextmanager
+def _exclusive(directory):
+    """Hold the export lock of ``directory`` against other threads and processes."""
+    with _export_lock, open(os.path.join(directory, ".export.lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _private_weights(weights, tmp):
+    # ultralytics writes exports next to the weights, so export from a copy that no other process uses
+    return shutil.copy(weights, tmp)
+
+
+def _export_onnx(weights, target):
+    from ultralytics import YOLO
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(target)) as tmp:
+        exported = YOLO(_private_weights(weights, tmp)).export(
+            format="onnx", imgsz=EXPORT_IMGSZ, dynamic=True, simplify=True
+        )
+        shutil.move(exported, target)
+
+
+def _quantize_onnx(source, target):
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    input_name = onnxruntime.InferenceSession(source, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    quantize_static(
+        source,
+        target,
+        _CalibrationReader(input_name, calibration_images()),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+
+
+def _export_openvino(weights, target, int8):
+    from ultralytics import YOLO
+
+    kwargs = {}
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(target)) as tmp:
+        model = YOLO(_private_weights(weights, tmp))
+        if int8:
+            # ultralytics calibrates OpenVINO INT8 on a dataset YAML's validation images
+            images = os.path.join(tmp, "images")
+            os.makedirs(images)
+            for path in calibration_images():
+                shutil.copy(path, images)
+            data = os.path.join(tmp, "calibration.yaml")
+            with open(data, "w") as f:
+                f.write(f"path: {tmp}\ntrain: images\nval: images\nnames:\n")
+                f.writelines(f"  {cls}: {label}\n" for cls, label in model.names.items())
+            kwargs = {"int8": True, "data": data}
+        exported = model.export(format="openvino", imgsz=EXPORT_IMGSZ, dynamic=True, **kwargs)
+        shutil.move(exported, target)
+
+
+def exported_model_path(weights, backend, digest):
+    """Return the path of ``weights`` in ``backend`` format, exporting on first use.
+
+    ``digest`` is the weights SHA-256; exports live next to the weights in
+    ``<stem>/<digest prefix>/dynamic/``.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Known backends: {', '.join(BACKENDS)}")
+    if backend == "torch":
+        return weights
+    stem = os.path.splitext(weights)[0]
+    # Earlier fixed-shape (batch 1, EXPORT_IMGSZ) exports sit one level up and are not reused
+    directory = os.path.join(stem, digest[:16], "dynamic")
+    onnx_fp32 = os.path.join(directory, "model.onnx")
+    targets = {
+        "onnx": onnx_fp32,
+        "onnx-int8": os.path.join(directory, "model.int8.onnx"),
+        "openvino": os.path.join(directory, "model_openvino_model"),
+        "openvino-int8": os.path.join(directory, "model_int8_openvino_model"),
+    }
+    target = targets[backend]
+    if os.path.exists(target):
+        return target
+    os.makedirs(directory, exist_ok=True)
+    with _exclusive(directory):
+        if os.path.exists(target):
+            return target  # Exported by another process while this one waited
+        # Build into a temporary name first so an interrupted export is never picked up
+        part = target + ".part" + (".onnx" if target.endswith(".onnx") else "")
+        if os.path.isdir(part):
+            shutil.rmtree(part)  # Left over from an interrupted OpenVINO export
+        if backend == "onnx":
+            _export_onnx(weights, part)
+        elif backend == "onnx-int8":
+            if not os.path.exists(onnx_fp32):
+                _export_onnx(weights, onnx_fp32 + ".part.onnx")
+                os.replace(onnx_fp32 + ".part.onnx", onnx_fp32)
+            _quantize_onnx(onnx_fp32, part)
+        else:
+            _export_openvino(weights, part, int8=backend == "openvino-int8")
+        os.replace(part, target)
+    return target
+
+
+def artifact_bytes(path):
+    """Size on disk of a weights file or exported model directory."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path)
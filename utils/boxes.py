@@ -0,0 +1,75 @@
+"""Vectorized bounding-box helpers for (N, 4+) xyxy arrays."""
+import numpy as np
+
+
+def box_area(boxes):
+    """Return the area of each xyxy box."""
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def iou_matrix(a, b):
+    """Return the (len(a), len(b)) IoU matrix between two sets of xyxy boxes."""
+    a = np.asarray(a, dtype=np.float32)[:, :4]
+    b = np.asarray(b, dtype=np.float32)[:, :4]
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = np.clip(bottom_right - top_left, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    union = box_area(a)[:, None] + box_area(b)[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+def nms(detections, iou_threshold=0.5, class_aware=True):
+    """Return indices of ``(N, 6+)`` detections kept by greedy non-maximum suppression.
+
+    The IoU matrix is computed once for all boxes; suppression then only
+    walks the score-sorted rows.
+    """
+    if not len(detections):
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(-detections[:, 4], kind="stable")
+    iou = iou_matrix(detections[order], detections[order])
+    if class_aware:
+        cls = detections[order, 5]
+        iou[cls[:, None] != cls[None, :]] = 0.0
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_threshold
+    return order[keep]
+
+
+def weighted_box_fusion(detections, iou_threshold=0.55):
+    """Fuse overlapping same-class ``(N, 6+)`` detections into confidence-weighted boxes.
+
+    Each cluster's box is the confidence-weighted mean of its members and its
+    confidence is their mean. Returns an ``(M, 6)`` array.
+    """
+    if not len(detections):
+        return np.zeros((0, 6), dtype=np.float32)
+    order = np.argsort(-detections[:, 4], kind="stable")
+    dets = detections[order]
+    iou = iou_matrix(dets, dets)
+    iou[dets[:, None, 5] != dets[None, :, 5]] = 0.0
+
+    cluster = np.full(len(dets), -1)
+    n_clusters = 0
+    for i in range(len(dets)):
+        if cluster[i] >= 0:
+            continue
+        members = (iou[i] > iou_threshold) & (cluster < 0)
+        members[i] = True
+        cluster[members] = n_clusters
+        n_clusters += 1
+
+    weights = dets[:, 4]
+    weight_sum = np.bincount(cluster, weights=weights, minlength=n_clusters)
+    fused = np.empty((n_clusters, 6), dtype=np.float32)
+    for k in range(4):
+        fused[:, k] = np.bincount(cluster, weights=dets[:, k] * weights, minlength=n_clusters) / weight_sum
+    fused[:, 4] = weight_sum / np.bincount(cluster, minlength=n_clusters)
+    fused[:, 5] = dets[np.unique(cluster, return_index=True)[1], 5]
+    return fused
@@ -0,0 +1,175 @@
+"""Low-latency camera capture.
+
+A dedicated thread keeps reading the camera into a one-slot buffer, so the
+inference loop always works on the newest frame and stale frames are dropped
+instead of piling up in OpenCV's internal queue. A video file can stand in
+for the camera; it is then played back at its native frame rate.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+
+from utils import metrics
+
+# Device index, RTSP/HTTP URL or video file path
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "0")
+
+
+def parse_source(source):
+    """Turn "0"-style device strings into the int index OpenCV expects."""
+    if isinstance(source, str) and source.strip().isdigit():
+        return int(source)
+    return source
+
+
+def _is_file(source):
+    return isinstance(source, str) and "://" not in source and os.path.exists(source)
+
+
+class LatestFrame:
+    """Thread-safe one-slot buffer holding the newest frame and its capture time.
+
+    Several buffers can share one ``cond``, so a consumer can wait for a new
+    frame on any of them (see :mod:`utils.multistream`).
+    """
+
+    def __init__(self, cond=None):
+        self._cond = cond or threading.Condition()
+        self._frame = None
+        self._captured_at = 0.0
+        self.seq = 0
+        self.closed = False
+
+    def put(self, frame, captured_at):
+        with self._cond:
+            self._frame = frame
+            self._captured_at = captured_at
+            self.seq += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def get(self, after_seq, timeout=1.0):
+        """Wait for a frame newer than ``after_seq``; return ``(seq, frame, captured_at)``.
+
+        Returns ``None`` on timeout or once the buffer is closed and drained.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > after_seq or self.closed, timeout):
+                return None
+            if self.seq <= after_seq:
+                return None
+            return self.seq, self._frame, self._captured_at
+
+    def newest(self, after_seq):
+        """Return ``(seq, frame, captured_at)`` if a frame newer than ``after_seq`` is waiting, else ``None``."""
+        with self._cond:
+            if self.seq <= after_seq:
+                return None
+            return self.seq, self._frame, self._captured_at
+
+
+class CaptureThread(threading.Thread):
+    """Read ``source`` continuously into a :class:`LatestFrame` buffer.
+
+    Video files are played back at their native frame rate unless
+    ``realtime`` is false, in which case they are read as fast as they decode.
+    """
+
+    def __init__(self, source, buffer=None, realtime=True):
+        super().__init__(name=f"capture-{source}", daemon=True)
+        self.source = parse_source(source)
+        self.buffer = buffer or LatestFrame()
+        self.cap = cv2.VideoCapture(self.source)
+        # Keep the driver-side queue as short as the backend allows
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.frame_interval = 0.0
+        if realtime and _is_file(self.source):
+            self.frame_interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 30)
+        self.frames_captured = 0
+        self._stop_event = threading.Event()
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def run(self):
+        next_due = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                if self.frame_interval:
+                    next_due += self.frame_interval
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.buffer.put(frame, time.monotonic())
+                self.frames_captured += 1
+        finally:
+            self.cap.release()
+            self.buffer.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class StreamStats:
+    """Smoothed capture-to-display latency and throughput for a live stream."""
+
+    def __init__(self, smoothing=0.9):
+        self.smoothing = smoothing
+        self.latency_ms = 0.0
+        self.fps = 0.0
+        self.frames = 0
+        self._last = None
+
+    def record(self, captured_at):
+        now = time.monotonic()
+        metrics.observe("camera.frame_latency", now - captured_at)
+        latency = (now - captured_at) * 1000
+        a = self.smoothing if self.frames else 0.0
+        self.latency_ms = a * self.latency_ms + (1 - a) * latency
+        if self._last is not None:
+            instant = 1.0 / max(now - self._last, 1e-6)
+            self.fps = a * self.fps + (1 - a) * instant if self.fps else instant
+        self._last = now
+        self.frames += 1
+
+    def summary(self, frames_captured=None):
+        text = f"Latency: {self.latency_ms:.0f} ms | FPS: {self.fps:.1f}"
+        if frames_captured is not None:
+            text += f" | Dropped: {max(frames_captured - self.frames, 0)}"
+        return text
+
+
+@contextmanager
+def open_camera(source=CAMERA_SOURCE, realtime=True):
+    """Start a capture thread for ``source`` and stop it on exit."""
+    capture = CaptureThread(source, realtime=realtime)
+    if not capture.is_opened():
+        capture.cap.release()
+        raise IOError(f"Could not open camera source: {source}")
+    capture.start()
+    try:
+        yield capture
+    finally:
+        capture.stop()
+        capture.join(timeout=2.0)
+
+
+def latest_frames(capture, timeout=2.0):
+    """Yield ``(frame, captured_at)`` for the newest frame each time the consumer is ready."""
+    seq = 0
+    while True:
+        item = capture.buffer.get(seq, timeout)
+        if item is None:
+            return
+        seq, frame, captured_at = item
+        yield frame, captured_at
@@ -0,0 +1,724 @@
+"""SQLite data access for the inventory and inspections tables.
+
+Connections are kept in a bounded pool shared by all threads (Streamlit
+runs every rerun on a new script thread, so per-thread connections would
+be reopened on nearly every rerun). They are configured for WAL, so
+readers never block the writer. Queries
+use fixed SQL text so sqlite3's statement cache reuses the prepared
+statements, and inspections are written in batched transactions that also
+bump ``inventory.last_inspection``. Asset coordinates are indexed in an
+R*Tree, so nearest-asset and bounding-box lookups never scan the inventory.
+"""
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from utils import metrics
+
+DB_PATH = os.environ.get("DB_PATH", "bridge_road_management.db")
+# Most connections open at once; further callers wait for one to be returned
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+
+_idle = []  # (connection, path) pairs ready for reuse, most recently used last
+_open_count = 0  # Idle plus borrowed connections
+_pool_cond = threading.Condition(threading.Lock())
+_held = threading.local()  # The connection this thread has borrowed, for nested calls
+_initialized = set()  # Database paths init_db has already run on in this process
+_init_lock = threading.Lock()
+_fts_available = True
+
+# Columns added after the first release; older databases are migrated in place
+_INSPECTION_COLUMNS = {"length": "REAL", "width": "REAL"}
+_INVENTORY_COLUMNS = {"latitude": "REAL", "longitude": "REAL"}
+# Explicit column order; migrated databases store length/width after image_path
+INSPECTION_FIELDS = "id, inventory_id, date, defects, severity, length, width, image_path"
+# The inventory row shape the pages and reports index into; coordinates are fetched separately
+INVENTORY_FIELDS = "id, name, location, type, built_year, last_inspection"
+
+EARTH_RADIUS_KM = 6371.0088
+# Numeric weight of the inspection severities for the trend summaries
+SEVERITY_SCORES = {"Low": 1, "Medium": 2, "High": 3}
+
+
+def _open():
+    # Pooled connections move between threads, one borrower at a time
+    conn = sqlite3.connect(DB_PATH, timeout=30, cached_statements=256, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    metrics.inc("db.connections_opened")
+    return conn
+
+
+class _Borrow:
+    # Entered around every query; a borrow nested on the same thread reuses the connection it already holds
+    __slots__ = ("conn", "path", "nested")
+
+    def __enter__(self):
+        global _open_count
+        self.conn = getattr(_held, "conn", None)
+        self.nested = self.conn is not None
+        if self.nested:
+            return self.conn
+        with _pool_cond:
+            while not _idle and _open_count >= DB_POOL_SIZE:
+                with metrics.timer("db.pool_wait"):
+                    _pool_cond.wait()
+            while _idle and self.conn is None:
+                conn, path = _idle.pop()
+                if path == DB_PATH:
+                    self.conn = conn
+                else:
+                    conn.close()  # DB_PATH was changed (tests, benchmarks, job workers)
+                    _open_count -= 1
+            if self.conn is None:
+                _open_count += 1  # Reserve the slot before opening outside the lock
+        self.path = DB_PATH
+        if self.conn is None:
+            try:
+                self.conn = _open()
+            except BaseException:
+                with _pool_cond:
+                    _open_count -= 1
+                    _pool_cond.notify()
+                raise
+        _held.conn = self.conn
+        return self.conn
+
+    def __exit__(self, *exc):
+        if self.nested:
+            return
+        _held.conn = None
+        if self.conn.in_transaction:
+            self.conn.rollback()
+        with _pool_cond:
+            _idle.append((self.conn, self.path))
+            _pool_cond.notify()
+
+
+def connection():
+    """Borrow a pooled connection to ``DB_PATH`` for the duration of a ``with`` block.
+
+    Nested borrows on the same thread share the outer connection, so a
+    helper called inside a transaction never waits for a second one.
+    """
+    return _Borrow()
+
+
+def _reset_pool():
+    # A forked child must not share its parent's SQLite connections
+    global _open_count, _pool_cond
+    _idle.clear()
+    _open_count = 0
+    _pool_cond = threading.Condition(threading.Lock())
+    _held.conn = None
+
+
+os.register_at_fork(after_in_child=_reset_pool)
+
+
+@contextmanager
+def transaction():
+    """Run a block in one write transaction, committing on success."""
+    with connection() as conn, metrics.timer("db.transaction"):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+# Database Setup
+def init_db():
+    """Create and migrate the schema, once per process and database path."""
+    with _init_lock:
+        if DB_PATH in _initialized:
+            return
+        _create_schema()
+        _initialized.add(DB_PATH)
+
+
+def _create_schema():
+    with transaction() as c:
+        c.execute('''CREATE TABLE IF NOT EXISTS inventory (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT,
+                        location TEXT,
+                        type TEXT,
+                        built_year INTEGER,
+                        last_inspection TEXT
+                     )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS inspections (
+                        id INTEGER PRIMARY KEY,
+                        inventory_id INTEGER,
+                        date TEXT,
+                        defects TEXT,
+                        severity TEXT,
+                        length REAL,
+                        width REAL,
+                        image_path TEXT,
+                        FOREIGN KEY (inventory_id) REFERENCES inventory (id)
+                     )''')
+        for table, columns in (("inspections", _INSPECTION_COLUMNS), ("inventory", _INVENTORY_COLUMNS)):
+            existing = {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+            for column, type_ in columns.items():
+                if column not in existing:
+                    c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {type_}")
+        c.execute('''CREATE TABLE IF NOT EXISTS batch_items (
+                        run TEXT,
+                        source TEXT,
+                        done_at TEXT,
+                        PRIMARY KEY (run, source)
+                     )''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_inspections_inventory_date ON inspections (inventory_id, date)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_inventory_type_year ON inventory (type, built_year)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_inventory_built_year ON inventory (built_year)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_inventory_last_inspection ON inventory (last_inspection)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_inventory_latitude ON inventory (latitude)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_inventory_longitude ON inventory (longitude)")
+        _init_search_index(c)
+        _init_spatial_index(c)
+        _init_trend_tables(c)
+
+
+def _init_search_index(c):
+    """Create the FTS5 index over inventory name/location, kept in sync by triggers."""
+    global _fts_available
+    exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'inventory_fts'").fetchone()
+    if not exists:
+        try:
+            c.execute("CREATE VIRTUAL TABLE inventory_fts USING fts5("
+                      "name, location, content='inventory', content_rowid='id')")
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5; search falls back to LIKE
+            _fts_available = False
+            return
+        c.execute("INSERT INTO inventory_fts (inventory_fts) VALUES ('rebuild')")
+    c.execute('''CREATE TRIGGER IF NOT EXISTS inventory_fts_insert AFTER INSERT ON inventory BEGIN
+                    INSERT INTO inventory_fts (rowid, name, location) VALUES (new.id, new.name, new.location);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS inventory_fts_delete AFTER DELETE ON inventory BEGIN
+                    INSERT INTO inventory_fts (inventory_fts, rowid, name, location)
+                    VALUES ('delete', old.id, old.name, old.location);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS inventory_fts_update AFTER UPDATE OF name, location ON inventory BEGIN
+                    INSERT INTO inventory_fts (inventory_fts, rowid, name, location)
+                    VALUES ('delete', old.id, old.name, old.location);
+                    INSERT INTO inventory_fts (rowid, name, location) VALUES (new.id, new.name, new.location);
+                 END''')
+    _fts_available = True
+
+
+def _init_spatial_index(c):
+    """Create the R*Tree over asset coordinates, kept in sync by triggers.
+
+    Assets are stored as points (min = max). The R*Tree keeps 32-bit floats
+    rounded outwards, about a metre at these magnitudes, so it only narrows
+    the candidates; exact distances use the inventory's own columns.
+    """
+    exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'inventory_rtree'").fetchone()
+    if not exists:
+        c.execute("CREATE VIRTUAL TABLE inventory_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+        c.execute("INSERT INTO inventory_rtree SELECT id, latitude, latitude, longitude, longitude "
+                  "FROM inventory WHERE latitude IS NOT NULL AND longitude IS NOT NULL")
+    c.execute('''CREATE TRIGGER IF NOT EXISTS inventory_rtree_insert AFTER INSERT ON inventory
+                 WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+                    INSERT INTO inventory_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS inventory_rtree_delete AFTER DELETE ON inventory BEGIN
+                    DELETE FROM inventory_rtree WHERE id = old.id;
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS inventory_rtree_update AFTER UPDATE OF latitude, longitude ON inventory BEGIN
+                    DELETE FROM inventory_rtree WHERE id = old.id;
+                    INSERT INTO inventory_rtree SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+                    WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+                 END''')
+
+
+def _init_trend_tables(c):
+    """Create the per-defect rows and the trend summaries fed by :func:`_record_trends`.
+
+    ``inspection_defects`` holds one row per inspection and defect class.
+    ``defect_trends`` and ``asset_periods`` sum them per asset (and class)
+    and month, ``defect_totals`` per class and month across the network,
+    ``period_totals`` counts every inspection per month, and
+    ``asset_trends`` keeps each asset's latest month next to the month
+    before. Existing inspections are backfilled once.
+    """
+    backfill = not c.execute("SELECT 1 FROM sqlite_master WHERE name = 'inspection_defects'").fetchone()
+    new_period_totals = not c.execute("SELECT 1 FROM sqlite_master WHERE name = 'period_totals'").fetchone()
+    c.execute('''CREATE TABLE IF NOT EXISTS inspection_defects (
+                    inspection_id INTEGER REFERENCES inspections (id),
+                    inventory_id INTEGER,
+                    date TEXT,
+                    defect TEXT,
+                    count INTEGER,
+                    PRIMARY KEY (inspection_id, defect)
+                 ) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS defect_trends (
+                    inventory_id INTEGER,
+                    defect TEXT,
+                    period TEXT,
+                    inspections INTEGER,
+                    detections INTEGER,
+                    PRIMARY KEY (inventory_id, defect, period)
+                 ) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS asset_periods (
+                    inventory_id INTEGER,
+                    period TEXT,
+                    inspections INTEGER,
+                    detections INTEGER,
+                    severity_sum INTEGER,
+                    PRIMARY KEY (inventory_id, period)
+                 ) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS defect_totals (
+                    period TEXT,
+                    defect TEXT,
+                    inspections INTEGER,
+                    detections INTEGER,
+                    PRIMARY KEY (period, defect)
+                 ) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS period_totals (
+                    period TEXT PRIMARY KEY,
+                    inspections INTEGER
+                 ) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS asset_trends (
+                    inventory_id INTEGER PRIMARY KEY,
+                    period TEXT,
+                    rate REAL,
+                    severity REAL,
+                    previous_period TEXT,
+                    previous_rate REAL,
+                    previous_severity REAL,
+                    change REAL
+                 )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_inspection_defects_asset ON inspection_defects (inventory_id, defect, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_asset_periods_worst ON asset_periods (period, detections)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_asset_trends_change ON asset_trends (change)")
+    if new_period_totals and not backfill:
+        c.execute("INSERT INTO period_totals SELECT period, SUM(inspections) FROM asset_periods GROUP BY period")
+    if backfill:
+        cursor = c.execute("SELECT id, inventory_id, date, defects, severity FROM inspections ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            _record_trends(c, rows)
+
+
+# Add Inventory Record
+def add_inventory(name, location, type_, built_year, latitude=None, longitude=None):
+    with transaction() as c:
+        cursor = c.execute(
+            "INSERT INTO inventory (name, location, type, built_year, last_inspection, latitude, longitude) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (name, location, type_, built_year, None, latitude, longitude),
+        )
+        return cursor.lastrowid
+
+
+def set_inventory_location(inventory_id, latitude, longitude):
+    """Set (or clear, with ``None``) an asset's coordinates."""
+    with transaction() as c:
+        c.execute("UPDATE inventory SET latitude = ?, longitude = ? WHERE id = ?", (latitude, longitude, inventory_id))
+
+
+# Fetch Inventory Records
+def fetch_inventory():
+    with connection() as conn:
+        return conn.execute(f"SELECT {INVENTORY_FIELDS} FROM inventory").fetchall()
+
+
+def get_inventory(inventory_id):
+    """Return one inventory row by primary key, or ``None``."""
+    with connection() as conn:
+        return conn.execute(f"SELECT {INVENTORY_FIELDS} FROM inventory WHERE id = ?", (inventory_id,)).fetchone()
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(math.sqrt(a), 1.0))
+
+
+def bbox_around(latitude, longitude, radius_km):
+    """Return the ``(min_lat, min_lon, max_lat, max_lon)`` box covering a circle of ``radius_km``.
+
+    Across the antimeridian ``min_lon`` > ``max_lon``, as :func:`assets_in_bbox` expects.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    # A degree of longitude shrinks towards the poles; use the widest latitude in the box
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    dlon = math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)) if cos_lat > 1e-9 else 180.0
+    if dlon >= 180.0:
+        return min_lat, -180.0, max_lat, 180.0
+    return min_lat, _wrap_longitude(longitude - dlon), max_lat, _wrap_longitude(longitude + dlon)
+
+
+def _wrap_longitude(lon):
+    return (lon + 180.0) % 360.0 - 180.0
+
+
+def _in_bbox(c, min_lat, min_lon, max_lat, max_lon, type_, limit):
+    clauses = ["r.min_lat <= ?", "r.max_lat >= ?", "r.min_lon <= ?", "r.max_lon >= ?"]
+    params = [max_lat, min_lat, max_lon, min_lon]
+    if type_:
+        clauses.append("inv.type = ?")
+        params.append(type_)
+    params.append(-1 if limit is None else limit)
+    return c.execute(
+        "SELECT inv.id, inv.name, inv.location, inv.type, inv.last_inspection, inv.latitude, inv.longitude "
+        f"FROM inventory_rtree r JOIN inventory inv ON inv.id = r.id WHERE {' AND '.join(clauses)} LIMIT ?",
+        params,
+    ).fetchall()
+
+
+@metrics.timed("db.assets_in_bbox")
+def assets_in_bbox(min_lat, min_lon, max_lat, max_lon, type_=None, limit=None):
+    """Return the located assets inside a latitude/longitude box, found through the R*Tree.
+
+    Rows are ``(id, name, location, type, last_inspection, latitude,
+    longitude)``. A box crossing the antimeridian has ``min_lon`` > ``max_lon``.
+    """
+    with connection() as c:
+        if min_lon <= max_lon:
+            return _in_bbox(c, min_lat, min_lon, max_lat, max_lon, type_, limit)
+        east = _in_bbox(c, min_lat, min_lon, max_lat, 180.0, type_, limit)
+        if limit is not None and len(east) >= limit:
+            return east
+        return east + _in_bbox(c, min_lat, -180.0, max_lat, max_lon, type_, None if limit is None else limit - len(east))
+
+
+@metrics.timed("db.nearest_assets")
+def nearest_assets(latitude, longitude, limit=5, max_km=50.0, type_=None):
+    """Return up to ``limit`` located assets within ``max_km`` of a point, nearest first.
+
+    Rows are those of :func:`assets_in_bbox` plus the distance in kilometres.
+    The search box starts small and doubles until the circle inside it holds
+    ``limit`` assets, so a lookup reads a few R*Tree nodes however large the
+    inventory is.
+    """
+    radius = min(0.25, max_km)
+    while True:
+        candidates = assets_in_bbox(*bbox_around(latitude, longitude, radius), type_=type_)
+        within = sorted(
+            (row + (d,) for row in candidates if (d := distance_km(latitude, longitude, row[5], row[6])) <= radius),
+            key=lambda row: row[-1],
+        )
+        if len(within) >= limit or radius >= max_km:
+            return within[:limit]
+        radius = min(radius * 2, max_km)
+
+
+def asset_extent():
+    """Return ``(min_lat, min_lon, max_lat, max_lon)`` over all located assets, or ``None``."""
+    # Separate aggregates, so each is answered from the end of its index instead of a scan
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT (SELECT MIN(latitude) FROM inventory), (SELECT MIN(longitude) FROM inventory), "
+            "(SELECT MAX(latitude) FROM inventory), (SELECT MAX(longitude) FROM inventory)"
+        ).fetchone()
+    return None if row[0] is None else row
+
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    words = [w.replace('"', '""') for w in text.split()]
+    return " ".join(f'"{w}"*' for w in words)
+
+
+@metrics.timed("db.query_inventory")
+def query_inventory(search=None, type_=None, built_from=None, built_to=None, inspected_before=None,
+                    after_id=0, limit=50):
+    """Return one page of inventory rows with ``id > after_id``, in id order.
+
+    Keyset pagination keeps every page an index range scan however deep the
+    user pages. ``search`` matches name/location words through the FTS5
+    index, ``type_`` and the ``built_*`` year bounds use the inventory
+    indexes, and ``inspected_before`` (an ISO date) selects assets whose last
+    inspection is older than that date or missing.
+    """
+    clauses = ["id > ?"]
+    params = [after_id]
+    if search and search.strip():
+        if _fts_available:
+            clauses.append("id IN (SELECT rowid FROM inventory_fts WHERE inventory_fts MATCH ?)")
+            params.append(_fts_query(search))
+        else:
+            clauses.append("(name LIKE ? OR location LIKE ?)")
+            params += [f"%{search.strip()}%"] * 2
+    if type_:
+        clauses.append("type = ?")
+        params.append(type_)
+    if built_from is not None:
+        clauses.append("built_year >= ?")
+        params.append(built_from)
+    if built_to is not None:
+        clauses.append("built_year <= ?")
+        params.append(built_to)
+    if inspected_before:
+        clauses.append("(last_inspection IS NULL OR last_inspection < ?)")
+        params.append(inspected_before)
+    sql = f"SELECT {INVENTORY_FIELDS} FROM inventory WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?"
+    with connection() as conn:
+        return conn.execute(sql, (*params, limit)).fetchall()
+
+
+def add_inspections(inspections):
+    """Insert many inspections in one transaction and update each asset's ``last_inspection``.
+
+    ``inspections`` is an iterable of dicts with ``inventory_id``, ``date``,
+    ``defects``, ``severity``, ``length``, ``width`` and ``image_path``.
+    Returns the number of rows written.
+    """
+    inspections = list(inspections)
+    if not inspections:
+        return 0
+    with transaction() as c:
+        return _insert_inspections(c, inspections)
+
+
+def _insert_inspections(c, inspections):
+    # Ids are assigned here (the write lock is held) so the defect rows can refer to them
+    first_id = c.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM inspections").fetchone()[0]
+    rows = [
+        (first_id + n, i["inventory_id"], i["date"], i["defects"], i.get("severity"),
+         i.get("length"), i.get("width"), i.get("image_path"))
+        for n, i in enumerate(inspections)
+    ]
+    latest = {}
+    for _, inventory_id, date, *_ in rows:
+        latest[inventory_id] = max(latest.get(inventory_id, date), date)
+    c.executemany(
+        "INSERT INTO inspections (id, inventory_id, date, defects, severity, length, width, image_path) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    _record_trends(c, [row[:5] for row in rows])
+    c.executemany(
+        "UPDATE inventory SET last_inspection = ? "
+        "WHERE id = ? AND (last_inspection IS NULL OR last_inspection < ?)",
+        [(date, inventory_id, date) for inventory_id, date in latest.items()],
+    )
+    return len(rows)
+
+
+def _record_trends(c, inspections):
+    """Add ``(id, inventory_id, date, defects, severity)`` inspections to the defect rows and trend summaries.
+
+    Called in the same transaction as the inspection insert (write-through),
+    so the summaries never disagree with the inspections.
+    """
+    defect_rows = []
+    by_asset_defect = Counter()
+    asset_defect_inspections = Counter()
+    by_asset = {}
+    totals = Counter()
+    total_inspections = Counter()
+    period_inspections = Counter()
+    for inspection_id, inventory_id, date, defects, severity in inspections:
+        period = date[:7]  # YYYY-MM
+        counts = Counter(d.strip() for d in (defects or "").split(",") if d.strip())
+        for defect, n in counts.items():
+            defect_rows.append((inspection_id, inventory_id, date, defect, n))
+            by_asset_defect[inventory_id, defect, period] += n
+            asset_defect_inspections[inventory_id, defect, period] += 1
+            totals[period, defect] += n
+            total_inspections[period, defect] += 1
+        period_inspections[period] += 1
+        stats = by_asset.setdefault((inventory_id, period), [0, 0, 0])
+        stats[0] += 1
+        stats[1] += sum(counts.values())
+        stats[2] += SEVERITY_SCORES.get(severity, 0)
+
+    c.executemany(
+        "INSERT OR REPLACE INTO inspection_defects (inspection_id, inventory_id, date, defect, count) "
+        "VALUES (?, ?, ?, ?, ?)",
+        defect_rows,
+    )
+    c.executemany(
+        "INSERT INTO defect_trends (inventory_id, defect, period, inspections, detections) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (inventory_id, defect, period) DO UPDATE SET inspections = inspections + excluded.inspections, "
+        "detections = detections + excluded.detections",
+        [(*key, asset_defect_inspections[key], n) for key, n in by_asset_defect.items()],
+    )
+    c.executemany(
+        "INSERT INTO defect_totals (period, defect, inspections, detections) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (period, defect) DO UPDATE SET inspections = inspections + excluded.inspections, "
+        "detections = detections + excluded.detections",
+        [(*key, total_inspections[key], n) for key, n in totals.items()],
+    )
+    c.executemany(
+        "INSERT INTO asset_periods (inventory_id, period, inspections, detections, severity_sum) "
+        "VALUES (?, ?, ?, ?, ?) ON CONFLICT (inventory_id, period) DO UPDATE SET inspections = inspections + excluded.inspections, "
+        "detections = detections + excluded.detections, severity_sum = severity_sum + excluded.severity_sum",
+        [(*key, *stats) for key, stats in by_asset.items()],
+    )
+    c.executemany(
+        "INSERT INTO period_totals (period, inspections) VALUES (?, ?) "
+        "ON CONFLICT (period) DO UPDATE SET inspections = inspections + excluded.inspections",
+        period_inspections.items(),
+    )
+    # Refresh each touched asset's latest-versus-previous month from its two newest summary rows
+    trends = []
+    for inventory_id in {inventory_id for inventory_id, _ in by_asset}:
+        months = c.execute(
+            "SELECT period, detections * 1.0 / inspections, severity_sum * 1.0 / inspections FROM asset_periods "
+            "WHERE inventory_id = ? ORDER BY period DESC LIMIT 2",
+            (inventory_id,),
+        ).fetchall()
+        (period, rate, severity), previous = months[0], (months[1] if len(months) > 1 else (None, None, None))
+        change = rate - previous[1] if previous[0] else None
+        trends.append((inventory_id, period, rate, severity, *previous, change))
+    c.executemany("INSERT OR REPLACE INTO asset_trends VALUES (?, ?, ?, ?, ?, ?, ?, ?)", trends)
+
+
+def add_batch_inspections(run, sources, inspections, done_at):
+    """Write a batch run's inspections and mark their ``sources`` done, atomically.
+
+    Because both happen in one transaction, a resumed run neither loses nor
+    duplicates an inspection.
+    """
+    with transaction() as c:
+        written = _insert_inspections(c, list(inspections)) if inspections else 0
+        c.executemany(
+            "INSERT OR REPLACE INTO batch_items (run, source, done_at) VALUES (?, ?, ?)",
+            [(run, source, done_at) for source in sources],
+        )
+    return written
+
+
+def batch_done_sources(run):
+    """Return the set of sources a batch run has already completed."""
+    with connection() as conn:
+        return {row[0] for row in conn.execute("SELECT source FROM batch_items WHERE run = ?", (run,))}
+
+
+@metrics.timed("db.fetch_inspections")
+def fetch_inspections(inventory_id):
+    """Return an asset's inspections, newest first, using the (inventory_id, date) index."""
+    with connection() as conn:
+        return conn.execute(
+            f"SELECT {INSPECTION_FIELDS} FROM inspections WHERE inventory_id = ? ORDER BY date DESC", (inventory_id,)
+        ).fetchall()
+
+
+def iter_inspections(location=None, type_=None, since=None, batch_size=500):
+    """Yield inspections joined with their asset, grouped by asset and oldest first.
+
+    Rows are ``(inventory_id, name, location, type, built_year, date, defects,
+    severity, length, width, image_path)`` and are fetched ``batch_size`` at a
+    time, so a report over a whole district never holds every row at once.
+    ``location`` matches part of the asset location, ``since`` is an ISO date.
+    """
+    clauses = []
+    params = []
+    if location:
+        clauses.append("inv.location LIKE ?")
+        params.append(f"%{location.strip()}%")
+    if type_:
+        clauses.append("inv.type = ?")
+        params.append(type_)
+    if since:
+        clauses.append("i.date >= ?")
+        params.append(since)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    # The connection stays borrowed until the generator is exhausted or closed
+    with connection() as conn:
+        cursor = conn.execute(
+            "SELECT inv.id, inv.name, inv.location, inv.type, inv.built_year, "
+            "i.date, i.defects, i.severity, i.length, i.width, i.image_path "
+            f"FROM inspections i JOIN inventory inv ON inv.id = i.inventory_id {where} "
+            "ORDER BY i.inventory_id, i.date",
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+
+# Trend Dashboard Queries
+# Each reads a bounded number of summary rows through an index, whatever the inspection history.
+
+@metrics.timed("db.deteriorating_assets")
+def deteriorating_assets(limit=10, type_=None):
+    """Return the assets whose defects per inspection rose most from one inspected month to the next.
+
+    Rows are ``(id, name, location, type, period, rate, previous_period,
+    previous_rate, change, severity, previous_severity)``.
+    """
+    clauses = ["t.change > 0"]
+    params = []
+    if type_:
+        clauses.append("inv.type = ?")
+        params.append(type_)
+    with connection() as conn:
+        return conn.execute(
+            "SELECT inv.id, inv.name, inv.location, inv.type, t.period, t.rate, t.previous_period, t.previous_rate, "
+            "t.change, t.severity, t.previous_severity "
+            f"FROM asset_trends t JOIN inventory inv ON inv.id = t.inventory_id WHERE {' AND '.join(clauses)} "
+            "ORDER BY t.change DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+
+
+@metrics.timed("db.worst_assets")
+def worst_assets(period, limit=10, type_=None):
+    """Return the assets with the most detected defects in ``period`` (YYYY-MM).
+
+    Rows are ``(id, name, location, type, inspections, detections, mean severity)``.
+    """
+    clauses = ["p.period = ?"]
+    params = [period]
+    if type_:
+        clauses.append("inv.type = ?")
+        params.append(type_)
+    with connection() as conn:
+        return conn.execute(
+            "SELECT inv.id, inv.name, inv.location, inv.type, p.inspections, p.detections, "
+            "p.severity_sum * 1.0 / p.inspections "
+            f"FROM asset_periods p JOIN inventory inv ON inv.id = p.inventory_id WHERE {' AND '.join(clauses)} "
+            "ORDER BY p.detections DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+
+
+def trend_periods():
+    """Return the months with inspections, newest first, including months where no defect was found."""
+    with connection() as conn:
+        return [row[0] for row in conn.execute("SELECT period FROM period_totals ORDER BY period DESC")]
+
+
+def defect_totals(since=None):
+    """Return ``(period, defect, inspections, detections)`` across all assets from month ``since`` on."""
+    with connection() as conn:
+        return conn.execute(
+            "SELECT period, defect, inspections, detections FROM defect_totals WHERE period >= ? ORDER BY period",
+            (since or "",),
+        ).fetchall()
+
+
+def asset_defect_trend(inventory_id):
+    """Return an asset's ``(defect, period, inspections, detections)`` summaries, oldest month first.
+
+    ``inspections`` is the asset's total for the month, so ``detections /
+    inspections`` is the defects per inspection. Months where no defect was
+    found have one row with ``defect`` ``None``.
+    """
+    with connection() as conn:
+        return conn.execute(
+            "SELECT t.defect, p.period, p.inspections, COALESCE(t.detections, 0) FROM asset_periods p "
+            "LEFT JOIN defect_trends t ON t.inventory_id = p.inventory_id AND t.period = p.period "
+            "WHERE p.inventory_id = ? ORDER BY p.period, t.defect",
+            (inventory_id,),
+        ).fetchall()
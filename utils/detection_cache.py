@@ -0,0 +1,145 @@
+"""Content-addressed cache of raw detections.
+
+Entries are keyed by the image content hash, the model weights hash and the
+inference parameters, and hold the unfiltered (N, 6) detection array. A
+small in-memory LRU sits in front of a SQLite file whose total size is kept
+under a budget by evicting the least recently used rows. Class selection is
+applied to the cached arrays afterwards, so changing it never reruns the
+model.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import metrics
+
+DETECTION_CACHE_DIR = os.environ.get("DETECTION_CACHE_DIR", "cache")
+DETECTION_CACHE_ENTRIES = int(os.environ.get("DETECTION_CACHE_ENTRIES", "256"))
+DETECTION_CACHE_MB = float(os.environ.get("DETECTION_CACHE_MB", "64"))
+
+
+def content_hash(data):
+    """Return the SHA-256 hex digest of raw bytes, a buffer, a NumPy array or a binary file object.
+
+    File objects are hashed in chunks from the start and rewound afterwards.
+    Prefer passing a Streamlit upload itself over ``getbuffer()``, which
+    makes a private copy of the whole upload.
+    """
+    if isinstance(data, np.ndarray):
+        digest = hashlib.sha256(str((data.shape, data.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(data).data)
+        return digest.hexdigest()
+    if hasattr(data, "read"):
+        digest = hashlib.sha256()
+        data.seek(0)
+        for chunk in iter(lambda: data.read(1 << 20), b""):
+            digest.update(chunk)
+        data.seek(0)
+        return digest.hexdigest()
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(image_key, model_key, params=None):
+    """Combine image hash, weights hash and inference parameters into one key."""
+    payload = json.dumps([image_key, model_key, params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class DetectionCache:
+    """Two-tier (memory LRU + SQLite) store of detection arrays."""
+
+    def __init__(self, path=None, max_entries=DETECTION_CACHE_ENTRIES, max_mb=DETECTION_CACHE_MB):
+        self.path = path or os.path.join(DETECTION_CACHE_DIR, "detections.db")
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS detections (
+                                    key TEXT PRIMARY KEY,
+                                    data BLOB,
+                                    nbytes INTEGER,
+                                    accessed REAL
+                                 )''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_accessed ON detections (accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                metrics.inc("detection_cache.memory_hit")
+                return self._memory[key]
+            conn = self._db()
+            row = conn.execute("SELECT data FROM detections WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                metrics.inc("detection_cache.miss")
+                return None
+            metrics.inc("detection_cache.disk_hit")
+            conn.execute("UPDATE detections SET accessed = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            detections = np.frombuffer(row[0], dtype=np.float32).reshape(-1, 6)
+            self._remember(key, detections)
+            return detections
+
+    def put(self, key, detections):
+        detections = np.ascontiguousarray(detections[:, :6], dtype=np.float32)
+        detections.setflags(write=False)
+        data = detections.tobytes()
+        with self._lock:
+            self._remember(key, detections)
+            conn = self._db()
+            conn.execute("INSERT OR REPLACE INTO detections (key, data, nbytes, accessed) VALUES (?, ?, ?, ?)",
+                         (key, data, len(data), time.time()))
+            self._evict_disk(conn)
+            conn.commit()
+        return detections
+
+    def _remember(self, key, detections):
+        self._memory[key] = detections
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM detections").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk the oldest rows until enough bytes are freed, then delete them in one statement
+        excess = total - self.max_bytes
+        cutoff = None
+        for accessed, nbytes in conn.execute("SELECT accessed, nbytes FROM detections ORDER BY accessed"):
+            excess -= nbytes
+            cutoff = accessed
+            if excess <= 0:
+                break
+        conn.execute("DELETE FROM detections WHERE accessed <= ?", (cutoff,))
+
+
+_cache = DetectionCache()
+
+
+def cached_detections(image_key, model_key, params, compute):
+    """Return raw detections for the key, calling ``compute()`` only on a cache miss.
+
+    If ``model_key`` is ``None`` (weights of unknown provenance) nothing is cached.
+    """
+    if model_key is None:
+        return compute()
+    key = cache_key(image_key, model_key, params)
+    detections = _cache.get(key)
+    if detections is None:
+        detections = _cache.put(key, compute())
+    return detections
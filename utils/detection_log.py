@@ -0,0 +1,183 @@
+"""Columnar per-frame detection logs for processed videos.
+
+Every detection of a video run becomes one row: frame index, timestamp,
+class id, confidence, box corners and (in keyframe mode) the defect's
+track ID. The columns are stored as a compressed ``.npz`` next to the
+annotated video, so counts, time-range queries and worst-frame lookups are
+NumPy operations on a few small arrays and never decode the video again.
+"""
+import json
+import os
+
+import numpy as np
+
+COLUMNS = ("frame", "time", "cls", "conf", "x1", "y1", "x2", "y2", "track")
+_DTYPES = {"frame": np.int32, "time": np.float32, "cls": np.int16, "conf": np.float32, "track": np.int32}
+
+
+def log_path(video_path):
+    """Return the detection log path that belongs to ``video_path``."""
+    return os.path.splitext(video_path)[0] + ".detections.npz"
+
+
+class DetectionLogWriter:
+    """Collects per-frame detection arrays and writes them as one columnar log."""
+
+    def __init__(self, fps, names, start_frame=0):
+        self.fps = float(fps)
+        self.names = dict(names)
+        self.start_frame = start_frame
+        self.frame_count = 0
+        self._chunks = []
+        self._frames = []
+
+    def add(self, index, detections):
+        """Record the ``(N, 6)`` or tracked ``(N, 7)`` detections of frame ``index`` (segment-relative)."""
+        self.frame_count = max(self.frame_count, index + 1)
+        if len(detections):
+            self._chunks.append(np.asarray(detections, dtype=np.float32))
+            self._frames.append(np.full(len(detections), self.start_frame + index, dtype=np.int32))
+
+    def columns(self):
+        if self._chunks:
+            rows = np.concatenate([np.pad(c, ((0, 0), (0, 7 - c.shape[1])), constant_values=-1)
+                                   for c in self._chunks])
+            frames = np.concatenate(self._frames)
+        else:
+            rows = np.zeros((0, 7), dtype=np.float32)
+            frames = np.zeros(0, dtype=np.int32)
+        return {
+            "frame": frames,
+            "time": (frames / self.fps).astype(np.float32),
+            "cls": rows[:, 5].astype(np.int16),
+            "conf": rows[:, 4],
+            "x1": rows[:, 0],
+            "y1": rows[:, 1],
+            "x2": rows[:, 2],
+            "y2": rows[:, 3],
+            "track": rows[:, 6].astype(np.int32),
+        }
+
+    def save(self, path):
+        _write(path, self.columns(), self.fps, self.names, self.start_frame, self.frame_count)
+        return path
+
+
+def _write(path, columns, fps, names, start_frame, frame_count):
+    meta = {"fps": fps, "names": {str(k): v for k, v in names.items()},
+            "start_frame": start_frame, "frame_count": frame_count}
+    part = path + ".part.npz"
+    np.savez_compressed(part, meta=np.array(json.dumps(meta)), **columns)
+    os.replace(part, path)
+
+
+class DetectionLog:
+    """Read-only view of a detection log with the common report queries."""
+
+    def __init__(self, columns, fps, names, start_frame=0, frame_count=0):
+        self.columns = columns
+        self.fps = fps
+        self.names = names
+        self.start_frame = start_frame
+        self.frame_count = frame_count
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            columns = {name: data[name] for name in COLUMNS}
+        names = {int(k): v for k, v in meta["names"].items()}
+        return cls(columns, meta["fps"], names, meta["start_frame"], meta["frame_count"])
+
+    def __len__(self):
+        return len(self.columns["frame"])
+
+    def __getattr__(self, name):
+        if name in COLUMNS:
+            return self.columns[name]
+        raise AttributeError(name)
+
+    def _subset(self, mask):
+        return DetectionLog({k: v[mask] for k, v in self.columns.items()}, self.fps, self.names,
+                            self.start_frame, self.frame_count)
+
+    def between(self, start, end):
+        """Return the detections with ``start <= time < end`` (seconds)."""
+        return self._subset((self.time >= start) & (self.time < end))
+
+    def of_class(self, *class_names):
+        ids = [i for i, name in self.names.items() if name in class_names]
+        return self._subset(np.isin(self.cls, ids))
+
+    def above(self, conf):
+        return self._subset(self.conf >= conf)
+
+    def counts(self, distinct=True):
+        """Return ``{class name: count}``.
+
+        With ``distinct`` and tracked detections, each defect (track ID) is
+        counted once; otherwise every per-frame detection is counted.
+        """
+        cls = self.cls
+        if distinct and len(self) and (self.track >= 0).all():
+            _, first = np.unique(self.track, return_index=True)
+            cls = cls[first]
+        ids, n = np.unique(cls, return_counts=True)
+        return {self.names.get(int(i), "Unknown"): int(c) for i, c in zip(ids, n)}
+
+    def per_frame_counts(self):
+        """Return the number of detections in every frame as an array indexed from ``start_frame``."""
+        return np.bincount(self.frame - self.start_frame, minlength=self.frame_count)
+
+    def worst_frames(self, n=5, by="count"):
+        """Return ``[(frame, time, score)]`` for the ``n`` frames with most detections.
+
+        ``by="area"`` ranks frames by the summed box area instead, and
+        ``by="conf"`` by their highest confidence.
+        """
+        if not len(self):
+            return []
+        offsets = self.frame - self.start_frame
+        if by == "count":
+            scores = np.bincount(offsets, minlength=self.frame_count).astype(np.float32)
+        elif by == "area":
+            area = (self.x2 - self.x1) * (self.y2 - self.y1)
+            scores = np.bincount(offsets, weights=area, minlength=self.frame_count)
+        elif by == "conf":
+            scores = np.zeros(max(self.frame_count, offsets.max() + 1), dtype=np.float32)
+            np.maximum.at(scores, offsets, self.conf)
+        else:
+            raise ValueError(f"Unknown ranking: {by}")
+        top = np.argsort(scores)[::-1][:n]
+        top = top[scores[top] > 0]
+        return [(int(f + self.start_frame), float((f + self.start_frame) / self.fps), float(scores[f])) for f in top]
+
+    def frame_detections(self, frame):
+        """Return frame ``frame``'s detections as an ``(N, 7)`` array."""
+        mask = self.frame == frame
+        return np.stack([self.x1[mask], self.y1[mask], self.x2[mask], self.y2[mask],
+                         self.conf[mask], self.cls[mask].astype(np.float32),
+                         self.track[mask].astype(np.float32)], axis=1)
+
+
+def concat_logs(paths, output_path):
+    """Merge segment logs into one log.
+
+    Track IDs are kept as they are: a job's segments share one tracker, so
+    the IDs are already unique across segments.
+    """
+    logs = [DetectionLog.load(p) for p in paths]
+    if not logs:
+        raise ValueError("No detection logs to merge")
+    columns = {name: np.concatenate([log.columns[name] for log in logs]).astype(_DTYPES.get(name, np.float32))
+               for name in COLUMNS}
+    first, last = logs[0], logs[-1]
+    frame_count = last.start_frame + last.frame_count - first.start_frame
+    _write(output_path, columns, first.fps, first.names, first.start_frame, frame_count)
+    return output_path
+
+
+def load_log(video_path):
+    """Return the log stored next to ``video_path``, or ``None`` if it has none."""
+    path = log_path(video_path)
+    return DetectionLog.load(path) if os.path.exists(path) else None
@@ -0,0 +1,120 @@
+"""Run several YOLO models on one image and merge their detections.
+
+The image is letterboxed and converted to a tensor once, all models run on
+that tensor concurrently, and their boxes are mapped into a shared class
+space before being fused with vectorized NMS or weighted-box fusion.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from utils.boxes import nms, weighted_box_fusion
+from utils.postprocess import result_to_array
+
+ENSEMBLE_IMGSZ = int(os.environ.get("ENSEMBLE_IMGSZ", "640"))
+FUSION_METHODS = ("wbf", "nms")
+
+# Class names that mean the same defect across models
+CLASS_ALIASES = {
+    "cracks": "crack",
+    "potholes": "pothole",
+    "spall": "spalling",
+    "exposed rebar": "rebar exposure",
+    "rebar": "rebar exposure",
+}
+
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("ENSEMBLE_WORKERS", "4")),
+                               thread_name_prefix="ensemble")
+
+
+def canonical_class(name):
+    """Normalize a model class name for cross-model matching."""
+    key = name.strip().lower().replace("_", " ")
+    return CLASS_ALIASES.get(key, key)
+
+
+def unify_classes(models):
+    """Build a shared class space for ``models``.
+
+    Returns ``(names, lookups)`` where ``names`` maps unified id to the first
+    model's spelling of the class and ``lookups[i]`` is an array mapping model
+    ``i``'s class ids to unified ids.
+    """
+    unified = {}
+    names = {}
+    lookups = []
+    for model in models:
+        lookup = np.zeros(max(model.names) + 1, dtype=np.float32)
+        for cls, name in model.names.items():
+            key = canonical_class(name)
+            if key not in unified:
+                unified[key] = len(unified)
+                names[unified[key]] = name
+            lookup[cls] = unified[key]
+        lookups.append(lookup)
+    return names, lookups
+
+
+def letterbox(image, size=ENSEMBLE_IMGSZ, color=114):
+    """Resize ``image`` to fit a ``size`` square keeping aspect ratio, padding the rest.
+
+    Returns ``(padded, scale, (pad_x, pad_y))``.
+    """
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    new_w, new_h = round(width * scale), round(height * scale)
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    padded = np.full((size, size, 3), color, dtype=np.uint8)
+    padded[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+    return padded, scale, (pad_x, pad_y)
+
+
+def _to_tensor(padded_rgb):
+    import torch
+
+    tensor = torch.from_numpy(np.ascontiguousarray(padded_rgb.transpose(2, 0, 1)))
+    return tensor.unsqueeze(0).float().div_(255.0)
+
+
+def fuse_detections(per_model, models, method="wbf", iou_threshold=0.55):
+    """Map each model's (N, 6) detections into the shared class space and fuse them.
+
+    Returns ``(detections, names)`` like :func:`ensemble_detect`.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method '{method}'. Use one of {FUSION_METHODS}")
+    names, lookups = unify_classes(models)
+    merged = []
+    for detections, lookup in zip(per_model, lookups):
+        detections = detections.copy()
+        detections[:, 5] = lookup[detections[:, 5].astype(np.int64)]
+        merged.append(detections)
+    merged = np.concatenate(merged) if merged else np.zeros((0, 6), dtype=np.float32)
+
+    if method == "nms":
+        return merged[nms(merged, iou_threshold)], names
+    return weighted_box_fusion(merged, iou_threshold), names
+
+
+def ensemble_detect(image, models, method="wbf", iou_threshold=0.55, imgsz=ENSEMBLE_IMGSZ, **predict_kwargs):
+    """Detect on an RGB ``image`` with every model and fuse the results.
+
+    Returns ``(detections, names)``: an ``(N, 6)`` array in image coordinates
+    with unified class ids, and the unified id-to-name mapping.
+    """
+    padded, scale, (pad_x, pad_y) = letterbox(image, imgsz)
+    tensor = _to_tensor(padded)
+
+    def run(model):
+        detections = result_to_array(model.predict(tensor, verbose=False, **predict_kwargs)[0])
+        # Undo the letterbox so boxes are in original image coordinates
+        detections[:, [0, 2]] = ((detections[:, [0, 2]] - pad_x) / scale).clip(0, width)
+        detections[:, [1, 3]] = ((detections[:, [1, 3]] - pad_y) / scale).clip(0, height)
+        return detections
+
+    height, width = image.shape[:2]
+    per_model = list(_executor.map(run, models))
+    return fuse_detections(per_model, models, method, iou_threshold)
@@ -0,0 +1,80 @@
+"""In-memory decode and encode helpers for single-photo inspection.
+
+An uploaded photo is decoded once into an RGB array, with its EXIF
+orientation applied, and is annotated in place. The result is encoded
+once as JPEG. The pages display those bytes, offer them for download,
+save them as the inspection image and embed them in the PDF, so no
+temporary files are written or re-read. :func:`gps_coordinates` reads the
+camera position from the EXIF header to suggest the asset being inspected.
+"""
+import io
+import os
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from utils import metrics
+
+# Longest side photos are decoded at when tiled inference is off; 0 keeps the full size
+INSPECTION_MAX_SIDE = int(os.environ.get("INSPECTION_MAX_SIDE", "2048"))
+INSPECTION_JPEG_QUALITY = int(os.environ.get("INSPECTION_JPEG_QUALITY", "90"))
+
+
+def decode_image(source, max_side=None):
+    """Decode an image file, file object or bytes into a writable RGB array.
+
+    The EXIF orientation is applied, so photos taken in portrait are not
+    inspected sideways. With ``max_side``, JPEG draft mode lets the
+    decoder skip straight to the smallest power-of-two scale that keeps
+    the longest side at least ``max_side`` pixels, which is much cheaper
+    than decoding the full image and resizing it.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with metrics.timer("photo.decode"):
+        image = Image.open(source)
+        if max_side and max(image.size) > max_side:
+            scale = max_side / max(image.size)
+            image.draft("RGB", (round(image.width * scale), round(image.height * scale)))
+        ImageOps.exif_transpose(image, in_place=True)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        return np.array(image)  # np.asarray would be read-only, and annotation draws in place
+
+
+def _degrees(dms, ref):
+    degrees, minutes, seconds = (float(v) for v in dms)
+    value = degrees + minutes / 60 + seconds / 3600
+    return -value if ref in ("S", "W") else value
+
+
+def gps_coordinates(source):
+    """Return ``(latitude, longitude)`` from a photo's EXIF GPS tags, or ``None``.
+
+    Only the file header is read, and file objects are rewound afterwards.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    try:
+        with Image.open(source) as image:
+            gps = image.getexif().get_ifd(0x8825)  # GPSInfo
+        # 1/2: latitude ref/value, 3/4: longitude ref/value
+        if not all(tag in gps for tag in (1, 2, 3, 4)):
+            return None
+        latitude, longitude = _degrees(gps[2], gps[1]), _degrees(gps[4], gps[3])
+    except (OSError, ValueError, TypeError, ZeroDivisionError):
+        return None
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or (latitude, longitude) == (0.0, 0.0):
+        return None  # Cameras without a fix sometimes write zeros
+    return latitude, longitude
+
+
+def encode_jpeg(image, quality=INSPECTION_JPEG_QUALITY):
+    """Encode an RGB array as JPEG bytes (without copying the pixels first)."""
+    with metrics.timer("photo.encode"):
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
@@ -0,0 +1,520 @@
+"""Shared local inference server.
+
+With ``INFERENCE_SERVER=1``, :func:`utils.models.get_model` returns
+:class:`RemoteModel` proxies instead of loading YOLO into every process.
+Every session of the Streamlit server, the video job workers and
+``batch_inspect.py`` then send their frames to one inference process. That
+process listens on the Unix socket ``INFERENCE_SOCKET`` and owns the
+models and the cores:
+
+* Frames travel through shared memory. Each client connection keeps one
+  segment and copies its frames into it. Only a small header with the
+  offsets and shapes goes over the socket; the detections come back on it.
+* Requests that arrive within ``INFERENCE_BATCH_WINDOW_MS`` of each other,
+  from any session, run as one batch of up to ``INFERENCE_MAX_BATCH``
+  frames (a single larger request runs on its own). They must use the
+  same model, settings and frame size. Class
+  selections are applied per request after the model has run, so sessions
+  detecting different classes still share a batch.
+* At most ``INFERENCE_QUEUE_DEPTH`` requests wait for a worker. When the
+  queue is full, callers wait. If a caller is still waiting after
+  ``INFERENCE_QUEUE_TIMEOUT`` seconds, it gets :class:`InferenceBusy`
+  instead of adding more work.
+* ``INFERENCE_SERVER_WORKERS`` threads each own a copy of the models and
+  split ``INFERENCE_THREADS`` between them. The number of inference calls
+  competing for the cores stays fixed however many users are connected.
+
+``streamlit_app.py`` starts the server with :func:`start_server` from the
+startup thread (see :mod:`utils.startup`), and the server exits with the
+Streamlit process. To run it separately (for example to share it between
+several app processes), use ``python -m utils.inference_server``.
+"""
+import argparse
+import atexit
+import logging
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from utils import metrics
+
+INFERENCE_SERVER = os.environ.get("INFERENCE_SERVER", "0") == "1"
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET") or os.path.join(
+    tempfile.gettempdir(), f"inference-{os.getuid()}.sock"
+)
+INFERENCE_SERVER_WORKERS = int(os.environ.get("INFERENCE_SERVER_WORKERS", "1"))
+INFERENCE_BATCH_WINDOW_MS = float(os.environ.get("INFERENCE_BATCH_WINDOW_MS", "5"))
+INFERENCE_MAX_BATCH = int(os.environ.get("INFERENCE_MAX_BATCH", "16"))
+INFERENCE_QUEUE_DEPTH = int(os.environ.get("INFERENCE_QUEUE_DEPTH", "64"))
+INFERENCE_QUEUE_TIMEOUT = float(os.environ.get("INFERENCE_QUEUE_TIMEOUT", "10"))
+# How long clients keep retrying while the server process is still starting
+INFERENCE_CONNECT_TIMEOUT = float(os.environ.get("INFERENCE_CONNECT_TIMEOUT", "30"))
+
+logger = logging.getLogger("inference_server")
+
+_ALIGN = 64  # Byte alignment of each frame inside a shared-memory segment
+
+
+class InferenceBusy(RuntimeError):
+    """The inference server's queue stayed full for ``INFERENCE_QUEUE_TIMEOUT`` seconds."""
+
+
+def _attach(name):
+    """Attach to a client's segment without letting this process's resource tracker unlink it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    segment = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+def _close(segment, unlink=False):
+    try:
+        segment.close()
+        if unlink:
+            segment.unlink()
+    except (BufferError, OSError):
+        pass  # A view is still alive or the segment is already gone; it is freed with the process
+
+
+# Server side
+
+_connections = 0  # Clients connected to this server process
+_connections_lock = threading.Lock()
+
+class _Request:
+    __slots__ = ("op", "model", "backend", "kwargs", "classes", "images", "tensor", "count", "key",
+                 "received_at", "done", "reply")
+
+    def __init__(self, message, images):
+        self.op = message["op"]
+        self.model = message["model"]
+        self.backend = message["backend"]
+        self.kwargs = message.get("kwargs") or {}
+        self.classes = message.get("classes")
+        self.tensor = message.get("tensor", False)
+        self.images = images
+        # A tensor request holds one (B, 3, H, W) array; every other image is one frame
+        self.count = sum(len(image) for image in images) if self.tensor else len(images)
+        shapes = {image.shape for image in images}
+        self.key = (
+            self.op, self.model, self.backend, repr(sorted(self.kwargs.items())), self.tensor,
+            # Frames of different sizes are letterboxed differently in a mixed batch, so only equal sizes merge
+            shapes.pop() if len(shapes) == 1 else id(self),
+        )
+        self.received_at = time.perf_counter()
+        self.done = threading.Event()
+        self.reply = None
+
+
+def registry_loader():
+    """Return a loader with its own :class:`~utils.models.ModelRegistry` (one per worker thread)."""
+    from utils.models import ModelRegistry
+
+    return ModelRegistry().get
+
+
+class _InferenceWorker(threading.Thread):
+    """Take coalesced batches off the shared queue and run them on this worker's own models."""
+
+    def __init__(self, requests, load, index):
+        super().__init__(name=f"inference-worker-{index}", daemon=True)
+        self.requests = requests
+        self.load = load
+        # A request that would have pushed the last batch past INFERENCE_MAX_BATCH; it starts the next one
+        self._held = None
+
+    def run(self):
+        self._warm_up()
+        while True:
+            first, self._held = self._held or self.requests.get(), None
+            batch = [first]
+            frames = first.count
+            # Wait at most one window after the first request arrived; under load it has already passed.
+            # Each connection has at most one request in flight, so with all of them in hand there is nothing to wait for.
+            deadline = first.received_at + INFERENCE_BATCH_WINDOW_MS / 1000
+            while frames < INFERENCE_MAX_BATCH and len(batch) < _connections:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if frames + item.count > INFERENCE_MAX_BATCH:
+                    self._held = item
+                    break
+                batch.append(item)
+                frames += item.count
+            metrics.gauge("inference_server.queue_depth", self.requests.qsize())
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.key, []).append(request)
+            for group in groups.values():
+                self._run(group)
+
+    def _warm_up(self):
+        from utils.startup import WARMUP_ENABLED, WARMUP_MODELS, warmup_sizes
+
+        if not WARMUP_ENABLED:
+            return
+        try:
+            for name in (name for name in WARMUP_MODELS.split(",") if name):
+                model = self.load(name, None)
+                for size in warmup_sizes():
+                    model.predict(np.zeros((size, size, 3), dtype=np.uint8), verbose=False, imgsz=size)
+        except Exception:
+            logger.exception("Inference worker warm-up failed")
+
+    def _run(self, group):
+        from utils.postprocess import filter_classes, result_to_array
+
+        first = group[0]
+        started = time.perf_counter()
+        for request in group:
+            metrics.observe("inference_server.queue_wait", started - request.received_at)
+        try:
+            model = self.load(first.model, first.backend)
+            if first.op == "info":
+                for request in group:
+                    request.reply = {"names": dict(model.names)}
+                return
+            images = [image for request in group for image in request.images]
+            if first.tensor:
+                import torch
+
+                images = torch.from_numpy(np.concatenate(images))
+            with metrics.timer("inference_server.inference"):
+                results = model.predict(images, verbose=False, **first.kwargs)
+            detections = iter([result_to_array(result) for result in results])
+            # Drop every reference into the clients' segments before they are reused
+            images = results = None
+            for request in group:
+                per_image = [next(detections) for _ in range(request.count)]
+                if request.classes is not None:
+                    per_image = [filter_classes(d, request.classes) for d in per_image]
+                request.reply = {"detections": per_image}
+            metrics.inc("inference_server.batches")
+            metrics.inc("inference_server.frames", sum(request.count for request in group))
+        except Exception as e:
+            logger.exception("Inference failed")
+            for request in group:
+                request.reply = {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            metrics.inc("inference_server.requests", len(group))
+            for request in group:
+                request.done.set()
+
+
+def _serve_connection(conn, requests):
+    """Handle one client connection: one request in flight at a time."""
+    global _connections
+    segment = None
+    with _connections_lock:
+        _connections += 1
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            if message["op"] == "stats":
+                conn.send({"metrics": metrics.snapshot(), "queue_depth": requests.qsize()})
+                continue
+            images = []
+            if message.get("segment"):
+                if segment is None or segment.name != message["segment"]:
+                    if segment is not None:
+                        _close(segment)
+                    segment = _attach(message["segment"])
+                images = [np.ndarray(shape, dtype, buffer=segment.buf, offset=offset)
+                          for offset, shape, dtype in message["frames"]]
+            request = _Request(message, images)
+            del images
+            try:
+                requests.put(request, timeout=INFERENCE_QUEUE_TIMEOUT)
+            except queue.Full:
+                metrics.inc("inference_server.rejected")
+                request.images = None
+                conn.send({"error": "busy"})
+                continue
+            metrics.gauge("inference_server.queue_depth", requests.qsize())
+            request.done.wait()
+            request.images = None
+            conn.send(request.reply)
+    finally:
+        with _connections_lock:
+            _connections -= 1
+        conn.close()
+        if segment is not None:
+            _close(segment)
+
+
+def _exit_with_parent(parent, address):
+    while os.getppid() == parent:
+        time.sleep(1.0)
+    logger.info("Parent process %s exited; stopping the inference server", parent)
+    try:
+        os.unlink(address)
+    except OSError:
+        pass
+    os._exit(0)
+
+
+def serve(address=INFERENCE_SOCKET, workers=INFERENCE_SERVER_WORKERS, loader=registry_loader, parent=None):
+    """Run the inference server on ``address`` until killed (or until process ``parent`` exits).
+
+    ``loader()`` is called once per worker and returns a ``load(name,
+    backend)`` function giving that worker's model instances.
+    """
+    from utils.startup import INFERENCE_THREADS, pin_threads
+
+    if _reachable(address):
+        logger.info("An inference server is already listening on %s", address)
+        return
+    if os.path.exists(address):
+        os.unlink(address)  # Left behind by a server that was killed
+    pin_threads(max(INFERENCE_THREADS // workers, 1))
+    metrics.start_exporter()
+    requests = queue.Queue(maxsize=INFERENCE_QUEUE_DEPTH)
+    for index in range(workers):
+        _InferenceWorker(requests, loader(), index).start()
+    listener = Listener(address, family="AF_UNIX")
+    os.chmod(address, 0o600)
+    if parent:
+        threading.Thread(target=_exit_with_parent, args=(parent, address), daemon=True).start()
+    logger.info("Inference server listening on %s with %d worker(s)", address, workers)
+    while True:
+        conn = listener.accept()
+        threading.Thread(target=_serve_connection, args=(conn, requests), name="inference-conn", daemon=True).start()
+
+
+# Client side
+
+def _reachable(address=INFERENCE_SOCKET):
+    try:
+        Client(address, family="AF_UNIX").close()
+        return True
+    except OSError:
+        return False
+
+
+_lock = threading.Lock()
+_process = None
+
+
+def _spawn():
+    return subprocess.Popen(
+        [sys.executable, "-m", "utils.inference_server", "--parent", str(os.getpid())],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+
+def _watch():
+    """Restart the server child whenever it dies, backing off while it keeps crashing on start."""
+    global _process
+    failures = 0
+    while True:
+        started = time.monotonic()
+        code = _process.wait()
+        failures = failures + 1 if time.monotonic() - started < 60 else 1
+        delay = min(2 ** (failures - 1), 30)
+        logger.warning("Inference server exited with code %s; restarting in %ds", code, delay)
+        metrics.inc("inference_server.restarts")
+        time.sleep(delay)
+        with _lock:
+            _process = _spawn()
+
+
+def start_server():
+    """Start the inference server as a child process once (no-op unless ``INFERENCE_SERVER=1``).
+
+    Does not wait for it: clients keep retrying for ``INFERENCE_CONNECT_TIMEOUT``
+    seconds while the models load. A watchdog thread restarts the child if
+    it dies; a server started separately is left alone.
+    """
+    global _process
+    if not INFERENCE_SERVER:
+        return
+    with _lock:
+        if _process is not None or _reachable():
+            return
+        _process = _spawn()
+    threading.Thread(target=_watch, name="inference-server-watchdog", daemon=True).start()
+
+
+class _Channel:
+    """A client connection and the shared-memory segment its frames are copied into."""
+
+    def __init__(self, address):
+        deadline = time.monotonic() + INFERENCE_CONNECT_TIMEOUT
+        while True:
+            try:
+                self.conn = Client(address, family="AF_UNIX")
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f"No inference server is listening on {address}") from None
+                time.sleep(0.2)
+        self.segment = None
+        self._linked = False
+
+    def call(self, message, images=()):
+        if images:
+            sizes = [-(-image.nbytes // _ALIGN) * _ALIGN for image in images]
+            if self.segment is None or self.segment.size < sum(sizes):
+                if self.segment is not None:
+                    _close(self.segment, unlink=self._linked)
+                # Grow in powers of two so a session settles on one segment
+                self.segment = shared_memory.SharedMemory(create=True, size=1 << (sum(sizes) - 1).bit_length())
+                self._linked = True
+            frames = []
+            offset = 0
+            for image, size in zip(images, sizes):
+                # Copying into a view also makes strided inputs (such as RGB-to-BGR views) contiguous
+                np.copyto(np.ndarray(image.shape, image.dtype, buffer=self.segment.buf, offset=offset), image)
+                frames.append((offset, image.shape, image.dtype.str))
+                offset += size
+            message = {**message, "segment": self.segment.name, "frames": frames}
+        self.conn.send(message)
+        reply = self.conn.recv()
+        if self._linked:
+            # The server has mapped the segment by now, so drop its name: the memory is
+            # freed when both sides unmap it, even if this process never calls close()
+            self.segment.unlink()
+            self._linked = False
+        return reply
+
+    def close(self):
+        self.conn.close()
+        if self.segment is not None:
+            _close(self.segment, unlink=self._linked)
+
+
+class RemoteModel:
+    """Stand-in for a YOLO model whose ``predict`` runs on the inference server.
+
+    Implements the part of the ultralytics API the app uses: ``names`` and
+    ``predict``. The results expose ``boxes.data``. Connections are pooled,
+    so any number of threads can share one instance.
+    """
+
+    def __init__(self, name, backend, address=INFERENCE_SOCKET):
+        self.name = name
+        self.backend = backend
+        self.address = address
+        self.registry_key = (name, backend)  # Read by utils.models.model_digest
+        self._names = None
+        self._idle = []
+        self._idle_lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        return self  # Already thread-safe; utils.tiling copies models per thread
+
+    def _call(self, message, images=()):
+        message = {**message, "model": self.name, "backend": self.backend}
+        with self._idle_lock:
+            channel = self._idle.pop() if self._idle else None
+        for attempt in range(2):
+            if channel is None:
+                channel = _Channel(self.address)
+            try:
+                with metrics.timer("inference_client.request"):
+                    reply = channel.call(message, images)
+                break
+            except (EOFError, OSError):
+                # The server went away (and is being restarted): every pooled connection is dead.
+                # Requests have no side effects, so retry once on a new connection, which waits for it.
+                channel.close()
+                with self._idle_lock:
+                    stale, self._idle = self._idle, []
+                for other in stale:
+                    other.close()
+                channel = None
+                metrics.inc("inference_client.reconnects")
+                if attempt:
+                    raise ConnectionError(f"Lost the connection to the inference server on {self.address}") from None
+        with self._idle_lock:
+            self._idle.append(channel)
+        if "error" in reply:
+            if reply["error"] == "busy":
+                raise InferenceBusy("The inference server is overloaded; try again shortly")
+            raise RuntimeError(f"Inference failed on the server: {reply['error']}")
+        return reply
+
+    @property
+    def names(self):
+        if self._names is None:
+            self._names = self._call({"op": "info"})["names"]
+        return self._names
+
+    def predict(self, images, verbose=False, classes=None, **kwargs):
+        tensor = hasattr(images, "numpy")  # A torch tensor, as utils.ensemble passes
+        if tensor:
+            images = [images.detach().cpu().numpy()]
+        elif not isinstance(images, (list, tuple)):
+            images = [images]
+        reply = self._call({"op": "predict", "kwargs": kwargs, "classes": classes, "tensor": tensor}, images)
+        return [types.SimpleNamespace(boxes=types.SimpleNamespace(data=d)) for d in reply["detections"]]
+
+    __call__ = predict
+
+
+_remote_models = {}
+
+
+@atexit.register
+def _close_channels():
+    for model in list(_remote_models.values()):
+        with model._idle_lock:
+            channels, model._idle = model._idle, []
+        for channel in channels:
+            channel.close()
+
+
+def _forget_channels():
+    # A forked child (such as a job worker) must not share its parent's connections and segments
+    for model in _remote_models.values():
+        model._idle = []
+        model._idle_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_channels)
+
+
+def remote_model(name, backend):
+    """Return the process-wide :class:`RemoteModel` for ``name`` on ``backend``."""
+    with _lock:
+        if (name, backend) not in _remote_models:
+            _remote_models[name, backend] = RemoteModel(name, backend)
+        return _remote_models[name, backend]
+
+
+def server_stats(address=INFERENCE_SOCKET):
+    """Return the server's metrics snapshot and queue depth, or ``None`` if it is not running."""
+    try:
+        conn = Client(address, family="AF_UNIX")
+    except OSError:
+        return None
+    try:
+        conn.send({"op": "stats"})
+        return conn.recv()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the shared local inference server.")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET)
+    parser.add_argument("--workers", type=int, default=INFERENCE_SERVER_WORKERS)
+    parser.add_argument("--parent", type=int, help="Exit when this process exits")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    serve(args.socket, args.workers, parent=args.parent)
@@ -0,0 +1,92 @@
+"""Photo inspection core shared by the Photo Upload page and the batch CLI.
+
+Nothing here imports Streamlit: the page wraps these functions with its
+widgets, and ``batch_inspect.py`` runs them in worker processes.
+"""
+import os
+from datetime import datetime
+
+from utils import metrics
+from utils.detection_cache import cached_detections, content_hash
+from utils.ensemble import ensemble_detect, fuse_detections, unify_classes
+from utils.models import model_digest
+from utils.postprocess import class_ids, detect, detection_labels, draw_detections, filter_classes
+from utils.tiling import tiled_detect
+
+INSPECTION_IMAGE_DIR = "inspection_images"
+
+
+def detect_defects(image, models, selected_classes=None, fusion=None, tiling=None, image_key=None, in_place=False):
+    """Detect and draw defects on an RGB image; returns ``(annotated_image, defect_labels)``.
+
+    ``selected_classes`` are class names to keep (``None`` keeps all). With
+    ``fusion`` ("wbf" or "nms") and more than one model, overlapping
+    detections of the same defect from different models are merged, so each
+    defect is drawn and counted once. ``tiling`` is a dict of
+    :func:`utils.tiling.tiled_detect` options (``tile_size``, ``overlap``) for
+    running high-resolution photos tile by tile. Raw detections are cached by
+    ``image_key`` (the upload's content hash) and the decoded size, so repeat
+    inspections of the same photo only redo the class filtering and drawing.
+    With ``in_place`` the boxes are drawn onto ``image`` itself instead of a
+    copy; every model has run before anything is drawn.
+    """
+    bgr = image[..., ::-1]  # The models expect BGR
+    image_key = image_key or content_hash(image)
+    # The same upload decoded at another size gives other box coordinates
+    params = {"tiling": tiling, "shape": list(image.shape[:2])}
+
+    def selected(names):
+        return list(names) if selected_classes is None else class_ids(names, selected_classes)
+
+    if fusion and len(models) > 1:
+        def compute():
+            with metrics.timer("photo.inference"):
+                if tiling:
+                    per_model = [tiled_detect(bgr, model, **tiling) for model in models]
+                    return fuse_detections(per_model, models, method=fusion)[0]
+                return ensemble_detect(image, models, method=fusion)[0]
+
+        digests = [model_digest(model) for model in models]
+        model_key = None if None in digests else ",".join(digests)
+        detections = cached_detections(image_key, model_key, {**params, "fusion": fusion}, compute)
+        class_names = unify_classes(models)[0]
+        layers = [(filter_classes(detections, selected(class_names)), class_names)]
+    else:
+        layers = []
+        for model in models:
+            def compute(model=model):
+                with metrics.timer("photo.inference"):
+                    if tiling:
+                        return tiled_detect(bgr, model, **tiling)
+                    return detect(model, bgr)[0]
+
+            detections = cached_detections(image_key, model_digest(model), params, compute)
+            layers.append((filter_classes(detections, selected(model.names)), model.names))
+
+    annotated_image = image if in_place else image.copy()
+    defects = []
+    with metrics.timer("photo.annotate"):
+        for detections, names in layers:
+            draw_detections(annotated_image, detections, names)
+            defects += detection_labels(detections, names)
+    return annotated_image, defects
+
+
+def inspection_image_path(inventory_id, inspected_at, directory=INSPECTION_IMAGE_DIR, suffix=""):
+    """Return where an inspection's annotated image is kept."""
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"inspection_{inventory_id}_{inspected_at:%Y%m%d%H%M%S}{suffix}.jpg")
+
+
+def inspection_row(inventory_id, defects, severity, length, width, image_path, inspected_at=None):
+    """Build the dict :func:`utils.db.add_inspections` expects."""
+    inspected_at = inspected_at or datetime.now()
+    return {
+        "inventory_id": inventory_id,
+        "date": inspected_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "defects": ", ".join(defects),
+        "severity": severity,
+        "length": length,
+        "width": width,
+        "image_path": image_path,
+    }
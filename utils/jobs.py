@@ -0,0 +1,398 @@
+"""Background video-analysis jobs.
+
+Uploads are enqueued into a ``jobs`` table in the main database and run on
+a process pool, so analysis survives browser refreshes and concurrent
+inspectors share a fixed number of workers instead of competing for the
+CPU. Each job processes its video in fixed-length segments, recording
+frame-level progress and the last finished segment; jobs interrupted by a
+server restart are picked up again from that segment.
+
+Job directories live outside the session workspaces, so they have their
+own retention: once a job is done, its input and segments are deleted, and
+finished or failed jobs are removed entirely after
+``JOB_RETENTION_SECONDS``, or sooner, oldest first, while ``JOB_DIR`` holds
+more than ``JOB_QUOTA_MB``.
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cv2
+
+from utils import db, metrics
+from utils.startup import THREAD_ENV_VARS, pin_threads
+from utils.video import open_video_writer
+
+JOB_DIR = os.environ.get("JOB_DIR", "jobs")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+# Torch intra-op threads per worker; keep JOB_WORKERS * JOB_TORCH_THREADS <= cores
+JOB_TORCH_THREADS = int(os.environ.get("JOB_TORCH_THREADS", str(max((os.cpu_count() or 1) // JOB_WORKERS, 1))))
+JOB_SEGMENT_FRAMES = int(os.environ.get("JOB_SEGMENT_FRAMES", "300"))
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", str(24 * 3600)))
+JOB_QUOTA_MB = float(os.environ.get("JOB_QUOTA_MB", "16384"))
+
+# How often list_jobs() and enqueue_video_job() sweep expired jobs
+_GC_INTERVAL = 60.0
+
+JOB_FIELDS = ("id", "kind", "status", "model", "params", "input_path", "output_path",
+              "frames_done", "frames_total", "segments_done", "summary", "error", "created_at", "updated_at", "owner")
+
+_pool = None
+_pool_lock = threading.Lock()
+_schema_ready = False
+_gc_lock = threading.Lock()
+_last_gc = 0.0
+
+
+def init_jobs():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with db.transaction() as c:
+        c.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                        id INTEGER PRIMARY KEY,
+                        kind TEXT,
+                        status TEXT,
+                        model TEXT,
+                        params TEXT,
+                        input_path TEXT,
+                        output_path TEXT,
+                        frames_done INTEGER DEFAULT 0,
+                        frames_total INTEGER,
+                        segments_done INTEGER DEFAULT 0,
+                        summary TEXT,
+                        error TEXT,
+                        created_at TEXT,
+                        updated_at TEXT,
+                        owner TEXT
+                     )''')
+        if "owner" not in {row[1] for row in c.execute("PRAGMA table_info(jobs)")}:
+            c.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs (owner, id)")
+    _schema_ready = True
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _update_job(job_id, **fields):
+    fields["updated_at"] = _now()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with db.transaction() as c:
+        c.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def get_job(job_id):
+    """Return a job as a dict, or ``None``."""
+    init_jobs()
+    with db.connection() as conn:
+        row = conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(zip(JOB_FIELDS, row)) if row else None
+
+
+def list_jobs(limit=20, owner=None):
+    """Return the most recent jobs of ``owner`` (or of everyone if ``None``), newest first."""
+    init_jobs()
+    _maybe_collect()
+    where, params = ("WHERE owner = ?", (owner,)) if owner is not None else ("", ())
+    with db.connection() as conn:
+        rows = conn.execute(
+            f"SELECT {', '.join(JOB_FIELDS)} FROM jobs {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+    return [dict(zip(JOB_FIELDS, row)) for row in rows]
+
+
+def enqueue_video_job(input_path, model_name, params=None, owner=None):
+    """Queue ``input_path`` for analysis with registry model ``model_name``; returns the job id.
+
+    ``owner`` identifies who may list the job (see :func:`list_jobs`). The
+    input file is moved into the job's own directory. ``params`` may set
+    ``classes``, ``batch_size``, ``queue_depth``, ``keyframe_interval`` and ``fps``. In keyframe
+    mode the job's ``summary`` holds distinct defect counts per class. One
+    tracker follows the whole video, and its state is saved after every
+    segment, so a defect crossing a segment boundary (or a server restart)
+    keeps its ID and is counted once. Every detection is also kept in a columnar
+    log next to the output video (see :mod:`utils.detection_log`).
+    """
+    init_jobs()
+    _maybe_collect()
+    # Start (and resume old jobs) before inserting, so this job is only submitted once
+    _get_pool()
+    cap = cv2.VideoCapture(input_path)
+    frames_total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+    cap.release()
+    with db.transaction() as c:
+        job_id = c.execute(
+            "INSERT INTO jobs (kind, status, model, params, frames_total, created_at, updated_at, owner) "
+            "VALUES ('video', 'queued', ?, ?, ?, ?, ?, ?)",
+            (model_name, json.dumps(params or {}), frames_total, _now(), _now(), owner),
+        ).lastrowid
+    job_dir = os.path.join(JOB_DIR, str(job_id))
+    os.makedirs(job_dir, exist_ok=True)
+    stored_input = os.path.join(job_dir, "input" + os.path.splitext(input_path)[1])
+    shutil.move(input_path, stored_input)
+    _update_job(job_id, input_path=stored_input, output_path=os.path.join(job_dir, "annotated.mp4"))
+    _submit(job_id)
+    return job_id
+
+
+def _directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def _delete_job(job_id):
+    shutil.rmtree(os.path.join(JOB_DIR, str(job_id)), ignore_errors=True)
+    with db.transaction() as c:
+        c.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+
+def collect_jobs(now=None):
+    """Delete expired finished jobs, then the oldest ones while ``JOB_DIR`` is over quota; returns the count.
+
+    Queued and running jobs are never deleted. Directories without a job
+    row (left by a failed enqueue) are removed once they are as old.
+    """
+    init_jobs()
+    now = now or time.time()
+    cutoff = datetime.fromtimestamp(now - JOB_RETENTION_SECONDS).strftime("%Y-%m-%d %H:%M:%S")
+    with db.connection() as conn:
+        rows = conn.execute("SELECT id, status, updated_at FROM jobs ORDER BY updated_at").fetchall()
+    known = {str(job_id) for job_id, _, _ in rows}
+    finished = [(job_id, updated_at) for job_id, status, updated_at in rows if status in ("done", "failed")]
+    expired = [job_id for job_id, updated_at in finished if updated_at < cutoff]
+    for job_id in expired:
+        _delete_job(job_id)
+
+    sizes = {}
+    if os.path.isdir(JOB_DIR):
+        for name in os.listdir(JOB_DIR):
+            path = os.path.join(JOB_DIR, name)
+            if not os.path.isdir(path):
+                continue
+            if name not in known and now - os.path.getmtime(path) > JOB_RETENTION_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                sizes[name] = _directory_bytes(path)
+    total = sum(sizes.values())
+    quota = int(JOB_QUOTA_MB * 1024 * 1024)
+    evicted = 0
+    for job_id, _ in finished:
+        if total <= quota:
+            break
+        if job_id in expired:
+            continue
+        total -= sizes.get(str(job_id), 0)
+        _delete_job(job_id)
+        evicted += 1
+    metrics.inc("jobs.collected", len(expired) + evicted)
+    return len(expired) + evicted
+
+
+def _maybe_collect():
+    global _last_gc
+    with _gc_lock:
+        if time.time() - _last_gc < _GC_INTERVAL:
+            return
+        _last_gc = time.time()
+    collect_jobs()
+
+
+def _submit(job_id):
+    future = _get_pool().submit(_run_video_job, job_id)
+
+    def on_done(f):
+        # Only reached if the worker process itself died; job errors are recorded by the worker
+        if f.exception() is not None:
+            _update_job(job_id, status="failed", error=repr(f.exception()))
+
+    future.add_done_callback(on_done)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=JOB_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(db.DB_PATH, JOB_TORCH_THREADS),
+            )
+            _resume_jobs()
+    return _pool
+
+
+def _resume_jobs():
+    """Resubmit jobs left queued or running by a previous server process."""
+    init_jobs()
+    with db.connection() as conn:
+        unfinished = conn.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY id").fetchall()
+    for (job_id,) in unfinished:
+        _submit(job_id)
+
+
+def start():
+    """Start the worker pool and resume unfinished jobs (idempotent)."""
+    _get_pool()
+
+
+def _init_worker(db_path, torch_threads):
+    db.DB_PATH = db_path
+    metrics.start_exporter()
+    # Spawned workers inherit the server's thread variables (set by its warm-up); override them before torch loads
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(torch_threads)
+    pin_threads(torch_threads)
+
+
+def concat_videos(segment_paths, output_path, fps):
+    """Join equally-encoded segments into ``output_path``, without re-encoding when ffmpeg is available.
+
+    The joined file keeps its index at the front, so players start before the download has finished.
+    """
+    if shutil.which("ffmpeg"):
+        list_path = output_path + ".txt"
+        with open(list_path, "w") as f:
+            for path in segment_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+             "-c", "copy", "-movflags", "+faststart", output_path],
+            check=True,
+        )
+        os.remove(list_path)
+        return
+    out = None
+    for path in segment_paths:
+        cap = cv2.VideoCapture(path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if out is None:
+                height, width = frame.shape[:2]
+                out = open_video_writer(output_path, fps, (width, height))
+            out.write(frame)
+        cap.release()
+    if out is not None:
+        out.release()
+
+
+def _run_video_job(job_id):
+    """Worker-process entry point: process the remaining segments of a job."""
+    from utils.detection_log import DetectionLog, DetectionLogWriter, concat_logs, log_path
+    from utils.models import get_model
+    from utils.postprocess import draw_detections, model_predictor
+    from utils.tracking import IoUTracker
+    from utils.video import VIDEO_BATCH_SIZE, VIDEO_QUEUE_DEPTH, run_video_pipeline
+
+    job = get_job(job_id)
+    if job is None or job["status"] in ("done", "failed"):
+        return
+    try:
+        params = json.loads(job["params"] or "{}")
+        segment_frames = params.get("segment_frames", JOB_SEGMENT_FRAMES)
+        _update_job(job_id, status="running")
+        model = get_model(job["model"])
+        predict = model_predictor(model, classes=params.get("classes"))
+        cap = cv2.VideoCapture(job["input_path"])
+        fps = params.get("fps") or cap.get(cv2.CAP_PROP_FPS) or 20
+        cap.release()
+
+        def annotate(frame, detections):
+            return draw_detections(frame, detections, model.names)
+
+        job_dir = os.path.dirname(job["input_path"])
+        segment = job["segments_done"]
+        frames_done = segment * segment_frames
+        keyframe_interval = params.get("keyframe_interval", 1)
+        tracker = None
+        # Distinct defects per class name from before the tracker state was kept (older interrupted jobs)
+        base_counts = {}
+        if keyframe_interval > 1:
+            tracker_path = os.path.join(job_dir, "tracker.json")
+            if segment and os.path.exists(tracker_path):
+                with open(tracker_path) as f:
+                    tracker = IoUTracker.from_state(json.load(f))
+            elif segment:
+                # Carry on after the IDs the earlier segments' logs already use, so merged tracks stay distinct
+                used = [DetectionLog.load(log_path(os.path.join(job_dir, f"segment_{i:05d}.mp4"))).track
+                        for i in range(segment)]
+                tracker = IoUTracker(first_id=max((int(t.max()) for t in used if len(t)), default=0) + 1)
+                base_counts = json.loads(job["summary"] or "{}")
+            else:
+                tracker = IoUTracker()
+        last_report = [0.0]
+
+        def report(done, total):
+            if time.monotonic() - last_report[0] >= 1.0:
+                last_report[0] = time.monotonic()
+                _update_job(job_id, frames_done=frames_done + done)
+
+        while True:
+            segment_path = os.path.join(job_dir, f"segment_{segment:05d}.mp4")
+            log = DetectionLogWriter(fps, model.names, start_frame=segment * segment_frames)
+            written = run_video_pipeline(
+                job["input_path"],
+                segment_path,
+                predict,
+                annotate,
+                batch_size=params.get("batch_size", VIDEO_BATCH_SIZE),
+                queue_depth=params.get("queue_depth", VIDEO_QUEUE_DEPTH),
+                fps=fps,
+                keyframe_interval=keyframe_interval,
+                tracker=tracker,
+                start_frame=segment * segment_frames,
+                max_frames=segment_frames,
+                progress=report,
+                log=log,
+            )
+            if written == 0:
+                break
+            log.save(log_path(segment_path))
+            segment += 1
+            frames_done += written
+            summary = "{}"
+            if tracker is not None:
+                with open(tracker_path + ".tmp", "w") as f:
+                    json.dump(tracker.state(), f)
+                os.replace(tracker_path + ".tmp", tracker_path)
+                defect_counts = dict(base_counts)
+                for cls, n in tracker.defect_counts().items():
+                    name = model.names.get(cls, "Unknown")
+                    defect_counts[name] = defect_counts.get(name, 0) + n
+                summary = json.dumps(defect_counts)
+            _update_job(job_id, segments_done=segment, frames_done=frames_done, summary=summary)
+            if written < segment_frames:
+                break
+
+        segments = [os.path.join(job_dir, f"segment_{i:05d}.mp4") for i in range(segment)]
+        concat_videos(segments, job["output_path"], fps)
+        if segments:
+            concat_logs([log_path(path) for path in segments], log_path(job["output_path"]))
+        _update_job(job_id, status="done", frames_total=frames_done)
+        # Only the annotated video and its log are kept; a resume before this point still has every segment
+        leftovers = [job["input_path"], os.path.join(job_dir, "tracker.json"), *segments, *map(log_path, segments)]
+        for path in leftovers:
+            if os.path.exists(path):
+                os.remove(path)
+    except Exception as e:
+        _update_job(job_id, status="failed", error=f"{type(e).__name__}: {e}")
+
+
+def job_progress(job):
+    """Return a job's progress as a fraction in [0, 1]."""
+    if job["status"] == "done":
+        return 1.0
+    if not job["frames_total"]:
+        return 0.0
+    return min(job["frames_done"] / job["frames_total"], 1.0)
+
@@ -0,0 +1,147 @@
+"""Serve finished and in-progress job videos straight from disk.
+
+Streamlit's own media endpoint keeps every file it serves in memory, once
+for the player and again for the download button. So the server process
+also runs a small HTTP server on ``MEDIA_PORT`` that streams files from
+``JOB_DIR`` with ``sendfile`` and supports range requests, so browsers can
+seek without downloading the whole video. Each URL is signed with
+``MEDIA_SECRET`` and expires, so only videos the app has linked to can be
+fetched. By default browsers reach it on the app's own host name; behind a
+reverse proxy, point ``MEDIA_URL`` at wherever the proxy exposes that port.
+``MEDIA_SERVER=0`` turns it off, and the pages then only load videos up to
+``MEDIA_INLINE_MAX_MB`` into Streamlit.
+"""
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import re
+import secrets
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from utils import metrics
+from utils.jobs import JOB_DIR
+
+MEDIA_SERVER = os.environ.get("MEDIA_SERVER", "1") == "1"
+# Base URL browsers use to reach the media server; empty means the app's host on MEDIA_PORT
+MEDIA_URL = os.environ.get("MEDIA_URL", "").rstrip("/")
+MEDIA_PORT = int(os.environ.get("MEDIA_PORT", "8502"))
+MEDIA_SECRET = os.environ.get("MEDIA_SECRET") or secrets.token_hex(32)
+MEDIA_URL_TTL_SECONDS = int(os.environ.get("MEDIA_URL_TTL_SECONDS", str(12 * 3600)))
+# Largest video the pages load into Streamlit's memory when the media server is not running
+MEDIA_INLINE_MAX_MB = float(os.environ.get("MEDIA_INLINE_MAX_MB", "50"))
+
+logger = logging.getLogger("media")
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+_lock = threading.Lock()
+_server = None
+
+
+def _signature(relpath, expires):
+    return hmac.new(MEDIA_SECRET.encode(), f"{relpath}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def media_url(path, download=False, origin=None):
+    """Return a signed URL for a file under ``JOB_DIR``, or ``None`` when the media server is off.
+
+    ``origin`` is the app's own ``scheme://host[:port]`` as the browser
+    sees it; it is needed unless ``MEDIA_URL`` is set.
+    """
+    if _server is None:
+        return None
+    if MEDIA_URL:
+        base = MEDIA_URL
+    elif origin:
+        parts = urlsplit(origin)
+        host = f"[{parts.hostname}]" if ":" in parts.hostname else parts.hostname
+        base = f"{parts.scheme or 'http'}://{host}:{MEDIA_PORT}"
+    else:
+        return None
+    relpath = os.path.relpath(os.path.abspath(path), os.path.abspath(JOB_DIR)).replace(os.sep, "/")
+    # Round the expiry so the URL (and the player showing it) stays stable across reruns
+    expires = (int(time.time()) // 3600 + 1) * 3600 + MEDIA_URL_TTL_SECONDS
+    url = f"{base}/{quote(relpath)}?expires={expires}&sig={_signature(relpath, expires)}"
+    return url + "&download=1" if download else url
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._serve(body=True)
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def _serve(self, body):
+        url = urlsplit(self.path)
+        relpath = unquote(url.path.lstrip("/"))
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        expires = query.get("expires", "")
+        if not (expires.isdigit() and int(expires) > time.time()
+                and hmac.compare_digest(query.get("sig", ""), _signature(relpath, expires))):
+            self.send_error(HTTPStatus.FORBIDDEN)
+            return
+        root = os.path.realpath(JOB_DIR)
+        path = os.path.realpath(os.path.join(root, relpath))
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            start, end = 0, size - 1
+            match = _RANGE.match(self.headers.get("Range", ""))
+            if match and match.group(1) + match.group(2):
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), end) if match.group(2) else end
+                else:
+                    start = max(size - int(match.group(2)), 0)  # The last N bytes
+                if start > end:
+                    self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.end_headers()
+                    return
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Cache-Control", "private, max-age=3600")
+            if "download" in query:
+                self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+            self.end_headers()
+            if body and end >= start:
+                metrics.inc("media.bytes_sent", end - start + 1)
+                try:
+                    self.connection.sendfile(f, start, end - start + 1)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The player dropped the connection after seeking
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def start_server():
+    """Start the media server once per process (no-op with ``MEDIA_SERVER=0``)."""
+    global _server
+    if not MEDIA_SERVER:
+        return
+    with _lock:
+        if _server is not None:
+            return
+        try:
+            server = ThreadingHTTPServer(("", MEDIA_PORT), _MediaHandler)
+        except OSError as e:
+            logger.warning("Media server not started on port %s: %s", MEDIA_PORT, e)
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="media-server", daemon=True).start()
+        _server = server
@@ -0,0 +1,231 @@
+"""Lightweight in-process metrics: stage timers, counters and latency histograms.
+
+Hot paths wrap their stages in :func:`timer` (or the :func:`timed`
+decorator) and bump :func:`inc` counters. A timer observation costs one
+``perf_counter`` pair, a lock and a bisect into fixed buckets, so the
+overhead stays in the microseconds per frame; with ``METRICS_ENABLED=0``
+timers are no-ops. Snapshots feed the sidebar diagnostics panel, and when
+``METRICS_DIR`` is set each process also writes its metrics there every
+``METRICS_EXPORT_INTERVAL`` seconds as a Prometheus text file (for the
+node_exporter textfile collector) and, optionally, as JSON log lines.
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_EXPORT_INTERVAL = float(os.environ.get("METRICS_EXPORT_INTERVAL", "15"))
+METRICS_LOG = os.environ.get("METRICS_LOG", "0") == "1"
+
+# Histogram bucket upper bounds in seconds, roughly x2.5 apart
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger("metrics")
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_exporter = None
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Estimate the ``q`` quantile by interpolating inside the bucket that holds it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+def inc(name, n=1):
+    """Add ``n`` to counter ``name``."""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def gauge(name, value):
+    """Set gauge ``name`` to its current ``value`` (for example a queue depth)."""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, seconds):
+    """Record one duration (seconds) in histogram ``name``."""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+class _Timer:
+    # A plain class is several times cheaper to enter than a @contextmanager generator
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+
+
+def timer(name):
+    """Context manager that records the duration of its block in histogram ``name``."""
+    if not METRICS_ENABLED:
+        return nullcontext()
+    return _Timer(name)
+
+
+def timed(name):
+    """Decorator form of :func:`timer`."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    """Return ``{"counters": {...}, "gauges": {...}, "timers": {name: stats}}`` with times in milliseconds."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        timers = {
+            name: {
+                "count": h.count,
+                "total_ms": h.sum * 1000,
+                "mean_ms": h.sum / h.count * 1000 if h.count else 0.0,
+                "p50_ms": h.quantile(0.5) * 1000,
+                "p95_ms": h.quantile(0.95) * 1000,
+                "max_ms": h.max * 1000,
+            }
+            for name, h in _histograms.items()
+        }
+    return {"counters": counters, "gauges": gauges, "timers": timers}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def _metric_name(name):
+    return "app_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def prometheus_text():
+    """Render all metrics in the Prometheus text exposition format.
+
+    Every series carries a ``pid`` label so files from several server and
+    job-worker processes can be collected side by side.
+    """
+    pid = f'pid="{os.getpid()}"'
+    lines = []
+    with _lock:
+        for name, value in sorted(_counters.items()):
+            metric = _metric_name(name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric}{{{pid}}} {value}"]
+        for name, value in sorted(_gauges.items()):
+            metric = _metric_name(name)
+            lines += [f"# TYPE {metric} gauge", f"{metric}{{{pid}}} {value}"]
+        for name, h in sorted(_histograms.items()):
+            metric = _metric_name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in zip(BUCKETS, h.counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{{pid},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{pid},le="+Inf"}} {h.count}')
+            lines += [f"{metric}_sum{{{pid}}} {h.sum:.6f}", f"{metric}_count{{{pid}}} {h.count}"]
+    return "\n".join(lines) + "\n"
+
+
+def _export_path():
+    return os.path.join(METRICS_DIR, f"app_{os.getpid()}.prom")
+
+
+def export():
+    """Write this process's metrics to ``METRICS_DIR`` (atomically) and optionally log them."""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _export_path()
+    with open(path + ".tmp", "w") as f:
+        f.write(prometheus_text())
+    os.replace(path + ".tmp", path)
+    if METRICS_LOG:
+        logger.info(json.dumps({"pid": os.getpid(), **snapshot()}))
+
+
+def _remove_export():
+    try:
+        os.remove(_export_path())
+    except OSError:
+        pass
+
+
+def start_exporter():
+    """Start the periodic export thread once per process (no-op without ``METRICS_DIR``)."""
+    global _exporter
+    if not (METRICS_ENABLED and METRICS_DIR):
+        return
+    with _lock:
+        if _exporter is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(METRICS_EXPORT_INTERVAL)
+                try:
+                    export()
+                except OSError as e:
+                    logger.warning("Metrics export failed: %s", e)
+
+        _exporter = threading.Thread(target=loop, name="metrics-exporter", daemon=True)
+        _exporter.start()
+    atexit.register(_remove_export)
@@ -0,0 +1,244 @@
+"""Process-wide YOLO model registry shared by all pages.
+
+Weights are downloaded once into a local cache directory and checked
+against the SHA-256 pinned for them in :data:`MODEL_SHA256`; a download or
+cached file that does not match is refused. A model with no pinned digest
+is trusted on first use: its digest is recorded in a ``.sha256`` sidecar
+and later loads are checked against that. Loaded models live in an LRU that
+is trimmed to a memory budget.
+"""
+import copy
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+
+from utils import metrics
+from utils.backends import MODEL_BACKEND, artifact_bytes, exported_model_path
+from utils.inference_server import INFERENCE_SERVER, remote_model
+
+# Weight sources, keyed by the name the pages ask for
+MODEL_SOURCES = {
+    "road": "https://raw.githubusercontent.com/Mush-Man/Streamlit_WebApp_demo/main/best.pt",
+    "bridge": "https://raw.githubusercontent.com/Mush-Man/Streamlit_WebApp_demo/main/best%20(1).pt",
+}
+
+# Expected SHA-256 of each source above; MODEL_SHA256_<NAME> overrides one.
+# Update these together with the URLs when the published weights change.
+MODEL_SHA256 = {
+    name: os.environ.get(f"MODEL_SHA256_{name.upper()}", "").strip().lower()
+    for name in ("road", "bridge")
+}
+
+MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", "models")
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "1024"))
+
+_CHUNK_SIZE = 1 << 20
+_verified_paths = set()
+
+logger = logging.getLogger("models")
+
+
+def file_sha256(path):
+    """Return the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_sidecar(path):
+    try:
+        with open(path + ".sha256") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _is_verified(path, pinned=None):
+    expected = pinned or _read_sidecar(path)
+    return bool(expected) and os.path.exists(path) and file_sha256(path) == expected
+
+
+def _download(url, path, pinned=None):
+    """Stream ``url`` into ``path`` atomically and record its checksum.
+
+    With a ``pinned`` digest the download is discarded unless it matches.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    part = path + ".part"
+    digest = hashlib.sha256()
+    try:
+        with requests.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(part, "wb") as f:
+                for chunk in response.iter_content(_CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+        if pinned and digest.hexdigest() != pinned:
+            raise ValueError(
+                f"Checksum mismatch for {url}: expected {pinned}, got {digest.hexdigest()}"
+            )
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    os.replace(part, path)
+    with open(path + ".sha256", "w") as f:
+        f.write(digest.hexdigest())
+
+
+def weights_path(name):
+    """Return a verified local path to the weights for ``name``, downloading if needed."""
+    if name not in MODEL_SOURCES:
+        raise KeyError(f"Unknown model '{name}'. Known models: {', '.join(MODEL_SOURCES)}")
+    path = os.path.join(MODEL_CACHE_DIR, f"{name}.pt")
+    if path in _verified_paths:
+        return path
+    pinned = MODEL_SHA256.get(name)
+    if not pinned:
+        logger.warning("No pinned SHA-256 for model '%s'; trusting the first download", name)
+    if not _is_verified(path, pinned):
+        _download(MODEL_SOURCES[name], path, pinned)
+    _verified_paths.add(path)
+    return path
+
+
+def weights_digest(name):
+    """Return the SHA-256 of the cached weights for ``name``."""
+    path = weights_path(name)
+    return MODEL_SHA256.get(name) or _read_sidecar(path) or file_sha256(path)
+
+
+def _model_bytes(model, path):
+    """Estimate the resident size of a loaded model."""
+    try:
+        return sum(p.numel() * p.element_size() for p in model.model.parameters())
+    except Exception:
+        return artifact_bytes(path)
+
+
+class LockedModel:
+    """A loaded model whose ``predict`` runs one call at a time.
+
+    Ultralytics predictors keep per-call state (the current batch and its
+    preprocessing settings), so two sessions predicting on one instance at
+    once can corrupt each other's results. Every other attribute is read
+    from the wrapped model. Threads that need to predict in parallel, such
+    as the tile workers, take their own copy with ``copy.deepcopy``.
+    """
+
+    def __init__(self, model):
+        self._wrapped = model
+        self._lock = threading.Lock()
+
+    def predict(self, *args, **kwargs):
+        with self._lock:
+            return self._wrapped.predict(*args, **kwargs)
+
+    __call__ = predict
+
+    def __getattr__(self, name):
+        if name in ("_wrapped", "_lock"):
+            raise AttributeError(name)  # Not yet set while copying
+        return getattr(self._wrapped, name)
+
+    def __deepcopy__(self, memo):
+        return LockedModel(copy.deepcopy(self._wrapped, memo))
+
+
+class ModelRegistry:
+    """Thread-safe LRU of loaded models bounded by a memory budget.
+
+    Models are handed out as :class:`LockedModel`, so sessions sharing one
+    can call ``predict`` concurrently.
+    """
+
+    def __init__(self, budget_mb=MODEL_MEMORY_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._models = OrderedDict()  # (name, backend) -> (model, nbytes)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, name, backend=None):
+        """Return the model for ``name`` on ``backend`` (default ``MODEL_BACKEND``), loading it on first use."""
+        key = (name, backend or MODEL_BACKEND)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                metrics.inc("model_registry.hit")
+                return self._models[key][0]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other models stay available,
+        # but only once per name even if several sessions ask at once.
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key][0]
+            from ultralytics import YOLO
+
+            metrics.inc("model_registry.miss")
+            with metrics.timer("model_registry.load"):
+                path = exported_model_path(weights_path(name), key[1], weights_digest(name))
+                model = YOLO(path, task="detect")
+            nbytes = _model_bytes(model, path)
+            model = LockedModel(model)
+            with self._lock:
+                self._models[key] = (model, nbytes)
+                self._evict()
+            return model
+
+    def _evict(self):
+        # Always keep the most recently used model, even if it alone exceeds the budget
+        total = sum(nbytes for _, nbytes in self._models.values())
+        while total > self.budget_bytes and len(self._models) > 1:
+            _, (_, nbytes) = self._models.popitem(last=False)
+            total -= nbytes
+
+    def key_of(self, model):
+        """Return the ``(name, backend)`` of a loaded ``model``, or ``None``."""
+        with self._lock:
+            for key, (loaded, _) in self._models.items():
+                if loaded is model:
+                    return key
+        return None
+
+    def loaded(self):
+        """Return the ``(name, backend)`` keys of the models currently in memory, oldest first."""
+        with self._lock:
+            return list(self._models)
+
+
+_registry = ModelRegistry()
+
+
+def get_model(name, backend=None):
+    """Return the shared model for ``name`` ("road" or "bridge").
+
+    ``backend`` is one of :data:`utils.backends.BACKENDS`; it defaults to the
+    ``MODEL_BACKEND`` environment setting. With ``INFERENCE_SERVER=1`` this is
+    a :class:`~utils.inference_server.RemoteModel` that runs on the shared
+    inference server instead.
+    """
+    if INFERENCE_SERVER:
+        return remote_model(name, backend or MODEL_BACKEND)
+    return _registry.get(name, backend)
+
+
+def model_digest(model):
+    """Return an identifier of a registry-loaded ``model``'s weights and backend, or ``None`` if unknown.
+
+    Exported backends give slightly different detections, so each gets its own cache key.
+    """
+    key = getattr(model, "registry_key", None) or _registry.key_of(model)
+    if key is None:
+        return None
+    name, backend = key
+    digest = weights_digest(name)
+    return digest if backend == "torch" else f"{digest}:{backend}"
@@ -0,0 +1,132 @@
+"""Several camera streams sharing one batched detector.
+
+Each source (a device index, an RTSP URL or a video file standing in for a
+camera) is decoded on its own :class:`~utils.camera.CaptureThread`, and
+OpenCV releases the GIL while decoding, so the streams decode in parallel.
+All the capture buffers share one condition variable. The inference loop
+sleeps until any stream has a new frame. It then takes the newest frame of
+up to ``batch_size`` streams and runs them through the model in one call.
+
+Streams are served round-robin. When more streams have frames than fit in
+a batch, the next batch starts with the streams that were left out, so a
+fast camera cannot starve a slow one. Each stream only ever contributes
+its newest frame; frames it captured in the meantime are dropped and
+counted in its stats.
+
+Adding a camera adds a decode thread and a slot in the batch, not another
+copy of the model.
+"""
+import os
+import threading
+from collections import namedtuple
+
+from utils import metrics
+from utils.camera import CAMERA_SOURCE, CaptureThread, LatestFrame, StreamStats
+
+# Comma-separated device indices, RTSP/HTTP URLs or video file paths
+CAMERA_SOURCES = [s.strip() for s in os.environ.get("CAMERA_SOURCES", CAMERA_SOURCE).split(",") if s.strip()]
+# Frames per inference call; 0 batches one frame from every stream
+MULTISTREAM_BATCH_SIZE = int(os.environ.get("MULTISTREAM_BATCH_SIZE", "0"))
+
+StreamResult = namedtuple("StreamResult", "stream frame detections captured_at")
+
+
+class MultiStream:
+    """Capture several sources at once and hand their newest frames out in fair batches.
+
+    Use as a context manager: entering starts every capture thread (or
+    raises ``IOError`` naming the sources that could not be opened), and
+    leaving stops them.
+    """
+
+    def __init__(self, sources, batch_size=MULTISTREAM_BATCH_SIZE, realtime=True):
+        self.sources = list(sources)
+        self.batch_size = batch_size or len(self.sources)
+        self._cond = threading.Condition()
+        self.captures = [CaptureThread(source, LatestFrame(self._cond), realtime) for source in self.sources]
+        self.stats = [StreamStats() for _ in self.sources]
+        self._seqs = [0] * len(self.sources)
+        self._next = 0  # Stream the next batch starts with
+
+    def __enter__(self):
+        failed = [str(c.source) for c in self.captures if not c.is_opened()]
+        if failed:
+            self._release()
+            raise IOError(f"Could not open camera source: {', '.join(failed)}")
+        for capture in self.captures:
+            capture.start()
+        return self
+
+    def __exit__(self, *exc):
+        for capture in self.captures:
+            capture.stop()
+        for capture in self.captures:
+            capture.join(timeout=2.0)
+        self._release()
+
+    def _release(self):
+        for capture in self.captures:
+            if not capture.is_alive():
+                capture.cap.release()
+
+    def _ready(self):
+        return (any(c.buffer.seq > seq for c, seq in zip(self.captures, self._seqs))
+                or all(c.buffer.closed for c in self.captures))
+
+    def next_batch(self, timeout=2.0):
+        """Wait for new frames; return ``[(stream, frame, captured_at), ...]`` in round-robin order.
+
+        Returns ``None`` on timeout, or once every stream has ended and its
+        last frame has been handed out.
+        """
+        n = len(self.captures)
+        with self._cond:
+            if not self._cond.wait_for(self._ready, timeout):
+                return None
+            batch = []
+            for offset in range(n):
+                stream = (self._next + offset) % n
+                item = self.captures[stream].buffer.newest(self._seqs[stream])
+                if item is None:
+                    continue
+                self._seqs[stream], frame, captured_at = item
+                batch.append((stream, frame, captured_at))
+                if len(batch) == self.batch_size:
+                    break
+            if batch:
+                self._next = (batch[-1][0] + 1) % n
+            return batch or None
+
+    def detections(self, predict, timeout=2.0):
+        """Yield a list of :class:`StreamResult` per batch until every stream ends or stalls.
+
+        ``predict`` takes a list of BGR frames and returns one detection
+        array per frame, so one model instance serves every stream. Each
+        stream's stats are updated when its result is ready.
+        """
+        while True:
+            batch = self.next_batch(timeout)
+            if batch is None:
+                return
+            with metrics.timer("multistream.inference"):
+                predictions = predict([frame for _, frame, _ in batch])
+            metrics.inc("multistream.batches")
+            metrics.inc("multistream.frames", len(batch))
+            results = []
+            for (stream, frame, captured_at), detections in zip(batch, predictions):
+                self.stats[stream].record(captured_at)
+                results.append(StreamResult(stream, frame, detections, captured_at))
+            yield results
+
+    def summary(self):
+        """Return one row per stream: source, FPS, latency, frames processed and dropped."""
+        return [
+            {
+                "Source": str(source),
+                "FPS": round(stats.fps, 1),
+                "Latency (ms)": round(stats.latency_ms),
+                "Processed": stats.frames,
+                "Dropped": max(capture.frames_captured - stats.frames, 0),
+            }
+            for source, capture, stats in zip(self.sources, self.captures, self.stats)
+        ]
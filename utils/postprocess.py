@@ -0,0 +1,111 @@
+"""Shared detection post-processing and annotation.
+
+Detections are handled as whole ``(N, 6)`` arrays of x1, y1, x2, y2, conf,
+cls (plus an optional track-ID column) rather than per-box ``Boxes``
+objects. Class selection is pushed into inference as class indices where
+possible, and drawing renders every box in one call with cached label
+bitmaps.
+"""
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+BOX_COLOR = (0, 255, 0)
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+_FONT_SCALE = 0.5
+_THICKNESS = 2
+
+
+def class_ids(names, selected_classes):
+    """Return the class indices in ``names`` whose label is in ``selected_classes``."""
+    selected = set(selected_classes)
+    return [cls for cls, name in names.items() if name in selected]
+
+
+def result_to_array(result):
+    """Return a YOLO result's boxes as an (N, 6) array of x1, y1, x2, y2, conf, cls."""
+    data = result.boxes.data
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    return np.asarray(data, dtype=np.float32).reshape(-1, 6)
+
+
+def detect(model, images, classes=None, **predict_kwargs):
+    """Run ``model`` on one image or a list of images and return detection arrays.
+
+    ``classes`` is a list of class indices applied inside the model's own NMS.
+    """
+    results = model.predict(images, verbose=False, classes=classes, **predict_kwargs)
+    return [result_to_array(result) for result in results]
+
+
+def model_predictor(model, classes=None, **predict_kwargs):
+    """Wrap :func:`detect` as a batch function for the video pipelines."""
+    def predict(frames):
+        return detect(model, frames, classes=classes, **predict_kwargs)
+    return predict
+
+
+def filter_classes(detections, selected_ids):
+    """Keep only the rows of ``detections`` whose class is in ``selected_ids``."""
+    return detections[np.isin(detections[:, 5].astype(np.int64), selected_ids)]
+
+
+def detection_labels(detections, names):
+    """Return the class name of every detection row."""
+    return [names.get(int(cls), "Unknown") for cls in detections[:, 5]]
+
+
+@lru_cache(maxsize=4096)
+def _label_pixels(text):
+    """Render ``text`` once and return the (dy, dx) offsets of its pixels from the putText origin."""
+    (width, height), baseline = cv2.getTextSize(text, _FONT, _FONT_SCALE, _THICKNESS)
+    pad = _THICKNESS
+    canvas = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype=np.uint8)
+    cv2.putText(canvas, text, (pad, height + pad), _FONT, _FONT_SCALE, 255, _THICKNESS)
+    dy, dx = np.nonzero(canvas > 127)
+    dy = (dy - height - pad).astype(np.int32)
+    dx = (dx - pad).astype(np.int32)
+    dy.setflags(write=False)
+    dx.setflags(write=False)
+    return dy, dx
+
+
+def _label_text(label, confidence, track_id=None):
+    text = f"{label}: {confidence:.2f}"
+    return text if track_id is None else f"#{track_id} {text}"
+
+
+def draw_detections(image, detections, names, color=BOX_COLOR):
+    """Draw every box and label in ``detections`` onto ``image`` in place and return it.
+
+    Tracked (N, 7) arrays get their track ID prefixed to the label.
+    """
+    if not len(detections):
+        return image
+    corners = np.rint(detections[:, :4]).astype(np.int32)
+    x1, y1, x2, y2 = corners.T
+    polygons = np.stack([np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+                         np.stack([x2, y2], 1), np.stack([x1, y2], 1)], axis=1)
+    cv2.polylines(image, list(polygons), True, color, _THICKNESS)
+
+    # Group rows by label text so each cached bitmap is stamped at all its
+    # positions with one vectorized scatter.
+    labels = detection_labels(detections, names)
+    confidences = detections[:, 4].tolist()
+    track_ids = detections[:, 6].astype(np.int64).tolist() if detections.shape[1] > 6 else [None] * len(labels)
+    groups = {}
+    for i, text in enumerate(map(_label_text, labels, confidences, track_ids)):
+        groups.setdefault(text, []).append(i)
+
+    ys, xs = [], []
+    for text, rows in groups.items():
+        dy, dx = _label_pixels(text)
+        ys.append((y1[rows, None] - 10 + dy).ravel())
+        xs.append((x1[rows, None] + dx).ravel())
+    ys = np.concatenate(ys)
+    xs = np.concatenate(xs)
+    inside = (ys >= 0) & (ys < image.shape[0]) & (xs >= 0) & (xs < image.shape[1])
+    image[ys[inside], xs[inside]] = color
+    return image
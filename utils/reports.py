@@ -0,0 +1,279 @@
+"""PDF reports built with ReportLab, entirely in memory.
+
+All pages share one report engine: fonts are registered once per process,
+the page header and footer are drawn once per document as a reusable form
+XObject, and embedded photos are downscaled to ``REPORT_IMAGE_DPI`` at
+their printed size and recompressed as JPEG before they reach the PDF.
+Content is written straight onto the canvas page by page, so batch reports
+over many assets stream rows from the database without building a
+document tree first.
+"""
+import io
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from utils import db, metrics
+from utils.detection_log import load_log
+
+REPORT_IMAGE_DPI = int(os.environ.get("REPORT_IMAGE_DPI", "150"))
+REPORT_JPEG_QUALITY = int(os.environ.get("REPORT_JPEG_QUALITY", "80"))
+# Optional TTF font (regular, bold) for reports; defaults to the built-in Helvetica
+REPORT_FONT = os.environ.get("REPORT_FONT")
+REPORT_FONT_BOLD = os.environ.get("REPORT_FONT_BOLD")
+REPORT_LOGO = os.environ.get("REPORT_LOGO", "assets/Terminus logo.png")
+# Frames with most detections listed per job in video reports
+VIDEO_REPORT_WORST_FRAMES = int(os.environ.get("VIDEO_REPORT_WORST_FRAMES", "5"))
+
+PAGE_SIZE = A4
+MARGIN = 2 * cm
+_HEADER_FORM = "page_template"
+
+
+@lru_cache(maxsize=None)
+def report_fonts():
+    """Register the report fonts once per process and return (regular, bold) font names."""
+    if REPORT_FONT and os.path.exists(REPORT_FONT):
+        pdfmetrics.registerFont(TTFont("ReportFont", REPORT_FONT))
+        bold = "ReportFont"
+        if REPORT_FONT_BOLD and os.path.exists(REPORT_FONT_BOLD):
+            pdfmetrics.registerFont(TTFont("ReportFont-Bold", REPORT_FONT_BOLD))
+            bold = "ReportFont-Bold"
+        return "ReportFont", bold
+    return "Helvetica", "Helvetica-Bold"
+
+
+@lru_cache(maxsize=4)
+def _logo(path):
+    """Return the header logo as small JPEG bytes with its printed size, or ``None``."""
+    if not path or not os.path.exists(path):
+        return None
+    return encode_image(path, 2.5 * cm)
+
+
+@lru_cache(maxsize=64)
+def _encode_file(path, mtime, width_pt, dpi, quality):
+    with open(path, "rb") as f:
+        return encode_image(f, width_pt, dpi, quality)
+
+
+def encode_image(source, width_pt, dpi=REPORT_IMAGE_DPI, quality=REPORT_JPEG_QUALITY):
+    """Downscale an image for printing ``width_pt`` wide and return ``(jpeg_bytes, width, height)``.
+
+    ``source`` is a path, encoded bytes, a file object, a PIL image or an
+    RGB array. The image is resized to at most ``dpi`` pixels per inch at that width and
+    re-encoded as JPEG, which ReportLab embeds without decoding again.
+    """
+    if isinstance(source, str):
+        # Batch reports often repeat a photo; re-encode a file only when it changes
+        return _encode_file(source, os.path.getmtime(source), width_pt, dpi, quality)
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with metrics.timer("report.image"):
+        return _downscale_jpeg(source, width_pt, dpi, quality)
+
+
+def _downscale_jpeg(source, width_pt, dpi, quality):
+    max_width = max(int(width_pt / 72 * dpi), 1)
+    if isinstance(source, np.ndarray):
+        image = Image.fromarray(source)
+    elif isinstance(source, Image.Image):
+        image = source
+    else:
+        image = Image.open(source)
+        # Let the JPEG decoder skip detail we are about to throw away
+        image.draft("RGB", (max_width, max(max_width * image.height // image.width, 1)))
+    if image.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white paper rather than black
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    image = image.convert("RGB")
+    if image.width > max_width:
+        image = image.resize((max_width, max(round(image.height * max_width / image.width), 1)), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue(), width_pt, width_pt * image.height / image.width
+
+
+class ReportWriter:
+    """Top-to-bottom writer on a ReportLab canvas that starts new pages as needed."""
+
+    def __init__(self, title, output=None):
+        self.title = title
+        self.output = output if output is not None else io.BytesIO()
+        self.font, self.bold = report_fonts()
+        self.canvas = canvas.Canvas(self.output, pagesize=PAGE_SIZE, pageCompression=1)
+        self.canvas.setTitle(title)
+        self.width, self.height = PAGE_SIZE
+        self.page = 0
+        self._define_template()
+        self._new_page()
+
+    def _define_template(self):
+        # Header and footer rule are identical on every page: store them once as a form
+        c = self.canvas
+        c.beginForm(_HEADER_FORM)
+        logo = _logo(REPORT_LOGO)
+        if logo:
+            data, w, h = logo
+            x, y = self.width - MARGIN - w, self.height - MARGIN + 0.3 * cm
+            c.drawImage(ImageReader(io.BytesIO(data)), x, y, w, h)
+        c.setFont(self.bold, 10)
+        c.drawString(MARGIN, self.height - MARGIN + 0.5 * cm, self.title)
+        c.setLineWidth(0.5)
+        c.line(MARGIN, self.height - MARGIN + 0.2 * cm, self.width - MARGIN, self.height - MARGIN + 0.2 * cm)
+        c.line(MARGIN, MARGIN - 0.4 * cm, self.width - MARGIN, MARGIN - 0.4 * cm)
+        c.endForm()
+
+    def _new_page(self):
+        if self.page:
+            self.canvas.showPage()
+        self.page += 1
+        self.canvas.doForm(_HEADER_FORM)
+        self.canvas.setFont(self.font, 8)
+        self.canvas.drawRightString(self.width - MARGIN, MARGIN - 0.8 * cm, f"Page {self.page}")
+        self.y = self.height - MARGIN - 0.4 * cm
+
+    def _reserve(self, height):
+        if self.y - height < MARGIN:
+            self._new_page()
+
+    def heading(self, text, size=14):
+        self._reserve(size * 2)
+        self.y -= size * 1.4
+        self.canvas.setFont(self.bold, size)
+        self.canvas.drawString(MARGIN, self.y, text)
+        self.y -= size * 0.4
+
+    def text(self, text, size=10, bold=False):
+        font = self.bold if bold else self.font
+        self.canvas.setFont(font, size)
+        for line in simpleSplit(str(text), font, size, self.width - 2 * MARGIN) or [""]:
+            self._reserve(size * 1.4)
+            self.canvas.setFont(font, size)
+            self.y -= size * 1.4
+            self.canvas.drawString(MARGIN, self.y, line)
+
+    def field(self, label, value, size=10):
+        self.text(f"{label}: {value}", size)
+
+    def image(self, source, width_pt=None):
+        """Draw an image at ``width_pt`` (default: the text width), downscaled for print."""
+        width_pt = min(width_pt or self.width - 2 * MARGIN, self.width - 2 * MARGIN)
+        data, w, h = encode_image(source, width_pt)
+        max_height = self.height - 2 * MARGIN - 1 * cm
+        if h > max_height:
+            w, h = w * max_height / h, max_height
+        self._reserve(h + 6)
+        self.y -= h + 6
+        self.canvas.drawImage(ImageReader(io.BytesIO(data)), MARGIN, self.y, w, h)
+
+    def spacer(self, height=10):
+        self.y -= height
+
+    def close(self):
+        """Finish the document; returns the PDF bytes when writing to memory."""
+        self.canvas.save()
+        if isinstance(self.output, io.BytesIO):
+            return self.output.getvalue()
+        return None
+
+
+@metrics.timed("report.inspection")
+def inspection_report(inventory, defects, length, width, image=None):
+    """Return a one-inspection report for an ``inventory`` row as PDF bytes."""
+    report = ReportWriter("Inspection Report")
+    report.heading("Inspection Report", size=16)
+    report.field("Name", inventory[1])
+    report.field("Location", inventory[2])
+    report.field("Type", inventory[3])
+    report.field("Built Year", inventory[4])
+    report.field("Defects Detected", ", ".join(defects) or "None")
+    report.field("Length", f"{length} meters")
+    report.field("Width", f"{width} meters")
+    if image is not None:
+        report.spacer()
+        report.text("Annotated Image:", bold=True)
+        report.image(image)
+    return report.close()
+
+
+@metrics.timed("report.video")
+def video_report(jobs):
+    """Return a defect report over finished video-analysis jobs as PDF bytes.
+
+    ``jobs`` are dicts from :func:`utils.jobs.list_jobs`. Counts and the
+    worst frames come from the detection log next to each job's output
+    video; jobs without a log fall back to the distinct counts in their
+    ``summary``.
+    """
+    report = ReportWriter("Infrastructure Management System - Defect Report")
+    report.heading("Infrastructure Management System - Defect Report")
+    totals = {}
+    for job in jobs:
+        log = load_log(job["output_path"]) if job["output_path"] else None
+        counts = log.counts() if log is not None else json.loads(job["summary"] or "{}")
+        report.heading(f"Job {job['id']} ({job['model']} model, {job['updated_at']})", size=11)
+        report.field("Frames analysed", job["frames_done"])
+        if log is not None and len(log) and not (log.track >= 0).all():
+            report.text("Keyframe tracking was off: counts are per-frame detections, not distinct defects.", size=9)
+        if counts:
+            for name, n in sorted(counts.items()):
+                report.text(f"{name}: {n}")
+                totals[name] = totals.get(name, 0) + n
+        else:
+            report.text("No defects detected.")
+        worst = log.worst_frames(VIDEO_REPORT_WORST_FRAMES) if log is not None else []
+        if worst:
+            report.text("Frames with most detections:", bold=True)
+            for frame, time, n in worst:
+                report.text(f"Frame {frame} ({time:.1f} s): {int(n)}")
+    report.heading("Totals", size=12)
+    if totals:
+        for name, n in sorted(totals.items()):
+            report.field(name, n)
+    else:
+        report.text("No defects counted.")
+    return report.close()
+
+
+@metrics.timed("report.batch")
+def batch_report(location=None, type_=None, since=None, output=None, image_width=8 * cm):
+    """Report every matching inspection, grouped by asset, with thumbnails.
+
+    Rows are streamed from :func:`utils.db.iter_inspections` and written page
+    by page. Pass a file object as ``output`` to write there directly;
+    otherwise the PDF bytes are returned.
+    """
+    scope = ", ".join(filter(None, [location, type_, f"since {since}" if since else None])) or "All assets"
+    report = ReportWriter(f"Inspection Summary - {scope}", output)
+    report.heading(f"Inspection Summary - {scope}", size=16)
+    current = None
+    count = 0
+    for inventory_id, name, asset_location, asset_type, built_year, date, defects, severity, length, width, \
+            image_path in db.iter_inspections(location, type_, since):
+        if inventory_id != current:
+            current = inventory_id
+            report.heading(f"{name} (#{inventory_id})", size=12)
+            report.text(f"{asset_type} · {asset_location or 'Unknown location'} · built {built_year}", size=9)
+        report.text(f"{date} · severity {severity or 'n/a'}", bold=True)
+        report.text(f"Defects: {defects or 'None'}")
+        if length or width:
+            report.text(f"Length {length} m, width {width} m")
+        if image_path and os.path.exists(image_path):
+            report.image(image_path, image_width)
+        count += 1
+    if count == 0:
+        report.text("No inspections match this selection.")
+    return report.close()
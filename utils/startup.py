@@ -0,0 +1,165 @@
+"""Model warm-up and thread settings applied when the server process starts.
+
+The first detection in a fresh process pays for importing torch and
+ultralytics, fetching the weights (or exports) and the first, slow
+inference at each input size. :func:`start_background` does all of that on
+a background thread as soon as ``streamlit_app.py`` first runs, after
+starting the inference server, the media server and the video job pool,
+so visitors land on the light pages straight away (without even importing
+OpenCV or NumPy) and the detection pages find the models already in the
+registry. ``python -m utils.startup`` does the same
+ahead of time (for example while building an image), so new instances
+start with the weights and exports on disk.
+
+This module only imports the standard library and ``utils.metrics`` at
+import time; everything heavy is imported on the warm-up thread.
+"""
+import logging
+import os
+import threading
+import time
+
+from utils import metrics
+
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") != "0"
+WARMUP_MODELS = os.environ.get("WARMUP_MODELS", "road,bridge")
+# Input sizes to warm; defaults to the sizes the pages run inference at
+WARMUP_IMGSZ = os.environ.get("WARMUP_IMGSZ")
+# Intra-op threads for torch, OpenMP/MKL and OpenCV in the server process
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", str(os.cpu_count() or 1)))
+# Read by OpenMP, MKL and OpenBLAS when torch and NumPy are first imported
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+logger = logging.getLogger("startup")
+
+_lock = threading.Lock()
+_thread = None
+_status = {"state": "idle", "models": {}, "error": None, "time_to_first_detection": None, "time_to_ready": None}
+
+
+def _process_start():
+    """Wall-clock time this process started (Linux), or now if unknown."""
+    try:
+        with open("/proc/self/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, StopIteration):
+        return time.time()
+
+
+PROCESS_START = _process_start()
+
+
+def pin_threads(n=INFERENCE_THREADS):
+    """Cap intra-op parallelism at ``n`` threads.
+
+    The OpenMP/MKL variables only take effect if set before torch is first
+    imported, which this function then does; call it off the request path.
+    """
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(n))
+    try:
+        import cv2
+
+        cv2.setNumThreads(n)
+    except ImportError:
+        pass
+    try:
+        import torch
+
+        torch.set_num_threads(n)
+    except ImportError:
+        pass
+
+
+def warmup_sizes():
+    """Return the distinct square input sizes to warm up."""
+    if WARMUP_IMGSZ:
+        return sorted({int(s) for s in WARMUP_IMGSZ.split(",") if s})
+    from utils.backends import EXPORT_IMGSZ
+    from utils.ensemble import ENSEMBLE_IMGSZ
+    from utils.tiling import TILE_SIZE
+
+    return sorted({EXPORT_IMGSZ, ENSEMBLE_IMGSZ, TILE_SIZE})
+
+
+def warm_up(model_names=None, sizes=None, backend=None):
+    """Load each model through the registry and run one dummy inference per input size."""
+    import numpy as np
+
+    from utils.models import get_model
+    from utils.postprocess import detect
+
+    model_names = model_names or [name for name in WARMUP_MODELS.split(",") if name]
+    with _lock:
+        _status["state"] = "warming"
+    try:
+        from utils.inference_server import INFERENCE_SERVER
+
+        if not INFERENCE_SERVER:  # Otherwise the inference server process runs the models
+            pin_threads()
+        sizes = sizes or warmup_sizes()
+        for name in model_names:
+            start = time.perf_counter()
+            model = get_model(name, backend)
+            for size in sizes:
+                with metrics.timer("startup.warmup_inference"):
+                    detect(model, np.zeros((size, size, 3), dtype=np.uint8), imgsz=size)
+                with _lock:
+                    if _status["time_to_first_detection"] is None:
+                        _status["time_to_first_detection"] = time.time() - PROCESS_START
+                        metrics.observe("startup.time_to_first_detection", _status["time_to_first_detection"])
+                        logger.info("First detection %.1fs after process start", _status["time_to_first_detection"])
+            with _lock:
+                _status["models"][name] = time.perf_counter() - start
+    except Exception as e:
+        logger.exception("Model warm-up failed")
+        with _lock:
+            _status.update(state="failed", error=f"{type(e).__name__}: {e}")
+        metrics.inc("startup.warmup_failed")
+        return
+    with _lock:
+        _status.update(state="ready", time_to_ready=time.time() - PROCESS_START)
+    metrics.observe("startup.time_to_ready", _status["time_to_ready"])
+    logger.info("Models %s warm %.1fs after process start", ", ".join(model_names), _status["time_to_ready"])
+
+
+def _start_services():
+    """Start the inference server, the media server and the video job pool (resuming unfinished jobs)."""
+    from utils import inference_server, jobs, media
+
+    for start in (inference_server.start_server, media.start_server, jobs.start):
+        try:
+            start()
+        except Exception:
+            logger.exception("Could not start %s", start.__module__)
+
+
+def _background():
+    _start_services()
+    if WARMUP_ENABLED:
+        warm_up()
+
+
+def start_background():
+    """Start the services and the model warm-up on one thread, once per process (non-blocking)."""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_background, name="startup", daemon=True)
+        _thread.start()
+
+
+def status():
+    """Return a copy of the warm-up status for display."""
+    with _lock:
+        return {**_status, "models": dict(_status["models"])}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    warm_up()
+    raise SystemExit(0 if status()["state"] == "ready" else 1)
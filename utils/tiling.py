@@ -0,0 +1,103 @@
+"""Tiled (sliced) inference for high-resolution inspection photos.
+
+The image is cut into overlapping tiles at native resolution so hairline
+cracks are not lost when YOLO shrinks the whole photo to its input size.
+Tiles run in batches, optionally spread over a long-lived thread pool
+whose worker threads each keep their own copy of the model across calls,
+and the per-tile boxes are shifted back into image coordinates and merged
+with vectorized NMS.
+"""
+import copy
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.boxes import nms
+from utils.postprocess import detect
+
+TILE_SIZE = int(os.environ.get("TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", "0.2"))
+TILE_BATCH_SIZE = int(os.environ.get("TILE_BATCH_SIZE", "8"))
+TILE_WORKERS = int(os.environ.get("TILE_WORKERS", "1"))
+
+_local = threading.local()
+_clone_lock = threading.Lock()
+_pools = {}  # Worker count -> executor, kept for the life of the process
+_pools_lock = threading.Lock()
+
+
+def _axis_starts(length, tile_size, stride):
+    if length <= tile_size:
+        return np.zeros(1, dtype=np.int64)
+    starts = np.arange(0, length - tile_size, stride)
+    # Align the last tile with the far edge instead of padding past it
+    return np.append(starts, length - tile_size)
+
+
+def tile_grid(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Return the (x0, y0) top-left corner of every tile as an (N, 2) array."""
+    if not 0 <= overlap < 1:
+        raise ValueError("overlap must be in [0, 1)")
+    stride = max(int(tile_size * (1 - overlap)), 1)
+    xs = _axis_starts(width, tile_size, stride)
+    ys = _axis_starts(height, tile_size, stride)
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    return np.stack([grid_x.ravel(), grid_y.ravel()], axis=1)
+
+
+def _pool(workers):
+    """Return the shared executor with ``workers`` threads, creating it on first use."""
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tiles")
+        return _pools[workers]
+
+
+def _thread_model(model):
+    """Return this thread's private copy of ``model``; YOLO predictors are not thread-safe.
+
+    Pool threads outlive the call, so the copy is made once per thread and
+    model and reused by later photos.
+    """
+    models = getattr(_local, "models", None)
+    if models is None:
+        models = _local.models = {}
+    entry = models.get(id(model))
+    if entry is None or entry[0]() is not model:  # An evicted model's id can be reused
+        for key in [key for key, (ref, _) in models.items() if ref() is None]:
+            del models[key]
+        with _clone_lock:
+            entry = models[id(model)] = (weakref.ref(model), copy.deepcopy(model))
+    return entry[1]
+
+
+def tiled_detect(image, model, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, batch_size=TILE_BATCH_SIZE,
+                 workers=TILE_WORKERS, classes=None, iou_threshold=0.5, include_full_image=True):
+    """Detect on a BGR ``image`` tile by tile and return merged (N, 6) detections.
+
+    With ``include_full_image`` the whole image is also run once so that
+    defects larger than a tile are still found in one piece.
+    """
+    height, width = image.shape[:2]
+    offsets = tile_grid(width, height, tile_size, overlap)
+    tiles = [image[y:y + tile_size, x:x + tile_size] for x, y in offsets]
+    batches = [tiles[i:i + batch_size] for i in range(0, len(tiles), batch_size)]
+
+    if workers > 1 and len(batches) > 1:
+        per_batch = list(_pool(workers).map(lambda batch: detect(_thread_model(model), batch, classes=classes), batches))
+    else:
+        per_batch = [detect(model, batch, classes=classes) for batch in batches]
+    per_tile = [detections for batch in per_batch for detections in batch]
+
+    counts = np.array([len(d) for d in per_tile])
+    merged = np.concatenate(per_tile) if per_tile else np.zeros((0, 6), dtype=np.float32)
+    shifts = np.repeat(offsets, counts, axis=0).astype(np.float32)
+    merged[:, [0, 2]] += shifts[:, :1]
+    merged[:, [1, 3]] += shifts[:, 1:]
+
+    if include_full_image and len(offsets) > 1:
+        merged = np.concatenate([merged, detect(model, image, classes=classes)[0]])
+    return merged[nms(merged, iou_threshold)]
@@ -0,0 +1,149 @@
+"""Lightweight IoU tracker used to carry boxes between keyframes.
+
+Detections are matched to existing tracks by class-aware greedy IoU on
+keyframes. On the frames in between, each track is moved along its
+constant-velocity estimate, so the model only has to run every k-th frame
+while every frame still gets boxes and a stable defect ID.
+"""
+import numpy as np
+
+from utils.boxes import iou_matrix
+
+
+class _Track:
+    __slots__ = ("id", "box", "velocity", "conf", "cls", "hits", "missed", "last_update")
+
+    def __init__(self, track_id, detection, frame_index):
+        self.id = track_id
+        self.box = detection[:4].astype(np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.conf = float(detection[4])
+        self.cls = int(detection[5])
+        self.hits = 1
+        self.missed = 0
+        self.last_update = frame_index
+
+
+class IoUTracker:
+    """Greedy IoU tracker with constant-velocity motion between keyframes.
+
+    ``max_missed`` is how many consecutive keyframes a track may go unmatched
+    before it is dropped; ``min_hits`` is how many keyframe matches a track
+    needs before it counts as a defect in :meth:`defect_counts`. Track IDs
+    start at ``first_id``.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=2, min_hits=1, first_id=1):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.frame_index = -1
+        self._tracks = []
+        self._next_id = first_id
+        self._finished_counts = {}
+
+    def update(self, detections):
+        """Advance one frame using fresh ``(N, 6)`` detections; return ``(M, 7)`` tracked boxes."""
+        self.frame_index += 1
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+        unmatched = set(range(len(detections)))
+
+        if self._tracks and len(detections):
+            boxes = np.stack([self._predicted_box(t) for t in self._tracks])
+            iou = iou_matrix(boxes, detections)
+            # Never match across classes
+            track_cls = np.array([t.cls for t in self._tracks])
+            iou[track_cls[:, None] != detections[None, :, 5].astype(int)] = 0.0
+
+            matched_tracks = set()
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                t, d = np.unravel_index(flat, iou.shape)
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d not in unmatched:
+                    continue
+                self._refresh(self._tracks[t], detections[d])
+                matched_tracks.add(t)
+                unmatched.discard(d)
+            for t, track in enumerate(self._tracks):
+                if t not in matched_tracks:
+                    track.missed += 1
+        else:
+            for track in self._tracks:
+                track.missed += 1
+
+        for d in sorted(unmatched):
+            self._tracks.append(_Track(self._next_id, detections[d], self.frame_index))
+            self._next_id += 1
+
+        alive = []
+        for track in self._tracks:
+            if track.missed <= self.max_missed:
+                alive.append(track)
+            elif track.hits >= self.min_hits:
+                self._finished_counts[track.cls] = self._finished_counts.get(track.cls, 0) + 1
+        self._tracks = alive
+        return self._current()
+
+    def predict(self):
+        """Advance one frame without detections; return ``(M, 7)`` extrapolated boxes."""
+        self.frame_index += 1
+        return self._current()
+
+    def defect_counts(self):
+        """Return ``{class_id: number_of_distinct_defects}`` over everything seen so far."""
+        counts = dict(self._finished_counts)
+        for track in self._tracks:
+            if track.hits >= self.min_hits:
+                counts[track.cls] = counts.get(track.cls, 0) + 1
+        return counts
+
+    def state(self):
+        """Return the tracker's state as JSON-serializable data, for :meth:`from_state`."""
+        return {
+            "iou_threshold": self.iou_threshold,
+            "max_missed": self.max_missed,
+            "min_hits": self.min_hits,
+            "frame_index": self.frame_index,
+            "next_id": self._next_id,
+            "finished_counts": {str(cls): n for cls, n in self._finished_counts.items()},
+            "tracks": [
+                {"id": t.id, "box": t.box.tolist(), "velocity": t.velocity.tolist(), "conf": t.conf, "cls": t.cls,
+                 "hits": t.hits, "missed": t.missed, "last_update": t.last_update}
+                for t in self._tracks
+            ],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a tracker saved with :meth:`state`, so IDs and counts carry on where it stopped."""
+        tracker = cls(state["iou_threshold"], state["max_missed"], state["min_hits"])
+        tracker.frame_index = state["frame_index"]
+        tracker._next_id = state["next_id"]
+        tracker._finished_counts = {int(c): n for c, n in state["finished_counts"].items()}
+        for saved in state["tracks"]:
+            track = _Track(saved["id"], np.array([*saved["box"], saved["conf"], saved["cls"]], dtype=np.float32),
+                           saved["last_update"])
+            track.velocity = np.array(saved["velocity"], dtype=np.float32)
+            track.hits = saved["hits"]
+            track.missed = saved["missed"]
+            tracker._tracks.append(track)
+        return tracker
+
+    def _predicted_box(self, track):
+        return track.box + track.velocity * (self.frame_index - track.last_update)
+
+    def _refresh(self, track, detection):
+        elapsed = max(self.frame_index - track.last_update, 1)
+        box = detection[:4]
+        track.velocity = (box - track.box) / elapsed
+        track.box = box.astype(np.float32)
+        track.conf = float(detection[4])
+        track.hits += 1
+        track.missed = 0
+        track.last_update = self.frame_index
+
+    def _current(self):
+        # Tracks that missed the last keyframe are kept for re-matching but not drawn
+        rows = [(*self._predicted_box(t), t.conf, t.cls, t.id) for t in self._tracks if t.missed == 0]
+        return np.array(rows, dtype=np.float32).reshape(-1, 7)
@@ -0,0 +1,277 @@
+"""Pipelined video inference.
+
+A decoder thread fills a bounded queue of frames, the calling thread runs
+the model on batches of frames, and an encoder thread annotates and writes
+them out in order, so decode, inference and encode overlap.
+
+With ``keyframe_interval`` > 1 the model only sees every k-th frame (and
+scene cuts); an :class:`~utils.tracking.IoUTracker` carries the boxes
+across the frames in between and gives each defect a stable ID.
+
+Annotated frames are piped into an ffmpeg H.264 encoder that writes
+fragmented MP4, which browsers can play, even while the file is still
+being written. Without ffmpeg, OpenCV's ``mp4v`` writer is used instead.
+"""
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from utils import metrics
+from utils.tracking import IoUTracker
+
+VIDEO_BATCH_SIZE = int(os.environ.get("VIDEO_BATCH_SIZE", "8"))
+VIDEO_QUEUE_DEPTH = int(os.environ.get("VIDEO_QUEUE_DEPTH", "32"))
+VIDEO_KEYFRAME_INTERVAL = int(os.environ.get("VIDEO_KEYFRAME_INTERVAL", "1"))
+# Mean absolute grey-level change (0-255) that forces a keyframe on a scene cut
+SCENE_CHANGE_THRESHOLD = float(os.environ.get("SCENE_CHANGE_THRESHOLD", "30"))
+# libx264 settings for annotated output
+VIDEO_PRESET = os.environ.get("VIDEO_PRESET", "veryfast")
+VIDEO_CRF = int(os.environ.get("VIDEO_CRF", "23"))
+
+logger = logging.getLogger("video")
+
+_END = object()
+
+
+@lru_cache(maxsize=None)
+def h264_available():
+    """Whether an ffmpeg with the libx264 encoder is on the PATH."""
+    if shutil.which("ffmpeg"):
+        encoders = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+        if "libx264" in encoders:
+            return True
+    logger.warning("ffmpeg with libx264 not found; writing mp4v, which most browsers cannot play")
+    return False
+
+
+class FFmpegWriter:
+    """Streaming H.264 encoder with the ``write``/``release`` interface of ``cv2.VideoWriter``.
+
+    Raw BGR frames go straight into ffmpeg's stdin. The output is fragmented
+    MP4 with a keyframe and fragment about every second, so a partly written
+    file is already playable.
+    """
+
+    def __init__(self, path, fps, size):
+        width, height = size
+        self.path = path
+        self._process = subprocess.Popen(
+            ["ffmpeg", "-y", "-loglevel", "error",
+             "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps}", "-i", "-",
+             "-an", "-c:v", "libx264", "-preset", VIDEO_PRESET, "-crf", str(VIDEO_CRF),
+             # yuv420p (the pixel format browsers decode) needs even dimensions
+             "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p",
+             "-g", str(max(round(fps), 1)),
+             "-movflags", "+frag_keyframe+empty_moov+default_base_moof",
+             path],
+            stdin=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+    def write(self, frame):
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self.release()  # Raises with ffmpeg's error message
+
+    def release(self):
+        if self._process.returncode is not None:
+            return
+        _, err = self._process.communicate()
+        if self._process.returncode:
+            raise IOError(f"ffmpeg could not encode {self.path}: {err.decode(errors='replace').strip()}")
+
+
+def open_video_writer(path, fps, size):
+    """Return a writer for BGR frames of ``size`` (width, height): H.264 if possible, else ``mp4v``."""
+    if h264_available():
+        return FFmpegWriter(path, fps, size)
+    return cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+
+
+def _put(q, item, stop):
+    """Put ``item`` on ``q`` unless the pipeline is being torn down."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    """Get the next item from ``q``, or ``_END`` once the pipeline is torn down."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def _thumbnail(frame):
+    return cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 36), interpolation=cv2.INTER_AREA)
+
+
+class _Worker(threading.Thread):
+    """Daemon thread that keeps the exception it died with and stops the pipeline."""
+
+    def __init__(self, target, name, stop):
+        super().__init__(name=name, daemon=True)
+        self._target_fn = target
+        self._stop_event = stop
+        self.error = None
+
+    def run(self):
+        try:
+            self._target_fn()
+        except BaseException as e:
+            self.error = e
+            self._stop_event.set()
+
+
+def run_video_pipeline(input_path, output_path, predict, annotate,
+                       batch_size=VIDEO_BATCH_SIZE, queue_depth=VIDEO_QUEUE_DEPTH,
+                       fps=None, progress=None,
+                       keyframe_interval=1, tracker=None, scene_threshold=SCENE_CHANGE_THRESHOLD,
+                       start_frame=0, max_frames=None, log=None):
+    """Run ``predict`` over every frame of ``input_path`` and write an annotated video.
+
+    ``predict`` takes a list of BGR frames and returns one detection array per
+    frame; ``annotate(frame, detections)`` returns the frame to write. The
+    output is written at ``fps`` (default: the source frame rate).
+    ``progress(done, total)`` is called from the calling thread after each batch.
+    When ``keyframe_interval`` > 1, only keyframes are sent to ``predict`` and
+    ``tracker`` (an ``IoUTracker``, created if not given) fills in the rest;
+    ``annotate`` then receives (N, 7) arrays whose last column is the defect ID.
+    ``start_frame`` and ``max_frames`` restrict the run to one segment of the input.
+    ``log`` (a :class:`~utils.detection_log.DetectionLogWriter`) receives every
+    frame's detections, indexed from the first frame of the run.
+    Returns the number of frames written.
+    """
+    if keyframe_interval > 1 and tracker is None:
+        tracker = IoUTracker()
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video: {input_path}")
+    fps = fps or cap.get(cv2.CAP_PROP_FPS) or 20
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        total = total and max(total - start_frame, 0)
+    if max_frames is not None:
+        total = min(total, max_frames) if total is not None else max_frames
+
+    frames = queue.Queue(maxsize=queue_depth)
+    encoded = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    written = [0]
+
+    def decode():
+        index = 0
+        last_key = None
+        try:
+            while not stop.is_set() and (max_frames is None or index < max_frames):
+                with metrics.timer("video.decode"):
+                    ret, frame = cap.read()
+                if not ret:
+                    break
+                decoded_at = time.perf_counter()
+                is_key = tracker is None or index % keyframe_interval == 0
+                if tracker is not None and scene_threshold:
+                    thumb = _thumbnail(frame)
+                    if last_key is not None and cv2.absdiff(thumb, last_key).mean() > scene_threshold:
+                        is_key = True
+                    if is_key:
+                        last_key = thumb
+                index += 1
+                if not _put(frames, (frame, is_key, decoded_at), stop):
+                    break
+        finally:
+            cap.release()
+            _put(frames, _END, stop)
+
+    def encode():
+        out = None
+        try:
+            while True:
+                item = _get(encoded, stop)
+                if item is _END:
+                    break
+                frame, detections, decoded_at = item
+                with metrics.timer("video.annotate"):
+                    frame = annotate(frame, detections)
+                if out is None:
+                    height, width = frame.shape[:2]
+                    out = open_video_writer(output_path, fps, (width, height))
+                with metrics.timer("video.encode"):
+                    out.write(frame)
+                written[0] += 1
+                # Decode-to-written latency, including time spent waiting in the queues
+                metrics.observe("video.frame_latency", time.perf_counter() - decoded_at)
+        finally:
+            if out is not None:
+                out.release()
+
+    decoder = _Worker(decode, "video-decoder", stop)
+    encoder = _Worker(encode, "video-encoder", stop)
+    decoder.start()
+    encoder.start()
+
+    # In keyframe mode a batch holds up to batch_size keyframes, bounded in frames
+    max_pending = max(batch_size, queue_depth)
+    done = 0
+    try:
+        finished = False
+        while not finished and not stop.is_set():
+            batch = []
+            keys = 0
+            while keys < batch_size and len(batch) < max_pending:
+                item = _get(frames, stop)
+                if item is _END:
+                    finished = True
+                    break
+                batch.append(item)
+                keys += item[1]
+            if not batch:
+                break
+            key_frames = [frame for frame, is_key, _ in batch if is_key]
+            with metrics.timer("video.inference"):
+                predictions = iter(predict(key_frames) if key_frames else ())
+            for frame, is_key, decoded_at in batch:
+                if tracker is None:
+                    detections = next(predictions)
+                elif is_key:
+                    detections = tracker.update(next(predictions))
+                else:
+                    detections = tracker.predict()
+                if log is not None:
+                    log.add(done, detections)
+                done += 1
+                if not _put(encoded, (frame, detections, decoded_at), stop):
+                    break
+            metrics.inc("video.frames", len(batch))
+            if progress:
+                progress(done, total)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        _put(encoded, _END, stop)
+        encoder.join()
+        stop.set()
+        decoder.join()
+
+    for worker in (decoder, encoder):
+        if worker.error is not None:
+            raise worker.error
+    return written[0]
@@ -0,0 +1,212 @@
+"""Per-session scratch directories for uploads and generated artifacts.
+
+Every browser session gets its own directory under ``WORKSPACE_DIR``.
+Uploads are copied in with a fixed-size buffer instead of being read into
+memory in one piece, and intermediate files (annotated images, reports) are
+created here rather than as ``NamedTemporaryFile(delete=False)`` leftovers
+in ``/tmp``. Files in use are reference counted; once released they are
+garbage collected after ``WORKSPACE_TTL_SECONDS``, or sooner, least
+recently used first, when the total size would exceed ``WORKSPACE_QUOTA_MB``.
+"""
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+WORKSPACE_DIR = os.environ.get("WORKSPACE_DIR", "workspace")
+WORKSPACE_TTL_SECONDS = float(os.environ.get("WORKSPACE_TTL_SECONDS", "3600"))
+WORKSPACE_QUOTA_MB = float(os.environ.get("WORKSPACE_QUOTA_MB", "4096"))
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", str(8 << 20)))
+
+# How often get_workspace() sweeps expired files
+_GC_INTERVAL = 60.0
+
+_lock = threading.RLock()
+_workspaces = {}
+_last_gc = 0.0
+
+
+class WorkspaceFull(OSError):
+    """Raised when a file cannot fit in the workspace quota even after eviction."""
+
+
+class _Entry:
+    __slots__ = ("refs", "last_used", "size")
+
+    def __init__(self):
+        self.refs = 0
+        self.last_used = time.time()
+        self.size = 0
+
+
+class Workspace:
+    """Files owned by one session, tracked with reference counts."""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.root = os.path.join(WORKSPACE_DIR, session_id)
+        self._entries = {}
+        self._uploads = {}
+
+    def new_path(self, suffix="", prefix="tmp"):
+        """Reserve a unique, not yet created file path in this workspace."""
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, f"{prefix}_{uuid.uuid4().hex}{suffix}")
+        with _lock:
+            self._entries[path] = _Entry()
+        return path
+
+    def acquire(self, path):
+        with _lock:
+            entry = self._entries.setdefault(path, _Entry())
+            entry.refs += 1
+            entry.last_used = time.time()
+
+    def release(self, path):
+        """Drop one reference; the file stays until it expires or is evicted."""
+        with _lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return
+            entry.refs = max(entry.refs - 1, 0)
+            entry.last_used = time.time()
+            try:
+                entry.size = os.path.getsize(path)
+            except OSError:
+                entry.size = 0
+        _enforce_quota()
+
+    @contextmanager
+    def hold(self, path):
+        """Keep ``path`` referenced (safe from collection) for the duration of a block."""
+        self.acquire(path)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    @contextmanager
+    def temp_file(self, suffix="", prefix="tmp"):
+        """Yield a fresh path that is held while the block runs."""
+        with self.hold(self.new_path(suffix, prefix)) as path:
+            yield path
+
+    def discard(self, path):
+        """Stop tracking ``path``, deleting it if it still exists (e.g. unless it was moved away)."""
+        with _lock:
+            self._entries.pop(path, None)
+            self._uploads = {k: v for k, v in self._uploads.items() if v != path}
+        if os.path.exists(path):
+            os.remove(path)
+
+    def ingest_upload(self, fileobj, name=None, size=None):
+        """Copy an uploaded file object into the workspace and return its path.
+
+        The copy streams in ``UPLOAD_CHUNK_BYTES`` pieces. Streamlit uploads
+        are recognised by ``file_id`` and copied only once per session, so
+        script reruns reuse the file on disk.
+        """
+        name = name or getattr(fileobj, "name", "") or ""
+        file_id = getattr(fileobj, "file_id", None)
+        with _lock:
+            path = self._uploads.get(file_id) if file_id else None
+            if path and path in self._entries and os.path.exists(path):
+                self._entries[path].last_used = time.time()
+                return path
+
+        if size is None:
+            size = getattr(fileobj, "size", None)
+        if size:
+            _enforce_quota(size)
+        path = self.new_path(os.path.splitext(name)[1], prefix="upload")
+        with self.hold(path):
+            fileobj.seek(0)
+            with open(path, "wb") as f:
+                shutil.copyfileobj(fileobj, f, UPLOAD_CHUNK_BYTES)
+            fileobj.seek(0)
+        if file_id:
+            with _lock:
+                self._uploads[file_id] = path
+        return path
+
+    def collect(self, now=None):
+        """Delete unreferenced files idle for longer than ``WORKSPACE_TTL_SECONDS``."""
+        now = now or time.time()
+        with _lock:
+            expired = [path for path, entry in self._entries.items()
+                       if entry.refs == 0 and now - entry.last_used > WORKSPACE_TTL_SECONDS]
+        for path in expired:
+            self.discard(path)
+        return len(expired)
+
+    def clear(self):
+        """Remove the whole workspace directory."""
+        with _lock:
+            self._entries.clear()
+            self._uploads.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _enforce_quota(incoming=0):
+    """Evict released files, least recently used first, until ``incoming`` more bytes fit."""
+    quota = int(WORKSPACE_QUOTA_MB * 1024 * 1024)
+    with _lock:
+        entries = [(entry, path, ws) for ws in _workspaces.values() for path, entry in ws._entries.items()]
+        total = sum(entry.size for entry, _, _ in entries)
+        if total + incoming <= quota:
+            return
+        victims = []
+        for entry, path, ws in sorted((e for e in entries if e[0].refs == 0), key=lambda e: e[0].last_used):
+            if total + incoming <= quota:
+                break
+            total -= entry.size
+            victims.append((ws, path))
+    for ws, path in victims:
+        ws.discard(path)
+    if total + incoming > quota:
+        raise WorkspaceFull(f"Workspace quota of {WORKSPACE_QUOTA_MB:g} MB exceeded")
+
+
+def _sweep_orphans(now):
+    """Remove session directories left behind by earlier server processes."""
+    if not os.path.isdir(WORKSPACE_DIR):
+        return
+    for session_id in os.listdir(WORKSPACE_DIR):
+        root = os.path.join(WORKSPACE_DIR, session_id)
+        if session_id in _workspaces or not os.path.isdir(root):
+            continue
+        if now - os.path.getmtime(root) > WORKSPACE_TTL_SECONDS:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def collect_garbage(now=None):
+    """Expire idle files in every workspace and drop empty, abandoned workspaces."""
+    global _last_gc
+    now = now or time.time()
+    with _lock:
+        _last_gc = now
+        workspaces = list(_workspaces.values())
+    for ws in workspaces:
+        ws.collect(now)
+        with _lock:
+            idle = not ws._entries
+        if idle and os.path.isdir(ws.root) and now - os.path.getmtime(ws.root) > WORKSPACE_TTL_SECONDS:
+            with _lock:
+                _workspaces.pop(ws.session_id, None)
+            ws.clear()
+    with _lock:
+        _sweep_orphans(now)
+
+
+def get_workspace(session_id):
+    """Return the workspace for ``session_id``, sweeping expired files now and then."""
+    with _lock:
+        ws = _workspaces.get(session_id)
+        if ws is None:
+            ws = _workspaces[session_id] = Workspace(session_id)
+        run_gc = time.time() - _last_gc > _GC_INTERVAL
+    if run_gc:
+        collect_garbage()
+    return ws